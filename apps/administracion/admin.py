@@ -2,7 +2,10 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from .models import Ley, SubArticulo, TipoDocumento, Documento, LogAcceso, PerfilUsuario
+from .models import (
+    Ley, SubArticulo, TipoDocumento, Documento, LogAcceso, LogAccesoDiario, PerfilUsuario, AlcanceTipoUsuario,
+    DisponibilidadAnual
+)
 
 
 @admin.register(Ley)
@@ -37,10 +40,13 @@ class TipoDocumentoAdmin(admin.ModelAdmin):
 
 @admin.register(Documento)
 class DocumentoAdmin(admin.ModelAdmin):
-    list_display = ['get_documento_info', 'año', 'trimestre', 'get_archivo_info', 'fecha_subida', 'activo']
-    list_filter = ['tipo_documento__subarticulo__ley', 'tipo_documento__subarticulo', 'año', 'trimestre', 'activo']
+    list_display = ['get_documento_info', 'año', 'trimestre', 'get_archivo_info', 'fecha_subida', 'activo',
+                    'estado_procesamiento']
+    list_filter = ['tipo_documento__subarticulo__ley', 'tipo_documento__subarticulo', 'año', 'trimestre', 'activo',
+                   'estado_procesamiento']
     search_fields = ['tipo_documento__nombre', 'titulo_personalizado', 'descripcion']
-    readonly_fields = ['tamaño_archivo', 'fecha_subida', 'fecha_modificacion']
+    readonly_fields = ['tamaño_archivo', 'sha256', 'fecha_subida', 'fecha_modificacion', 'estado_procesamiento',
+                       'error_procesamiento', 'fecha_procesamiento', 'num_paginas', 'linealizado']
     ordering = ['-año', '-trimestre', 'tipo_documento__subarticulo__ley', 'tipo_documento']
     
     fieldsets = (
@@ -48,10 +54,15 @@ class DocumentoAdmin(admin.ModelAdmin):
             'fields': ('tipo_documento', 'año', 'trimestre', 'archivo')
         }),
         ('Metadatos', {
-            'fields': ('titulo_personalizado', 'descripcion', 'activo')
+            'fields': ('titulo_personalizado', 'nombre_archivo', 'descripcion', 'activo')
         }),
         ('Información del Sistema', {
-            'fields': ('tamaño_archivo', 'fecha_subida', 'fecha_modificacion', 'usuario_subida'),
+            'fields': ('tamaño_archivo', 'sha256', 'fecha_subida', 'fecha_modificacion', 'usuario_subida'),
+            'classes': ('collapse',)
+        }),
+        ('Procesamiento', {
+            'fields': ('estado_procesamiento', 'error_procesamiento', 'fecha_procesamiento',
+                       'num_paginas', 'linealizado'),
             'classes': ('collapse',)
         }),
     )
@@ -91,6 +102,28 @@ class LogAccesoAdmin(admin.ModelAdmin):
         return False  # No permitir eliminar logs
 
 
+@admin.register(LogAccesoDiario)
+class LogAccesoDiarioAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'documento', 'tipo_acceso', 'total']
+    list_filter = ['tipo_acceso', 'fecha']
+    readonly_fields = ['fecha', 'documento', 'tipo_acceso', 'total']
+    ordering = ['-fecha']
+    
+    def has_add_permission(self, request):
+        return False  # Se genera con el comando agregar_accesos
+
+
+@admin.register(DisponibilidadAnual)
+class DisponibilidadAnualAdmin(admin.ModelAdmin):
+    list_display = ['subarticulo', 'año', 'total_documentos', 'ultima_actualizacion']
+    list_filter = ['subarticulo__ley', 'año']
+    readonly_fields = ['subarticulo', 'año', 'total_documentos', 'ultima_actualizacion']
+    ordering = ['subarticulo', '-año']
+    
+    def has_add_permission(self, request):
+        return False  # Se mantiene con las señales de Documento
+
+
 @admin.register(PerfilUsuario)
 class PerfilUsuarioAdmin(admin.ModelAdmin):
     list_display = ['user', 'tipo_usuario', 'activo', 'fecha_creacion']
@@ -99,6 +132,17 @@ class PerfilUsuarioAdmin(admin.ModelAdmin):
     ordering = ['user__username']
 
 
+@admin.register(AlcanceTipoUsuario)
+class AlcanceTipoUsuarioAdmin(admin.ModelAdmin):
+    list_display = ['tipo_usuario', 'subarticulo', 'get_ley']
+    list_filter = ['tipo_usuario', 'subarticulo__ley']
+    ordering = ['tipo_usuario', 'subarticulo__ley', 'subarticulo__orden']
+    
+    def get_ley(self, obj):
+        return obj.subarticulo.ley.nombre
+    get_ley.short_description = 'Ley'
+
+
 # Inline para mostrar perfil en el admin de usuarios
 class PerfilUsuarioInline(admin.StackedInline):
     model = PerfilUsuario
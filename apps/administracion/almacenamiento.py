@@ -0,0 +1,123 @@
+"""
+Almacenamiento de los PDF por contenido.
+
+Cada archivo se guarda una sola vez en documentos/blobs/<aa>/<bb>/<sha256>.pdf,
+así que volver a subir el mismo PDF (correcciones de metadatos, el mismo anexo
+en varios tipos de documento) no ocupa más disco ni genera sufijos aleatorios.
+El nombre legible para la descarga se guarda en Documento.nombre_archivo y el
+número de documentos que usan cada blob en ArchivoAlmacenado.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+PREFIJO_BLOBS = 'documentos/blobs'
+BLOQUE = 64 * 1024
+
+NOMBRE_BLOB_RE = re.compile(rf'^{PREFIJO_BLOBS}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/(?P<sha256>[0-9a-f]{{64}})\.pdf$')
+
+
+def nombre_blob(sha256):
+    return f'{PREFIJO_BLOBS}/{sha256[:2]}/{sha256[2:4]}/{sha256}.pdf'
+
+
+def sha256_de(nombre):
+    """SHA-256 de un nombre de blob, o None si es una ruta con el esquema anterior"""
+    coincidencia = NOMBRE_BLOB_RE.match(nombre or '')
+    return coincidencia['sha256'] if coincidencia else None
+
+
+def sha256_archivo(ruta):
+    digest = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(BLOQUE), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+class AlmacenamientoPorContenido(FileSystemStorage):
+    """
+    FileSystemStorage que ignora el nombre propuesto y devuelve el del blob.
+    Si el contenido ya existe no se escribe de nuevo.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo lo decide _save a partir del contenido
+        return name
+
+    def _save(self, name, content):
+        if hasattr(content, 'temporary_file_path'):
+            # Ya está en disco (subida temporal): se enlaza sin copiar los bytes
+            origen = content.temporary_file_path()
+            sha256 = getattr(content, 'sha256', None) or sha256_archivo(origen)
+            self._publicar(origen, sha256, enlazar=True)
+            return nombre_blob(sha256)
+
+        directorio = self.path(os.path.join(PREFIJO_BLOBS, '.tmp'))
+        os.makedirs(directorio, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temporal = tempfile.mkstemp(dir=directorio, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as destino:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for bloque in content.chunks(BLOQUE):
+                    digest.update(bloque)
+                    destino.write(bloque)
+            sha256 = digest.hexdigest()
+            self._publicar(temporal, sha256, enlazar=False)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+        return nombre_blob(sha256)
+
+    def _publicar(self, origen, sha256, enlazar):
+        """Crea el blob a partir de `origen` salvo que ya exista (os.link no sobrescribe)"""
+        destino = self.path(nombre_blob(sha256))
+        if os.path.exists(destino):
+            return
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        try:
+            os.link(origen, destino)
+        except FileExistsError:
+            return
+        except OSError:
+            if not enlazar:
+                raise
+            # Distinto sistema de archivos: copiar a un temporal junto al destino y renombrar
+            temporal = f'{destino}.{os.getpid()}.part'
+            shutil.copyfile(origen, temporal)
+            os.replace(temporal, destino)
+        if self.file_permissions_mode is not None:
+            os.chmod(destino, self.file_permissions_mode)
+
+
+almacenamiento_documentos = AlmacenamientoPorContenido()
+
+
+def obtener_almacenamiento():
+    """Storage de Documento.archivo (callable para que la migración no lo serialice)"""
+    return almacenamiento_documentos
+
+
+class SubidaConHashHandler(TemporaryFileUploadHandler):
+    """Calcula el SHA-256 mientras la subida multipart se escribe a disco"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        archivo = super().file_complete(file_size)
+        archivo.sha256 = self.digest.hexdigest()
+        return archivo
@@ -0,0 +1,264 @@
+"""
+Carga de muchos documentos en un solo lote (comando importar_documentos y
+subida masiva del panel).
+
+Todo se valida antes de escribir nada: periodicidad, año, archivo PDF,
+permisos, destinos repetidos dentro del lote y documentos ya existentes (una
+sola consulta). Después los archivos se escriben en paralelo al
+almacenamiento por contenido y las filas se insertan con bulk_create en una
+transacción. Si algo falla, la transacción se revierte y se eliminan los blobs
+escritos que ningún documento usa: no quedan periodos a medio publicar ni
+archivos huérfanos.
+
+bulk_create no dispara las señales de Documento, así que el lote actualiza
+por su cuenta los índices que ellas mantienen (referencias de los blobs,
+disponibilidad por año, índice de búsqueda) y envía documentos_cargados para
+invalidar la caché pública.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .almacenamiento import obtener_almacenamiento, sha256_de
+from .models import (
+    ArchivoAlmacenado, DisponibilidadAnual, Documento, IndiceBusqueda, TRIMESTRE_CHOICES, YEAR_CHOICES
+)
+
+
+CABECERA_PDF = b'%PDF-'
+TRIMESTRES = [clave for clave, _ in TRIMESTRE_CHOICES]
+AÑOS = [año for año, _ in YEAR_CHOICES]
+
+# Se envía al confirmar un lote con los ids de los documentos creados o reemplazados
+documentos_cargados = Signal()
+
+
+class ErrorCarga(Exception):
+    """El lote no se cargó; `errores` lista todos los problemas encontrados"""
+
+    def __init__(self, errores):
+        super().__init__('; '.join(errores))
+        self.errores = errores
+
+
+class Elemento:
+    """Un documento del lote: destino y archivo (ruta en disco o archivo subido)"""
+
+    def __init__(self, tipo_documento, año, trimestre, archivo, origen='', nombre_archivo=None, **campos):
+        self.tipo_documento = tipo_documento
+        self.año = año
+        self.trimestre = trimestre or None
+        self.archivo = archivo
+        self.origen = origen or self.nombre_archivo_de(archivo)
+        self.nombre_archivo = nombre_archivo or self.nombre_archivo_de(archivo)
+        self.campos = campos
+        self.existente = None
+        self.blob = None
+
+    @staticmethod
+    def nombre_archivo_de(archivo):
+        return os.path.basename(archivo if isinstance(archivo, str) else archivo.name)
+
+    @property
+    def clave(self):
+        return (self.tipo_documento.pk, self.año, self.trimestre)
+
+    def abrir(self):
+        if isinstance(self.archivo, str):
+            return open(self.archivo, 'rb')
+        self.archivo.seek(0)
+        return self.archivo
+
+    def tamaño(self):
+        if isinstance(self.archivo, str):
+            return os.path.getsize(self.archivo)
+        return self.archivo.size
+
+
+def _validar_archivo(elemento):
+    if not elemento.nombre_archivo.lower().endswith('.pdf'):
+        return 'solo se permiten archivos PDF'
+    try:
+        tamaño = elemento.tamaño()
+        archivo = elemento.abrir()
+        try:
+            cabecera = archivo.read(len(CABECERA_PDF))
+        finally:
+            if isinstance(elemento.archivo, str):
+                archivo.close()
+            else:
+                archivo.seek(0)
+    except OSError as e:
+        return f'no se puede leer el archivo ({e.strerror or e})'
+    if cabecera != CABECERA_PDF:
+        return 'el archivo no es un PDF válido'
+    maximo = getattr(settings, 'SUBIDAS_MAXIMO_BYTES', 50 * 1024 * 1024)
+    if tamaño > maximo:
+        return f'el archivo pesa más de {maximo // (1024 * 1024)} MB'
+    return None
+
+
+def validar(elementos, usuario=None):
+    """
+    Comprueba todo el lote y marca en `existente` los destinos que ya tienen
+    documento. Devuelve la lista de errores (vacía si el lote es válido).
+    """
+    errores = []
+    vistos = {}
+    for elemento in elementos:
+        tipo = elemento.tipo_documento
+        problema = None
+        if tipo.subarticulo.periodicidad == 'ANUAL' and elemento.trimestre:
+            problema = f'"{tipo.nombre}" es anual: no lleva trimestre'
+        elif tipo.subarticulo.periodicidad != 'ANUAL' and elemento.trimestre not in TRIMESTRES:
+            problema = f'"{tipo.nombre}" es trimestral: indique el trimestre (T1 a T4)'
+        elif elemento.año not in AÑOS:
+            problema = f'año {elemento.año} fuera del rango permitido ({AÑOS[0]}-{AÑOS[-1]})'
+        elif usuario is not None and hasattr(usuario, 'perfil') and not usuario.perfil.puede_subir_documento(tipo):
+            problema = f'no tiene permisos para subir "{tipo.nombre}"'
+        elif elemento.clave in vistos:
+            problema = f'mismo destino que {vistos[elemento.clave].origen}'
+        else:
+            problema = _validar_archivo(elemento)
+        vistos.setdefault(elemento.clave, elemento)
+        if problema:
+            errores.append(f'{elemento.origen}: {problema}')
+
+    # Documentos que ya existen para los destinos del lote, en una sola consulta
+    if elementos:
+        existentes = Documento.objects.filter(
+            tipo_documento_id__in={e.tipo_documento.pk for e in elementos},
+            año__in={e.año for e in elementos},
+        ).values_list('tipo_documento_id', 'año', 'trimestre', 'pk', 'archivo')
+        por_clave = {(tipo_id, año, trimestre): (pk, archivo) for tipo_id, año, trimestre, pk, archivo in existentes}
+        for elemento in elementos:
+            elemento.existente = por_clave.get(elemento.clave)
+    return errores
+
+
+def _guardar_archivo(elemento):
+    almacenamiento = obtener_almacenamiento()
+    archivo = elemento.abrir()
+    try:
+        # Una ruta de origen se copia (File sin temporary_file_path): enlazarla
+        # compartiría el inodo con un archivo que no es nuestro
+        contenido = File(archivo, name=elemento.nombre_archivo) if isinstance(elemento.archivo, str) else archivo
+        elemento.blob = almacenamiento.save(elemento.nombre_archivo, contenido)
+    finally:
+        if isinstance(elemento.archivo, str):
+            archivo.close()
+
+
+def guardar_archivos(elementos, hilos=4):
+    """Escribe los archivos en paralelo; si uno falla, descarta los ya escritos"""
+    with ThreadPoolExecutor(max_workers=max(hilos, 1)) as pool:
+        resultados = [pool.submit(_guardar_archivo, elemento) for elemento in elementos]
+    fallos = [(elemento, futuro.exception()) for elemento, futuro in zip(elementos, resultados) if futuro.exception()]
+    if fallos:
+        ArchivoAlmacenado.descartar([elemento.blob for elemento in elementos if elemento.blob])
+        raise ErrorCarga([f'{elemento.origen}: no se pudo guardar ({error})' for elemento, error in fallos])
+
+
+def _documento(elemento, usuario, pk=None):
+    almacenamiento = obtener_almacenamiento()
+    campos = {'activo': True, **elemento.campos}
+    return Documento(
+        pk=pk,
+        tipo_documento=elemento.tipo_documento,
+        año=elemento.año,
+        trimestre=elemento.trimestre,
+        archivo=elemento.blob,
+        nombre_archivo=elemento.nombre_archivo,
+        sha256=sha256_de(elemento.blob),
+        tamaño_archivo=almacenamiento.size(elemento.blob),
+        usuario_subida=usuario,
+        **campos
+    )
+
+
+CAMPOS_REEMPLAZO = [
+    'archivo', 'nombre_archivo', 'sha256', 'tamaño_archivo', 'usuario_subida', 'activo',
+    'estado_procesamiento', 'error_procesamiento', 'fecha_procesamiento', 'num_paginas', 'linealizado',
+    'miniatura', 'fecha_modificacion',
+]
+
+
+def cargar(elementos, usuario=None, reemplazar=False, hilos=4, simulacion=False, al_confirmar=None):
+    """
+    Carga el lote completo o nada. Los destinos que ya tienen documento se
+    omiten, o con `reemplazar` se actualizan en su lugar (conservan id y
+    registros de acceso). `al_confirmar` recibe los elementos guardados (sin
+    los omitidos) y se ejecuta dentro de la misma transacción, para cambios que
+    deben confirmarse o revertirse con el lote.
+    Devuelve un resumen con lo creado, reemplazado y omitido, los bytes
+    escritos y el tiempo empleado.
+
+    No debe llamarse dentro de otra transacción: si la exterior se revirtiera,
+    los blobs escritos quedarían en disco.
+    """
+    inicio = time.monotonic()
+    errores = validar(elementos, usuario)
+    if errores:
+        raise ErrorCarga(errores)
+
+    omitidos = [] if reemplazar else [e for e in elementos if e.existente]
+    pendientes = [e for e in elementos if reemplazar or not e.existente]
+    resumen = {
+        'creados': sum(1 for e in pendientes if not e.existente),
+        'reemplazados': sum(1 for e in pendientes if e.existente),
+        'omitidos': len(omitidos),
+        'bytes': sum(e.tamaño() for e in pendientes),
+        'documentos': [],
+    }
+    if simulacion or not pendientes:
+        resumen['segundos'] = time.monotonic() - inicio
+        return resumen
+
+    guardar_archivos(pendientes, hilos)
+    try:
+        with transaction.atomic():
+            nuevos = Documento.objects.bulk_create(
+                [_documento(e, usuario) for e in pendientes if not e.existente], batch_size=500
+            )
+            reemplazados = [_documento(e, usuario, pk=e.existente[0]) for e in pendientes if e.existente]
+            # bulk_update no aplica auto_now; el resto de campos de procesamiento
+            # quedan con sus valores por defecto (el archivo nuevo vuelve a la cola)
+            ahora = timezone.now()
+            for documento in reemplazados:
+                documento.fecha_modificacion = ahora
+            Documento.objects.bulk_update(
+                reemplazados, CAMPOS_REEMPLAZO + sorted({c for e in pendientes for c in e.campos} - {'activo'}),
+                batch_size=500
+            )
+
+            # Lo que mantendrían las señales de Documento
+            ArchivoAlmacenado.referenciar_varios([e.blob for e in pendientes])
+            for elemento in pendientes:
+                if elemento.existente:
+                    ArchivoAlmacenado.liberar(elemento.existente[1])
+            for subarticulo_id, año in {(e.tipo_documento.subarticulo_id, e.año) for e in pendientes}:
+                DisponibilidadAnual.recalcular(subarticulo_id, año)
+            ids = [documento.pk for documento in nuevos + reemplazados]
+            IndiceBusqueda.objects.filter(documento_id__in=ids).update(contenido='')
+            IndiceBusqueda.reindexar(Documento.objects.filter(pk__in=ids))
+            transaction.on_commit(lambda: documentos_cargados.send(sender=Documento, documentos=ids))
+            if al_confirmar is not None:
+                al_confirmar(pendientes)
+    except IntegrityError:
+        # Otro proceso creó un documento para un destino del lote después de validar
+        ArchivoAlmacenado.descartar([e.blob for e in pendientes])
+        raise ErrorCarga(['Otro usuario subió un documento para alguno de estos periodos mientras se '
+                          'cargaba el lote; vuelva a intentarlo.'])
+    except Exception:
+        ArchivoAlmacenado.descartar([e.blob for e in pendientes])
+        raise
+
+    resumen['documentos'] = ids
+    resumen['segundos'] = time.monotonic() - inicio
+    return resumen
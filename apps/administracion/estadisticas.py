@@ -0,0 +1,114 @@
+"""
+Consultas de estadísticas de acceso sobre las tablas de resumen diario
+(LogAccesoDiario / LogAccesoDiarioIP). Los días que aún no agrega el comando
+agregar_accesos (normalmente solo el día de hoy) se suman en vivo desde LogAcceso.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import connection
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Documento, LogAcceso, LogAccesoDiario, LogAccesoDiarioIP
+
+
+def inicio_del_dia(fecha):
+    """Primer instante del día en la zona horaria del proyecto"""
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def marca_agregacion():
+    """Último día incluido en el resumen diario (None si nunca se ha agregado)"""
+    return LogAccesoDiario.objects.aggregate(marca=Max('fecha'))['marca']
+
+
+def accesos_en_vivo():
+    """LogAcceso posteriores al último día agregado"""
+    queryset = LogAcceso.objects.order_by()
+    marca = marca_agregacion()
+    if marca is not None:
+        queryset = queryset.filter(fecha_acceso__gte=inicio_del_dia(marca + timedelta(days=1)))
+    return queryset
+
+
+def _mayores(resumen, en_vivo, clave, limite):
+    """
+    [(clave, total)] de mayor a menor total: suma ambos agregados con UNION ALL,
+    ordena y limita en la base de datos (no se traen todos los grupos a Python)
+    """
+    sql_resumen, params_resumen = resumen.query.sql_with_params()
+    sql_en_vivo, params_en_vivo = en_vivo.query.sql_with_params()
+    columna = connection.ops.quote_name(clave)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {columna}, SUM(total) AS total FROM ({sql_resumen} UNION ALL {sql_en_vivo}) AS accesos '
+            f'GROUP BY {columna} ORDER BY total DESC, {columna} LIMIT %s',
+            [*params_resumen, *params_en_vivo, limite]
+        )
+        return cursor.fetchall()
+
+
+def totales_por_mes(tipo_acceso, desde):
+    """{(año, mes): total} de accesos del tipo indicado desde la fecha dada"""
+    totales = {}
+    resumen = LogAccesoDiario.objects.filter(
+        tipo_acceso=tipo_acceso, fecha__gte=desde
+    ).annotate(mes=TruncMonth('fecha')).values('mes').annotate(total=Sum('total')).order_by()
+    en_vivo = accesos_en_vivo().filter(
+        tipo_acceso=tipo_acceso, fecha_acceso__gte=inicio_del_dia(desde)
+    ).annotate(mes=TruncMonth('fecha_acceso')).values('mes').annotate(total=Count('id')).order_by()
+
+    for filas in (resumen, en_vivo):
+        for fila in filas:
+            clave = (fila['mes'].year, fila['mes'].month)
+            totales[clave] = totales.get(clave, 0) + fila['total']
+    return totales
+
+
+def total_accesos(tipo_acceso, documentos=None):
+    """Total de accesos del tipo indicado, opcionalmente limitado a un queryset de documentos"""
+    resumen = LogAccesoDiario.objects.filter(tipo_acceso=tipo_acceso)
+    en_vivo = accesos_en_vivo().filter(tipo_acceso=tipo_acceso)
+    if documentos is not None:
+        resumen = resumen.filter(documento__in=documentos)
+        en_vivo = en_vivo.filter(documento__in=documentos)
+    return (resumen.aggregate(total=Sum('total'))['total'] or 0) + en_vivo.count()
+
+
+def top_documentos(tipo_acceso, limite, documentos=None, atributo='total_accesos'):
+    """
+    Documentos con más accesos del tipo indicado. Cada documento devuelto lleva
+    el total en el atributo `atributo`.
+    """
+    resumen = LogAccesoDiario.objects.filter(tipo_acceso=tipo_acceso)
+    en_vivo = accesos_en_vivo().filter(tipo_acceso=tipo_acceso)
+    if documentos is not None:
+        resumen = resumen.filter(documento__in=documentos)
+        en_vivo = en_vivo.filter(documento__in=documentos)
+
+    totales = dict(_mayores(
+        resumen.values('documento_id').annotate(total=Sum('total')).order_by(),
+        en_vivo.values('documento_id').annotate(total=Count('id')).order_by(),
+        'documento_id', limite
+    ))
+    ids = list(totales)
+    por_id = Documento.objects.select_related('tipo_documento__subarticulo__ley').in_bulk(ids)
+
+    resultado = []
+    for documento_id in ids:
+        documento = por_id.get(documento_id)
+        if documento is not None:
+            setattr(documento, atributo, totales[documento_id])
+            resultado.append(documento)
+    return resultado
+
+
+def top_ips(limite):
+    """[{'ip_address': ..., 'total_accesos': ...}] de las IP con más accesos"""
+    filas = _mayores(
+        LogAccesoDiarioIP.objects.values('ip_address').annotate(total=Sum('total')).order_by(),
+        accesos_en_vivo().values('ip_address').annotate(total=Count('id')).order_by(),
+        'ip_address', limite
+    )
+    return [{'ip_address': ip, 'total_accesos': total} for ip, total in filas]
@@ -1,6 +1,5 @@
 from django import forms
-from django.db.models import Q
-from .models import Documento, TipoDocumento, SubArticulo, PerfilUsuario
+from .models import Documento, TipoDocumento, SubArticulo, PerfilUsuario, filtrar_por_alcance
 
 
 class DocumentoForm(forms.ModelForm):
@@ -52,20 +51,9 @@ class DocumentoForm(forms.ModelForm):
             'subarticulo__ley__orden', 'subarticulo__orden', 'orden'
         )
         
-        # Filtrar según el tipo de usuario
-        if self.user and hasattr(self.user, 'perfil'):
-            perfil = self.user.perfil
-            if perfil.tipo_usuario == 'RECURSOS_MATERIALES':
-                # Solo documentos del subarticulo inventarios físicos de bienes
-                queryset = queryset.filter(
-                    subarticulo__nombre__icontains='inventario'
-                ).filter(subarticulo__nombre__icontains='físico')
-            elif perfil.tipo_usuario == 'PLANEACION':
-                # Todo excepto documentos del subarticulo inventarios físicos de bienes
-                queryset = queryset.exclude(
-                    Q(subarticulo__nombre__icontains='inventario') & 
-                    Q(subarticulo__nombre__icontains='físico')
-                )
+        # Filtrar según el alcance del tipo de usuario
+        if self.user:
+            queryset = filtrar_por_alcance(queryset, self.user, campo='subarticulo_id')
         
         self.fields['tipo_documento'].queryset = queryset
         
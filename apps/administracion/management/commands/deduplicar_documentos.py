@@ -0,0 +1,99 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.administracion.almacenamiento import (
+    PREFIJO_BLOBS, nombre_blob, obtener_almacenamiento, sha256_archivo, sha256_de
+)
+from apps.administracion.models import ArchivoAlmacenado, Documento
+
+
+def legible(tamaño):
+    for unidad in ['B', 'KB', 'MB', 'GB']:
+        if tamaño < 1024.0:
+            return f'{tamaño:.1f} {unidad}'
+        tamaño /= 1024.0
+    return f'{tamaño:.1f} TB'
+
+
+class Command(BaseCommand):
+    help = (
+        'Pasa los PDF de media/documentos al almacenamiento por contenido (un archivo por SHA-256), '
+        'actualiza los documentos y elimina las copias repetidas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo informar, sin modificar nada')
+
+    def handle(self, *args, **options):
+        almacenamiento = obtener_almacenamiento()
+        simulacion = options['dry_run']
+        procesados = repetidos = faltantes = 0
+        liberado = 0
+        blobs_vistos = set()
+
+        rutas = Documento.objects.exclude(archivo='').values_list('archivo', flat=True).distinct()
+        for nombre in [n for n in rutas if sha256_de(n) is None]:
+            ruta = almacenamiento.path(nombre)
+            if not os.path.exists(ruta):
+                faltantes += 1
+                self.stderr.write(f'No existe el archivo {nombre}')
+                continue
+
+            sha256 = sha256_archivo(ruta)
+            blob = nombre_blob(sha256)
+            ruta_blob = almacenamiento.path(blob)
+            existe = os.path.exists(ruta_blob) or sha256 in blobs_vistos
+            blobs_vistos.add(sha256)
+            procesados += 1
+            if existe:
+                repetidos += 1
+                # La copia solo libera espacio si no hay otro enlace al mismo inodo
+                if os.stat(ruta).st_nlink == 1:
+                    liberado += os.path.getsize(ruta)
+            if simulacion:
+                continue
+
+            if not os.path.exists(ruta_blob):
+                os.makedirs(os.path.dirname(ruta_blob), exist_ok=True)
+                os.link(ruta, ruta_blob)
+            with transaction.atomic():
+                # update() no dispara señales ni cambia fecha_modificacion (ETag de las descargas)
+                Documento.objects.filter(archivo=nombre, nombre_archivo='').update(
+                    nombre_archivo=os.path.basename(nombre)
+                )
+                Documento.objects.filter(archivo=nombre).update(archivo=blob, sha256=sha256)
+            os.remove(ruta)
+
+        if not simulacion:
+            ArchivoAlmacenado.reconstruir()
+            liberado += self.eliminar_huerfanos(almacenamiento)
+            self.eliminar_directorios_vacios(almacenamiento.path('documentos'))
+
+        prefijo = '[simulación] ' if simulacion else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {prefijo}{procesados} archivos procesados, {repetidos} repetidos, '
+            f'{faltantes} faltantes. Espacio liberado: {legible(liberado)}'
+        ))
+
+    def eliminar_huerfanos(self, almacenamiento):
+        """Blobs sin ningún documento (p. ej. de una subida que falló)"""
+        usados = set(ArchivoAlmacenado.objects.values_list('sha256', flat=True))
+        liberado = 0
+        raiz = almacenamiento.path(PREFIJO_BLOBS)
+        for directorio, subdirectorios, archivos in os.walk(raiz):
+            subdirectorios[:] = [d for d in subdirectorios if d != '.tmp']
+            for archivo in archivos:
+                ruta = os.path.join(directorio, archivo)
+                sha256 = sha256_de(os.path.relpath(ruta, almacenamiento.path('')).replace(os.sep, '/'))
+                if sha256 and sha256 not in usados:
+                    if os.stat(ruta).st_nlink == 1:
+                        liberado += os.path.getsize(ruta)
+                    os.remove(ruta)
+        return liberado
+
+    def eliminar_directorios_vacios(self, raiz):
+        for directorio, _, _ in sorted(os.walk(raiz), key=lambda d: -len(d[0])):
+            if directorio != raiz and not os.listdir(directorio):
+                os.rmdir(directorio)
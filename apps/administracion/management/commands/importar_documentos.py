@@ -0,0 +1,147 @@
+import csv
+import os
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.administracion.carga_masiva import Elemento, ErrorCarga, cargar, validar
+from apps.administracion.models import TipoDocumento
+from .deduplicar_documentos import legible
+
+
+TRIMESTRE_RE = re.compile(r'(?:^|[^a-z0-9])t([1-4])(?![0-9])', re.IGNORECASE)
+COLUMNAS = ['archivo', 'tipo_documento', 'año', 'trimestre']
+VERDADERO = {'1', 'si', 'sí', 'true', 'x'}
+
+
+def normalizar(nombre):
+    return ' '.join(nombre.split()).casefold()
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa muchos documentos de una vez desde un directorio '
+        '<ley>/<sub-artículo>/<tipo de documento>/<año>/<archivo>.pdf (el trimestre se toma del '
+        'nombre del archivo: T1 a T4) o desde un CSV con las columnas archivo, tipo_documento '
+        '(id o "ley/sub-artículo/tipo"), año y trimestre, y opcionalmente titulo_personalizado, '
+        'descripcion y activo. Todo se valida antes de escribir; las filas se insertan en una transacción'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('origen', help='Directorio o archivo CSV')
+        parser.add_argument('--reemplazar', action='store_true',
+                            help='Reemplazar el archivo de los documentos que ya existen (por defecto se omiten)')
+        parser.add_argument('--hilos', type=int, default=4, help='Archivos que se copian en paralelo')
+        parser.add_argument('--usuario', help='Usuario que figura como autor de la subida')
+        parser.add_argument('--dry-run', action='store_true', help='Solo validar e informar, sin modificar nada')
+
+    def handle(self, *args, **options):
+        origen = options['origen']
+        self.tipos_por_id = {}
+        self.tipos_por_ruta = {}
+        for tipo in TipoDocumento.objects.select_related('subarticulo__ley'):
+            self.tipos_por_id[tipo.pk] = tipo
+            ruta = (tipo.subarticulo.ley.nombre, tipo.subarticulo.nombre, tipo.nombre)
+            self.tipos_por_ruta[tuple(normalizar(parte) for parte in ruta)] = tipo
+
+        usuario = None
+        if options['usuario']:
+            usuario = User.objects.filter(username=options['usuario']).first()
+            if usuario is None:
+                raise CommandError(f'No existe el usuario {options["usuario"]}')
+
+        if os.path.isdir(origen):
+            elementos, errores = self.leer_directorio(origen)
+        elif os.path.isfile(origen):
+            elementos, errores = self.leer_csv(origen)
+        else:
+            raise CommandError(f'No existe {origen}')
+
+        try:
+            if errores:
+                # Informar también de los problemas de los archivos que sí se reconocieron
+                raise ErrorCarga(errores + validar(elementos, usuario))
+            resumen = cargar(
+                elementos, usuario=usuario, reemplazar=options['reemplazar'],
+                hilos=options['hilos'], simulacion=options['dry_run']
+            )
+        except ErrorCarga as e:
+            for error in e.errores:
+                self.stderr.write(f'  {error}')
+            raise CommandError(f'No se importó nada: {len(e.errores)} errores')
+
+        segundos = max(resumen['segundos'], 0.001)
+        procesados = resumen['creados'] + resumen['reemplazados']
+        prefijo = '[simulación] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {prefijo}{resumen["creados"]} creados, {resumen["reemplazados"]} reemplazados, '
+            f'{resumen["omitidos"]} omitidos (ya existían). {legible(resumen["bytes"])} en {segundos:.1f}s: '
+            f'{procesados / segundos:.1f} documentos/s, {legible(resumen["bytes"] / segundos)}/s'
+        ))
+
+    def buscar_tipo(self, valor, origen, errores):
+        valor = valor.strip()
+        if valor.isdigit():
+            tipo = self.tipos_por_id.get(int(valor))
+        else:
+            tipo = self.tipos_por_ruta.get(tuple(normalizar(parte) for parte in valor.split('/')))
+        if tipo is None:
+            errores.append(f'{origen}: no existe el tipo de documento "{valor}"')
+        return tipo
+
+    def leer_directorio(self, raiz):
+        elementos, errores = [], []
+        for directorio, subdirectorios, archivos in os.walk(raiz):
+            subdirectorios.sort()
+            for archivo in sorted(archivos):
+                ruta = os.path.join(directorio, archivo)
+                relativa = os.path.relpath(ruta, raiz)
+                partes = relativa.split(os.sep)
+                if archivo.startswith('.'):
+                    continue
+                if len(partes) != 5:
+                    errores.append(f'{relativa}: se esperaba <ley>/<sub-artículo>/<tipo>/<año>/<archivo>.pdf')
+                    continue
+                ley, subarticulo, tipo, año, _ = partes
+                tipo = self.buscar_tipo(f'{ley}/{subarticulo}/{tipo}', relativa, errores)
+                if not año.isdigit():
+                    errores.append(f'{relativa}: "{año}" no es un año')
+                    continue
+                if tipo is None:
+                    continue
+                trimestre = None
+                if tipo.subarticulo.periodicidad != 'ANUAL':
+                    coincidencia = TRIMESTRE_RE.search(os.path.splitext(archivo)[0])
+                    trimestre = f'T{coincidencia.group(1)}' if coincidencia else None
+                elementos.append(Elemento(tipo, int(año), trimestre, ruta, origen=relativa))
+        return elementos, errores
+
+    def leer_csv(self, ruta_csv):
+        elementos, errores = [], []
+        base = os.path.dirname(os.path.abspath(ruta_csv))
+        with open(ruta_csv, newline='', encoding='utf-8-sig') as archivo:
+            lector = csv.DictReader(archivo)
+            faltantes = [columna for columna in COLUMNAS if columna not in (lector.fieldnames or [])]
+            if faltantes:
+                raise CommandError(f'Faltan columnas en el CSV: {", ".join(faltantes)}')
+            for numero, fila in enumerate(lector, start=2):
+                origen = f'línea {numero}'
+                tipo = self.buscar_tipo(fila['tipo_documento'] or '', origen, errores)
+                if not (fila['año'] or '').strip().isdigit():
+                    errores.append(f'{origen}: "{fila["año"]}" no es un año')
+                    continue
+                if tipo is None:
+                    continue
+                campos = {}
+                for campo in ('titulo_personalizado', 'descripcion'):
+                    if (fila.get(campo) or '').strip():
+                        campos[campo] = fila[campo].strip()
+                if (fila.get('activo') or '').strip():
+                    campos['activo'] = fila['activo'].strip().casefold() in VERDADERO
+                elementos.append(Elemento(
+                    tipo, int(fila['año']), (fila['trimestre'] or '').strip().upper() or None,
+                    os.path.join(base, fila['archivo'].strip()), origen=f'{origen} ({fila["archivo"].strip()})',
+                    **campos
+                ))
+        return elementos, errores
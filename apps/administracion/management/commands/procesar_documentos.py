@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.administracion.models import Documento
+from apps.administracion.procesamiento import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = (
+        'Procesa en segundo plano los PDF pendientes (validación, linealización, páginas y miniatura). '
+        'Se pueden ejecutar varios procesos a la vez'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help='Vaciar la cola y terminar')
+        parser.add_argument('--intervalo', type=float, default=5.0,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--reprocesar', action='store_true',
+                            help='Volver a encolar todos los documentos antes de empezar')
+
+    def handle(self, *args, **options):
+        if options['reprocesar']:
+            total = Documento.objects.update(estado_procesamiento='PENDIENTE', fecha_procesamiento=None)
+            self.stdout.write(f'{total} documentos encolados')
+
+        if options['una_vez']:
+            procesados = procesar_pendientes()
+            self.stdout.write(self.style.SUCCESS(f'✅ {procesados} documentos procesados'))
+            return
+
+        self.stdout.write('Procesando documentos pendientes (Ctrl+C para salir)...')
+        try:
+            while True:
+                close_old_connections()
+                if not procesar_pendientes(limite=50):
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
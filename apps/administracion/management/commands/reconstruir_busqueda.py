@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.administracion.models import IndiceBusqueda
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye el índice de búsqueda a partir de los documentos (tras cargas masivas sin señales). '
+        'El texto de los PDF se conserva; para volver a extraerlo: procesar_documentos --reprocesar'
+    )
+
+    def handle(self, *args, **options):
+        IndiceBusqueda.reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Índice de búsqueda reconstruido: {IndiceBusqueda.objects.count()} documentos'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.administracion.models import DisponibilidadAnual
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de años disponibles por sub-artículo (tras cargas masivas sin señales)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subarticulo', type=int, help='Reconstruir solo este sub-artículo')
+
+    def handle(self, *args, **options):
+        DisponibilidadAnual.reconstruir(options['subarticulo'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Índice de disponibilidad reconstruido: {DisponibilidadAnual.objects.count()} filas'
+        ))
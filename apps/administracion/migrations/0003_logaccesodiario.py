@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0002_perfilusuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogAccesoDiarioIP',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('ip_address', models.GenericIPAddressField()),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Acceso Diario por IP',
+                'verbose_name_plural': 'Accesos Diarios por IP',
+                'ordering': ['-fecha'],
+                'unique_together': {('fecha', 'ip_address')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LogAccesoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo_acceso', models.CharField(choices=[('VISUALIZACION', 'Visualización'), ('DESCARGA', 'Descarga')], max_length=20)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('documento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accesos_diarios', to='administracion.documento')),
+            ],
+            options={
+                'verbose_name': 'Acceso Diario',
+                'verbose_name_plural': 'Accesos Diarios',
+                'ordering': ['-fecha'],
+                'unique_together': {('fecha', 'documento', 'tipo_acceso')},
+            },
+        ),
+    ]
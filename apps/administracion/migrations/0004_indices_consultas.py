@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0003_logaccesodiario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documento',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['tipo_documento', 'año', 'trimestre'], name='doc_tipo_anio_trim_act_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documento',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['año', 'tipo_documento'], name='doc_anio_tipo_act_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logacceso',
+            index=models.Index(fields=['tipo_acceso', 'fecha_acceso'], name='log_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logacceso',
+            index=models.Index(fields=['documento', 'tipo_acceso'], name='log_documento_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logacceso',
+            index=models.Index(fields=['fecha_acceso'], name='log_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logacceso',
+            index=models.Index(fields=['ip_address'], name='log_ip_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def asignar_alcances(apps, schema_editor):
+    """Materializa la regla anterior basada en el nombre del sub-artículo"""
+    SubArticulo = apps.get_model('administracion', 'SubArticulo')
+    AlcanceTipoUsuario = apps.get_model('administracion', 'AlcanceTipoUsuario')
+    alcances = []
+    for subarticulo in SubArticulo.objects.all():
+        nombre = subarticulo.nombre.lower()
+        es_inventario_fisico = 'inventario' in nombre and 'físico' in nombre
+        alcances.append(AlcanceTipoUsuario(
+            tipo_usuario='RECURSOS_MATERIALES' if es_inventario_fisico else 'PLANEACION',
+            subarticulo=subarticulo
+        ))
+    AlcanceTipoUsuario.objects.bulk_create(alcances)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0004_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlcanceTipoUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_usuario', models.CharField(choices=[('ADMIN', 'Administrador'), ('RECURSOS_MATERIALES', 'Recursos Materiales'), ('PLANEACION', 'Planeación')], max_length=20)),
+                ('subarticulo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alcances', to='administracion.subarticulo')),
+            ],
+            options={
+                'verbose_name': 'Alcance por Tipo de Usuario',
+                'verbose_name_plural': 'Alcances por Tipo de Usuario',
+                'ordering': ['tipo_usuario', 'subarticulo__orden'],
+                'unique_together': {('tipo_usuario', 'subarticulo')},
+            },
+        ),
+        migrations.RunPython(asignar_alcances, migrations.RunPython.noop),
+    ]
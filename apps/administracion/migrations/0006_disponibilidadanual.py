@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max
+
+
+def construir_disponibilidad(apps, schema_editor):
+    """Índice inicial a partir de los documentos activos existentes"""
+    Documento = apps.get_model('administracion', 'Documento')
+    DisponibilidadAnual = apps.get_model('administracion', 'DisponibilidadAnual')
+    filas = Documento.objects.filter(activo=True).values('tipo_documento__subarticulo_id', 'año').annotate(
+        total=Count('id'), subida=Max('fecha_subida'), modificacion=Max('fecha_modificacion')
+    ).order_by()
+    DisponibilidadAnual.objects.bulk_create([
+        DisponibilidadAnual(
+            subarticulo_id=fila['tipo_documento__subarticulo_id'],
+            año=fila['año'],
+            total_documentos=fila['total'],
+            ultima_actualizacion=max(filter(None, [fila['subida'], fila['modificacion']]), default=None)
+        )
+        for fila in filas
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0005_alcancetipousuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DisponibilidadAnual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('año', models.IntegerField()),
+                ('total_documentos', models.PositiveIntegerField(default=0)),
+                ('ultima_actualizacion', models.DateTimeField(blank=True, null=True)),
+                ('subarticulo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disponibilidad', to='administracion.subarticulo')),
+            ],
+            options={
+                'verbose_name': 'Disponibilidad Anual',
+                'verbose_name_plural': 'Disponibilidad Anual',
+                'ordering': ['subarticulo', 'año'],
+                'unique_together': {('subarticulo', 'año')},
+            },
+        ),
+        migrations.RunPython(construir_disponibilidad, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('administracion', '0006_disponibilidadanual'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaDocumento',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('año', models.IntegerField(choices=[(2019, 2019), (2020, 2020), (2021, 2021), (2022, 2022), (2023, 2023), (2024, 2024), (2025, 2025), (2026, 2026), (2027, 2027), (2028, 2028), (2029, 2029), (2030, 2030), (2031, 2031), (2032, 2032)])),
+                ('trimestre', models.CharField(blank=True, choices=[('T1', 'Primer Trimestre'), ('T2', 'Segundo Trimestre'), ('T3', 'Tercer Trimestre'), ('T4', 'Cuarto Trimestre')], max_length=2, null=True)),
+                ('activo', models.BooleanField(default=True)),
+                ('nombre_archivo', models.CharField(max_length=255)),
+                ('tamaño_total', models.PositiveBigIntegerField()),
+                ('recibido', models.PositiveBigIntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True)),
+                ('tipo_documento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas', to='administracion.tipodocumento')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Subida de Documento',
+                'verbose_name_plural': 'Subidas de Documentos',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:18
+
+import apps.administracion.almacenamiento
+import apps.administracion.models
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0007_subidadocumento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoAlmacenado',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('tamaño', models.PositiveBigIntegerField(default=0)),
+                ('referencias', models.PositiveIntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archivo Almacenado',
+                'verbose_name_plural': 'Archivos Almacenados',
+            },
+        ),
+        migrations.AddField(
+            model_name='documento',
+            name='nombre_archivo',
+            field=models.CharField(blank=True, default='', help_text='Nombre con el que se descarga el archivo', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='documento',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='documento',
+            name='archivo',
+            field=models.FileField(help_text='Solo se permiten archivos PDF', storage=apps.administracion.almacenamiento.obtener_almacenamiento, upload_to=apps.administracion.models.documento_upload_path, validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf'])]),
+        ),
+    ]
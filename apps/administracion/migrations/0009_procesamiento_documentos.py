@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0008_almacenamiento_por_contenido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documento',
+            name='error_procesamiento',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='documento',
+            name='estado_procesamiento',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('LISTO', 'Listo'), ('ERROR', 'Error')], default='PENDIENTE', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='documento',
+            name='fecha_procesamiento',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='documento',
+            name='linealizado',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='documento',
+            name='miniatura',
+            field=models.FileField(blank=True, editable=False, upload_to='miniaturas/'),
+        ),
+        migrations.AddField(
+            model_name='documento',
+            name='num_paginas',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='documento',
+            index=models.Index(fields=['estado_procesamiento', 'fecha_procesamiento'], name='doc_procesamiento_idx'),
+        ),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+TABLA = 'administracion_indicebusqueda'
+COLUMNAS = ['titulo', 'contexto', 'descripcion', 'contenido']
+
+# PostgreSQL: tsvector generado con pesos A-D (título, contexto, descripción, texto
+# del PDF) y derivación en español, con índice GIN
+POSTGRESQL = [
+    f"""
+    ALTER TABLE {TABLA} ADD COLUMN vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(contexto, '')), 'B') ||
+        setweight(to_tsvector('spanish', coalesce(descripcion, '')), 'C') ||
+        setweight(to_tsvector('spanish', coalesce(contenido, '')), 'D')
+    ) STORED
+    """,
+    f'CREATE INDEX {TABLA}_vector_idx ON {TABLA} USING GIN (vector)',
+]
+POSTGRESQL_REVERSO = [f'DROP INDEX IF EXISTS {TABLA}_vector_idx', f'ALTER TABLE {TABLA} DROP COLUMN vector']
+
+# SQLite: tabla FTS5 de contenido externo sincronizada con triggers. Si una
+# migración futura reconstruye la tabla del índice, hay que volver a crear los triggers.
+_nuevos = ', '.join(f'new.{c}' for c in COLUMNAS)
+_viejos = ', '.join(f'old.{c}' for c in COLUMNAS)
+_columnas = ', '.join(COLUMNAS)
+SQLITE = [
+    f"""
+    CREATE VIRTUAL TABLE {TABLA}_fts USING fts5(
+        {_columnas}, content='{TABLA}', content_rowid='documento_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {TABLA}_ai AFTER INSERT ON {TABLA} BEGIN
+        INSERT INTO {TABLA}_fts(rowid, {_columnas}) VALUES (new.documento_id, {_nuevos});
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABLA}_ad AFTER DELETE ON {TABLA} BEGIN
+        INSERT INTO {TABLA}_fts({TABLA}_fts, rowid, {_columnas}) VALUES ('delete', old.documento_id, {_viejos});
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABLA}_au AFTER UPDATE OF {_columnas} ON {TABLA} BEGIN
+        INSERT INTO {TABLA}_fts({TABLA}_fts, rowid, {_columnas}) VALUES ('delete', old.documento_id, {_viejos});
+        INSERT INTO {TABLA}_fts(rowid, {_columnas}) VALUES (new.documento_id, {_nuevos});
+    END
+    """,
+]
+SQLITE_REVERSO = [f'DROP TRIGGER IF EXISTS {TABLA}_{t}' for t in ('ai', 'ad', 'au')] + [f'DROP TABLE IF EXISTS {TABLA}_fts']
+
+
+def _ejecutar(schema_editor, sentencias):
+    for sentencia in sentencias:
+        schema_editor.execute(sentencia)
+
+
+def crear_indice_texto(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRESQL)
+    elif vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE)
+
+
+def eliminar_indice_texto(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRESQL_REVERSO)
+    elif vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_REVERSO)
+
+
+def poblar_indice(apps, schema_editor):
+    """Metadatos de los documentos existentes; el texto lo extrae procesar_documentos --reprocesar"""
+    Documento = apps.get_model('administracion', 'Documento')
+    IndiceBusqueda = apps.get_model('administracion', 'IndiceBusqueda')
+    trimestres = {'T1': 'Primer Trimestre', 'T2': 'Segundo Trimestre',
+                  'T3': 'Tercer Trimestre', 'T4': 'Cuarto Trimestre'}
+    filas = []
+    for documento in Documento.objects.select_related('tipo_documento__subarticulo__ley').iterator():
+        tipo = documento.tipo_documento
+        subarticulo = tipo.subarticulo
+        ley = subarticulo.ley
+        filas.append(IndiceBusqueda(
+            documento_id=documento.pk,
+            titulo=' '.join(filter(None, [tipo.nombre, documento.titulo_personalizado])),
+            contexto=' '.join(filter(None, [subarticulo.nombre, ley.nombre, str(documento.año),
+                                            trimestres.get(documento.trimestre, '')])),
+            descripcion=documento.descripcion or '',
+            visible=documento.activo and tipo.activo and subarticulo.activo and ley.activa,
+        ))
+    IndiceBusqueda.objects.bulk_create(filas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0009_procesamiento_documentos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBusqueda',
+            fields=[
+                ('documento', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='indice_busqueda', serialize=False, to='administracion.documento')),
+                ('titulo', models.TextField(blank=True, default='')),
+                ('contexto', models.TextField(blank=True, default='')),
+                ('descripcion', models.TextField(blank=True, default='')),
+                ('contenido', models.TextField(blank=True, default='', help_text='Texto extraído del PDF')),
+                ('visible', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Índice de Búsqueda',
+                'verbose_name_plural': 'Índice de Búsqueda',
+            },
+        ),
+        migrations.RunPython(crear_indice_texto, eliminar_indice_texto),
+        migrations.RunPython(poblar_indice, migrations.RunPython.noop),
+    ]
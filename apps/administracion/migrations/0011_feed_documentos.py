@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0010_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documento',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['fecha_modificacion', 'id'], name='doc_modificacion_act_idx'),
+        ),
+    ]
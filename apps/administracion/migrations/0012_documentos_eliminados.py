@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0011_feed_documentos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoEliminado',
+            fields=[
+                ('documento_id', models.PositiveBigIntegerField(primary_key=True, serialize=False)),
+                ('fecha_eliminacion', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Documento Eliminado',
+                'verbose_name_plural': 'Documentos Eliminados',
+                'ordering': ['fecha_eliminacion', 'documento_id'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='documento',
+            name='doc_modificacion_act_idx',
+        ),
+        migrations.AddIndex(
+            model_name='documento',
+            index=models.Index(fields=['fecha_modificacion', 'id'], name='doc_modificacion_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:50
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0012_documentos_eliminados'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='logacceso',
+            name='fecha_acceso',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
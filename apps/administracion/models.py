@@ -1,9 +1,20 @@
 from django.db import models
 from django.contrib.auth.models import User, Group
 from django.core.validators import FileExtensionValidator
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 import os
+import uuid
+import threading
+import time
+from collections import Counter
+
+from .almacenamiento import obtener_almacenamiento, sha256_de
 
 # Opciones para los tipos de periodicidad
 PERIODICIDAD_CHOICES = [
@@ -19,6 +30,20 @@ TRIMESTRE_CHOICES = [
     ('T4', 'Cuarto Trimestre'),
 ]
 
+# Estado del procesamiento en segundo plano de los PDF (ver procesamiento.py)
+ESTADO_PROCESAMIENTO_CHOICES = [
+    ('PENDIENTE', 'Pendiente'),
+    ('PROCESANDO', 'Procesando'),
+    ('LISTO', 'Listo'),
+    ('ERROR', 'Error'),
+]
+
+# Tipos de acceso a documentos
+TIPO_ACCESO_CHOICES = [
+    ('VISUALIZACION', 'Visualización'),
+    ('DESCARGA', 'Descarga'),
+]
+
 # Años disponibles
 from datetime import datetime
 YEAR_CHOICES = [(r, r) for r in range(2019, datetime.now().year + 7)]
@@ -45,17 +70,26 @@ class PerfilUsuario(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.get_tipo_usuario_display()}"
     
+    def subarticulos_permitidos(self):
+        """Ids de sub-artículos permitidos para el usuario (None = sin restricción)"""
+        if self.tipo_usuario == 'ADMIN':
+            return None
+        return AlcanceTipoUsuario.subarticulos_permitidos(self.tipo_usuario)
+    
     def puede_subir_documento(self, tipo_documento):
         """Verifica si el usuario puede subir un tipo específico de documento"""
-        if self.tipo_usuario == 'ADMIN':
-            return True
-        elif self.tipo_usuario == 'RECURSOS_MATERIALES':
-            # Solo puede subir documentos del subarticulo "Inventario Físico de Bienes"
-            return 'inventario' in tipo_documento.subarticulo.nombre.lower() and 'físico' in tipo_documento.subarticulo.nombre.lower()
-        elif self.tipo_usuario == 'PLANEACION':
-            # Puede subir todo EXCEPTO documentos del subarticulo "Inventario Físico de Bienes"
-            return not ('inventario' in tipo_documento.subarticulo.nombre.lower() and 'físico' in tipo_documento.subarticulo.nombre.lower())
-        return False
+        permitidos = self.subarticulos_permitidos()
+        return permitidos is None or tipo_documento.subarticulo_id in permitidos
+
+
+def filtrar_por_alcance(queryset, user, campo='tipo_documento__subarticulo_id'):
+    """Limita un queryset a los sub-artículos permitidos para el usuario"""
+    if not hasattr(user, 'perfil'):
+        return queryset
+    permitidos = user.perfil.subarticulos_permitidos()
+    if permitidos is None:
+        return queryset
+    return queryset.filter(**{f'{campo}__in': permitidos})
 
 
 @receiver(post_save, sender=User)
@@ -100,6 +134,72 @@ class SubArticulo(models.Model):
         return f"{self.ley.nombre} - {self.nombre}"
 
 
+def es_inventario_fisico(nombre):
+    """Sub-artículo "Inventario Físico de Bienes" (regla para asignar alcances por defecto)"""
+    nombre = nombre.lower()
+    return 'inventario' in nombre and 'físico' in nombre
+
+
+# Caché por proceso de los alcances; la versión vive en la caché de Django
+# para que todos los procesos vean los cambios hechos desde el admin
+_alcances_cache = {'version': None, 'subarticulos': {}}
+_alcances_lock = threading.Lock()
+
+
+class AlcanceTipoUsuario(models.Model):
+    """Sub-artículos en los que puede publicar cada tipo de usuario (ADMIN no tiene restricción)"""
+    tipo_usuario = models.CharField(max_length=20, choices=TIPO_USUARIO_CHOICES)
+    subarticulo = models.ForeignKey(SubArticulo, on_delete=models.CASCADE, related_name='alcances')
+    
+    VERSION_KEY = 'administracion:alcances:version'
+    
+    class Meta:
+        verbose_name = "Alcance por Tipo de Usuario"
+        verbose_name_plural = "Alcances por Tipo de Usuario"
+        ordering = ['tipo_usuario', 'subarticulo__orden']
+        unique_together = ['tipo_usuario', 'subarticulo']
+    
+    def __str__(self):
+        return f"{self.get_tipo_usuario_display()} - {self.subarticulo.nombre}"
+    
+    @classmethod
+    def subarticulos_permitidos(cls, tipo_usuario):
+        """frozenset con los ids de sub-artículos permitidos para el tipo de usuario"""
+        version = cache.get(cls.VERSION_KEY, 0)
+        with _alcances_lock:
+            if version != _alcances_cache['version']:
+                _alcances_cache['version'] = version
+                _alcances_cache['subarticulos'] = {}
+            subarticulos = _alcances_cache['subarticulos']
+            if tipo_usuario not in subarticulos:
+                subarticulos[tipo_usuario] = frozenset(
+                    cls.objects.filter(tipo_usuario=tipo_usuario).values_list('subarticulo_id', flat=True)
+                )
+            return subarticulos[tipo_usuario]
+    
+    @classmethod
+    def invalidar_cache(cls):
+        try:
+            cache.incr(cls.VERSION_KEY)
+        except ValueError:
+            # Si la clave se perdió, una versión nueva que no pueda coincidir con la anterior
+            cache.set(cls.VERSION_KEY, time.time_ns(), timeout=None)
+
+
+@receiver(post_save, sender=SubArticulo)
+def asignar_alcances_por_defecto(sender, instance, created, **kwargs):
+    """Asignar los sub-artículos nuevos a los tipos de usuario que les corresponden"""
+    if created:
+        tipo_usuario = 'RECURSOS_MATERIALES' if es_inventario_fisico(instance.nombre) else 'PLANEACION'
+        AlcanceTipoUsuario.objects.get_or_create(tipo_usuario=tipo_usuario, subarticulo=instance)
+
+
+@receiver(post_save, sender=AlcanceTipoUsuario)
+@receiver(post_delete, sender=AlcanceTipoUsuario)
+def invalidar_alcances(sender, **kwargs):
+    AlcanceTipoUsuario.invalidar_cache()
+
+
 class TipoDocumento(models.Model):
     """Modelo para los tipos específicos de documentos"""
     subarticulo = models.ForeignKey(SubArticulo, on_delete=models.CASCADE, related_name='tipos_documento')
@@ -130,6 +230,16 @@ def documento_upload_path(instance, filename):
         return f'documentos/ley_{ley_id}/sub_{subarticulo_id}/{instance.año}/{filename}'
 
 
+class DocumentoQuerySet(models.QuerySet):
+    
+    def resumen_por_año(self):
+        """values() con el total y la fecha más reciente (subida o modificación) por sub-artículo y año"""
+        return self.values('tipo_documento__subarticulo_id', 'año').annotate(
+            total=models.Count('id'),
+            ultima=models.Max(Greatest('fecha_subida', 'fecha_modificacion'))
+        ).order_by()
+
+
 class Documento(models.Model):
     """Modelo principal para los documentos PDF"""
     tipo_documento = models.ForeignKey(TipoDocumento, on_delete=models.CASCADE, related_name='documentos')
@@ -139,9 +249,23 @@ class Documento(models.Model):
     # Archivo PDF
     archivo = models.FileField(
         upload_to=documento_upload_path,
+        storage=obtener_almacenamiento,
         validators=[FileExtensionValidator(allowed_extensions=['pdf'])],
         help_text="Solo se permiten archivos PDF"
     )
+    # El archivo se guarda por contenido (ver almacenamiento.py); este es el nombre de descarga
+    nombre_archivo = models.CharField(max_length=255, blank=True, default='',
+                                      help_text="Nombre con el que se descarga el archivo")
+    sha256 = models.CharField(max_length=64, blank=True, null=True, db_index=True, editable=False)
+    
+    # Procesamiento en segundo plano: validación, linealización, páginas y miniatura
+    estado_procesamiento = models.CharField(max_length=20, choices=ESTADO_PROCESAMIENTO_CHOICES,
+                                            default='PENDIENTE', editable=False)
+    error_procesamiento = models.TextField(blank=True, default='', editable=False)
+    fecha_procesamiento = models.DateTimeField(null=True, blank=True, editable=False)
+    num_paginas = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    linealizado = models.BooleanField(default=False, editable=False)
+    miniatura = models.FileField(upload_to='miniaturas/', blank=True, editable=False)
     
     # Metadatos
     titulo_personalizado = models.CharField(max_length=300, blank=True, null=True, 
@@ -157,11 +281,28 @@ class Documento(models.Model):
     # Estado
     activo = models.BooleanField(default=True)
     
+    objects = DocumentoQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Documento"
         verbose_name_plural = "Documentos"
         ordering = ['-año', '-trimestre', 'tipo_documento__orden']
         unique_together = ['tipo_documento', 'año', 'trimestre']
+        indexes = [
+            # Cola del procesamiento en segundo plano
+            models.Index(fields=['estado_procesamiento', 'fecha_procesamiento'], name='doc_procesamiento_idx'),
+            # Rejilla pública y años disponibles: solo documentos activos
+            models.Index(
+                fields=['tipo_documento', 'año', 'trimestre'],
+                name='doc_tipo_anio_trim_act_idx',
+                condition=models.Q(activo=True)
+            ),
+            models.Index(fields=['año', 'tipo_documento'], name='doc_anio_tipo_act_idx',
+                         condition=models.Q(activo=True)),
+            # Feed y manifiesto por (fecha_modificacion, id); sin condición porque en
+            # modo delta también salen los documentos retirados
+            models.Index(fields=['fecha_modificacion', 'id'], name='doc_modificacion_idx'),
+        ]
     
     def __str__(self):
         if self.trimestre:
@@ -170,21 +311,37 @@ class Documento(models.Model):
             return f"{self.tipo_documento.nombre} - {self.año}"
     
     def save(self, *args, **kwargs):
-        # Calcular tamaño del archivo automáticamente
-        if self.archivo:
-            self.tamaño_archivo = self.archivo.size
-        
-        # Validar trimestre según periodicidad
+        # Validar trimestre según periodicidad (antes de guardar el archivo, para
+        # no dejar en disco un blob sin documento)
         periodicidad = self.tipo_documento.subarticulo.periodicidad
         if periodicidad == 'ANUAL':
             self.trimestre = None
         elif periodicidad == 'TRIMESTRAL' and not self.trimestre:
             raise ValueError("Los documentos trimestrales requieren especificar el trimestre")
         
+        # Un archivo nuevo se encola para el procesamiento en segundo plano
+        if self._state.adding or (self.archivo and not self.archivo._committed):
+            self.estado_procesamiento = 'PENDIENTE'
+            self.error_procesamiento = ''
+            self.linealizado = False
+        
+        # Archivo nuevo: conservar su nombre y guardarlo ya para conocer su SHA-256
+        if self.archivo and not self.archivo._committed:
+            self.nombre_archivo = os.path.basename(self.archivo.name)
+            self.archivo.save(self.archivo.name, self.archivo.file, save=False)
+        if self.archivo:
+            self.sha256 = sha256_de(self.archivo.name)
+        
+        # Calcular tamaño del archivo automáticamente
+        if self.archivo:
+            self.tamaño_archivo = self.archivo.size
+        
         super().save(*args, **kwargs)
     
     def get_nombre_archivo(self):
-        """Obtiene solo el nombre del archivo sin la ruta"""
+        """Nombre de descarga del archivo (sin la ruta)"""
+        if self.nombre_archivo:
+            return self.nombre_archivo
         if self.archivo:
             return os.path.basename(self.archivo.name)
         return None
@@ -206,21 +363,460 @@ class Documento(models.Model):
         return max(self.fecha_subida, self.fecha_modificacion)
 
 
+# Caché por proceso del índice de disponibilidad (mismo esquema que los alcances)
+_disponibilidad_cache = {'version': None, 'indice': None}
+_disponibilidad_lock = threading.Lock()
+
+
+class DisponibilidadAnual(models.Model):
+    """Índice desnormalizado de años con documentos activos por sub-artículo"""
+    subarticulo = models.ForeignKey(SubArticulo, on_delete=models.CASCADE, related_name='disponibilidad')
+    año = models.IntegerField()
+    total_documentos = models.PositiveIntegerField(default=0)
+    ultima_actualizacion = models.DateTimeField(null=True, blank=True)
+    
+    VERSION_KEY = 'administracion:disponibilidad:version'
+    
+    class Meta:
+        verbose_name = "Disponibilidad Anual"
+        verbose_name_plural = "Disponibilidad Anual"
+        ordering = ['subarticulo', 'año']
+        unique_together = ['subarticulo', 'año']
+    
+    def __str__(self):
+        return f"{self.subarticulo.nombre} - {self.año} ({self.total_documentos})"
+    
+    @classmethod
+    def indice(cls):
+        """{subarticulo_id: {año: (total_documentos, ultima_actualizacion)}} en memoria"""
+        version = cache.get(cls.VERSION_KEY, 0)
+        with _disponibilidad_lock:
+            if version != _disponibilidad_cache['version'] or _disponibilidad_cache['indice'] is None:
+                indice = {}
+                for fila in cls.objects.values_list('subarticulo_id', 'año', 'total_documentos', 'ultima_actualizacion'):
+                    indice.setdefault(fila[0], {})[fila[1]] = (fila[2], fila[3])
+                _disponibilidad_cache['indice'] = indice
+                _disponibilidad_cache['version'] = version
+            return _disponibilidad_cache['indice']
+    
+    @classmethod
+    def años(cls, subarticulo_id, desde=None, hasta=None):
+        """Años con documentos activos del sub-artículo, en orden ascendente"""
+        return sorted(
+            año for año in cls.indice().get(subarticulo_id, {})
+            if (desde is None or año >= desde) and (hasta is None or año <= hasta)
+        )
+    
+    @classmethod
+    def año_preferido(cls, subarticulo_id, año):
+        """
+        `año` si tiene documentos; si no, el año más reciente con documentos o
+        `año` si no hay ninguno. Con subarticulo_id None considera todos.
+        """
+        indice = cls.indice()
+        if subarticulo_id is None:
+            años = {a for años_sub in indice.values() for a in años_sub}
+        else:
+            años = indice.get(subarticulo_id, {})
+        if año in años or not años:
+            return año
+        return max(años)
+    
+    @classmethod
+    def ultimas_actualizaciones(cls, subarticulo_id, años):
+        """{año: fecha más reciente de subida o modificación} para los años con documentos"""
+        años_sub = cls.indice().get(subarticulo_id, {})
+        return {año: años_sub[año][1] for año in años if año in años_sub and años_sub[año][1]}
+    
+    @classmethod
+    def ultima_actualizacion_de(cls, subarticulo_id, años):
+        """Fecha más reciente de subida o modificación de los documentos de esos años"""
+        return max(cls.ultimas_actualizaciones(subarticulo_id, años).values(), default=None)
+    
+    @classmethod
+    def recalcular(cls, subarticulo_id, año):
+        """Recalcula la fila (subarticulo, año) a partir de los documentos activos"""
+        filas = Documento.objects.filter(
+            tipo_documento__subarticulo_id=subarticulo_id, año=año, activo=True
+        ).resumen_por_año()
+        fila = next(iter(filas), None)
+        if fila:
+            cls.objects.update_or_create(
+                subarticulo_id=subarticulo_id, año=año,
+                defaults={'total_documentos': fila['total'], 'ultima_actualizacion': fila['ultima']}
+            )
+        else:
+            cls.objects.filter(subarticulo_id=subarticulo_id, año=año).delete()
+        cls.invalidar_cache()
+    
+    @classmethod
+    def reconstruir(cls, subarticulo_id=None):
+        """Reconstruye el índice completo (o el de un sub-artículo) tras cargas masivas"""
+        documentos = Documento.objects.filter(activo=True)
+        existentes = cls.objects.all()
+        if subarticulo_id is not None:
+            documentos = documentos.filter(tipo_documento__subarticulo_id=subarticulo_id)
+            existentes = existentes.filter(subarticulo_id=subarticulo_id)
+        filas = documentos.resumen_por_año()
+        with transaction.atomic():
+            existentes.delete()
+            cls.objects.bulk_create([
+                cls(
+                    subarticulo_id=fila['tipo_documento__subarticulo_id'],
+                    año=fila['año'],
+                    total_documentos=fila['total'],
+                    ultima_actualizacion=fila['ultima']
+                )
+                for fila in filas
+            ])
+        cls.invalidar_cache()
+    
+    @classmethod
+    def invalidar_cache(cls):
+        try:
+            cache.incr(cls.VERSION_KEY)
+        except ValueError:
+            # Si la clave se perdió, una versión nueva que no pueda coincidir con la anterior
+            cache.set(cls.VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _subarticulo_de(documento):
+    tipo_documento_id = documento.tipo_documento_id
+    return TipoDocumento.objects.filter(pk=tipo_documento_id).values_list('subarticulo_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Documento)
+def recordar_disponibilidad_anterior(sender, instance, **kwargs):
+    """
+    Guardar (sub-artículo, año) y archivo previos por si el documento cambia de
+    año, de tipo o de archivo
+    """
+    instance._disponibilidad_anterior = None
+    instance._archivo_anterior = None
+    if instance.pk:
+        anterior = Documento.objects.filter(pk=instance.pk).values_list(
+            'tipo_documento__subarticulo_id', 'año', 'archivo'
+        ).first()
+        if anterior:
+            instance._disponibilidad_anterior = anterior[:2]
+            instance._archivo_anterior = anterior[2]
+
+
+@receiver(post_save, sender=Documento)
+@receiver(post_delete, sender=Documento)
+def actualizar_disponibilidad(sender, instance, **kwargs):
+    claves = {(_subarticulo_de(instance), instance.año)}
+    anterior = getattr(instance, '_disponibilidad_anterior', None)
+    if anterior:
+        claves.add(anterior)
+    for subarticulo_id, año in claves:
+        if subarticulo_id is not None:
+            DisponibilidadAnual.recalcular(subarticulo_id, año)
+
+
+
+class ArchivoAlmacenado(models.Model):
+    """Contenido único del almacenamiento por contenido y cuántos documentos lo usan"""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    tamaño = models.PositiveBigIntegerField(default=0)
+    referencias = models.PositiveIntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Archivo Almacenado"
+        verbose_name_plural = "Archivos Almacenados"
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.referencias})"
+    
+    @classmethod
+    def referenciar(cls, nombre):
+        cls.referenciar_varios([nombre])
+    
+    @classmethod
+    def referenciar_varios(cls, nombres):
+        """Suma una referencia por nombre (dos consultas por contenido distinto)"""
+        almacenamiento = obtener_almacenamiento()
+        for nombre, total in Counter(n for n in nombres if sha256_de(n)).items():
+            sha256 = sha256_de(nombre)
+            cls.objects.get_or_create(sha256=sha256, defaults={'tamaño': almacenamiento.size(nombre)})
+            cls.objects.filter(sha256=sha256).update(referencias=F('referencias') + total)
+    
+    @classmethod
+    def liberar(cls, nombre):
+        """Resta una referencia; el blob se elimina cuando ya nadie lo usa"""
+        sha256 = sha256_de(nombre)
+        if sha256 is None:
+            return
+        with transaction.atomic():
+            archivo = cls.objects.select_for_update().filter(sha256=sha256).first()
+            if archivo is None:
+                return
+            if archivo.referencias > 1:
+                cls.objects.filter(sha256=sha256).update(referencias=F('referencias') - 1)
+                return
+            archivo.delete()
+        transaction.on_commit(lambda: cls._eliminar_si_huerfano(nombre))
+    
+    @classmethod
+    def _eliminar_si_huerfano(cls, nombre):
+        # Otro documento pudo volver a subir el mismo contenido entretanto
+        if not cls.objects.filter(sha256=sha256_de(nombre)).exists():
+            obtener_almacenamiento().delete(nombre)
+    
+    @classmethod
+    def descartar(cls, nombres):
+        """Elimina los blobs escritos por una operación revertida que ningún documento usa"""
+        for nombre in set(filter(sha256_de, nombres)):
+            cls._eliminar_si_huerfano(nombre)
+    
+    @classmethod
+    def reconstruir(cls):
+        """Recuenta las referencias a partir de los documentos (tras cargas masivas)"""
+        almacenamiento = obtener_almacenamiento()
+        conteos = Documento.objects.exclude(sha256__isnull=True).exclude(sha256='').values(
+            'sha256', 'archivo'
+        ).annotate(total=Count('id'))
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create([
+                cls(sha256=fila['sha256'], referencias=fila['total'],
+                    tamaño=almacenamiento.size(fila['archivo']) if almacenamiento.exists(fila['archivo']) else 0)
+                for fila in conteos
+            ])
+
+
+@receiver(post_save, sender=Documento)
+def referenciar_archivo(sender, instance, created, **kwargs):
+    anterior = getattr(instance, '_archivo_anterior', None)
+    if created or anterior != instance.archivo.name:
+        ArchivoAlmacenado.referenciar(instance.archivo.name)
+        if anterior:
+            ArchivoAlmacenado.liberar(anterior)
+
+
+@receiver(post_delete, sender=Documento)
+def liberar_archivo(sender, instance, **kwargs):
+    ArchivoAlmacenado.liberar(instance.archivo.name)
+
+
+@receiver(pre_save, sender=TipoDocumento)
+def recordar_subarticulo_anterior(sender, instance, **kwargs):
+    instance._subarticulo_anterior = None
+    if instance.pk:
+        instance._subarticulo_anterior = TipoDocumento.objects.filter(pk=instance.pk).values_list(
+            'subarticulo_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=TipoDocumento)
+def mover_disponibilidad(sender, instance, **kwargs):
+    """Si un tipo de documento cambia de sub-artículo, sus años se mueven con él"""
+    anterior = getattr(instance, '_subarticulo_anterior', None)
+    if anterior is not None and anterior != instance.subarticulo_id:
+        DisponibilidadAnual.reconstruir(anterior)
+        DisponibilidadAnual.reconstruir(instance.subarticulo_id)
+
+
+class IndiceBusqueda(models.Model):
+    """
+    Texto de cada documento para la búsqueda pública (ver apps/publico/busqueda.py).
+    El índice de texto completo lo mantiene la base de datos a partir de estas
+    columnas (migración 0010): columna tsvector con índice GIN en PostgreSQL y
+    tabla FTS5 sincronizada por triggers en SQLite.
+    """
+    documento = models.OneToOneField(Documento, on_delete=models.CASCADE, primary_key=True,
+                                     related_name='indice_busqueda')
+    titulo = models.TextField(blank=True, default='')
+    contexto = models.TextField(blank=True, default='')
+    descripcion = models.TextField(blank=True, default='')
+    contenido = models.TextField(blank=True, default='', help_text="Texto extraído del PDF")
+    # Documento, tipo, sub-artículo y ley activos
+    visible = models.BooleanField(default=True)
+    
+    CAMPOS_DOCUMENTO = {'tipo_documento', 'año', 'trimestre', 'titulo_personalizado', 'descripcion',
+                        'activo', 'archivo'}
+    
+    class Meta:
+        verbose_name = "Índice de Búsqueda"
+        verbose_name_plural = "Índice de Búsqueda"
+    
+    def __str__(self):
+        return self.titulo
+    
+    @staticmethod
+    def campos_de(documento, archivo_nuevo=False):
+        tipo = documento.tipo_documento
+        subarticulo = tipo.subarticulo
+        ley = subarticulo.ley
+        campos = {
+            'titulo': ' '.join(filter(None, [tipo.nombre, documento.titulo_personalizado])),
+            'contexto': ' '.join(filter(None, [
+                subarticulo.nombre, ley.nombre, str(documento.año),
+                documento.get_trimestre_display() if documento.trimestre else '',
+            ])),
+            'descripcion': documento.descripcion or '',
+            'visible': documento.activo and tipo.activo and subarticulo.activo and ley.activa,
+        }
+        # Archivo nuevo: el texto anterior ya no vale hasta que el worker lo extraiga
+        if archivo_nuevo:
+            campos['contenido'] = ''
+        return campos
+    
+    @classmethod
+    def actualizar(cls, documento, archivo_nuevo=False):
+        cls.objects.update_or_create(documento_id=documento.pk, defaults=cls.campos_de(documento, archivo_nuevo))
+    
+    @classmethod
+    def reindexar(cls, documentos):
+        """Recalcula los metadatos de varios documentos (cambios de tipo, sub-artículo o ley)"""
+        documentos = list(documentos.select_related('tipo_documento__subarticulo__ley'))
+        existentes = set(cls.objects.filter(documento__in=documentos).values_list('documento_id', flat=True))
+        nuevos, cambiados = [], []
+        for documento in documentos:
+            campos = cls.campos_de(documento)
+            fila = cls(documento_id=documento.pk, **campos)
+            (cambiados if documento.pk in existentes else nuevos).append(fila)
+        with transaction.atomic():
+            cls.objects.bulk_update(cambiados, ['titulo', 'contexto', 'descripcion', 'visible'], batch_size=500)
+            cls.objects.bulk_create(nuevos, batch_size=500)
+    
+    @classmethod
+    def reconstruir(cls):
+        """Índice de todos los documentos (tras cargas masivas); conserva el texto extraído"""
+        cls.objects.exclude(documento__in=Documento.objects.all()).delete()
+        cls.reindexar(Documento.objects.all())
+
+
+@receiver(post_save, sender=Documento)
+def indexar_documento(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields and not IndiceBusqueda.CAMPOS_DOCUMENTO & set(update_fields)):
+        return
+    # Un archivo nuevo vuelve a la cola (PENDIENTE); la copia linealizada que guarda
+    # el worker tiene el mismo texto y lo escribe él mismo
+    archivo_nuevo = (getattr(instance, '_archivo_anterior', None) != instance.archivo.name
+                     and instance.estado_procesamiento == 'PENDIENTE')
+    IndiceBusqueda.actualizar(instance, archivo_nuevo)
+
+
+@receiver(post_save, sender=TipoDocumento)
+def indexar_tipo_documento(sender, instance, created, **kwargs):
+    if not created:
+        IndiceBusqueda.reindexar(Documento.objects.filter(tipo_documento=instance))
+
+
+@receiver(post_save, sender=SubArticulo)
+def indexar_subarticulo(sender, instance, created, **kwargs):
+    if not created:
+        IndiceBusqueda.reindexar(Documento.objects.filter(tipo_documento__subarticulo=instance))
+
+
+@receiver(post_save, sender=Ley)
+def indexar_ley(sender, instance, created, **kwargs):
+    if not created:
+        IndiceBusqueda.reindexar(Documento.objects.filter(tipo_documento__subarticulo__ley=instance))
+
+class DocumentoEliminado(models.Model):
+    """Documentos eliminados, para que el manifiesto delta avise a los espejos"""
+    documento_id = models.PositiveBigIntegerField(primary_key=True)
+    fecha_eliminacion = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name = "Documento Eliminado"
+        verbose_name_plural = "Documentos Eliminados"
+        ordering = ['fecha_eliminacion', 'documento_id']
+    
+    def __str__(self):
+        return f"Documento {self.documento_id} eliminado el {self.fecha_eliminacion}"
+
+
+@receiver(post_delete, sender=Documento)
+def registrar_eliminacion(sender, instance, **kwargs):
+    DocumentoEliminado.objects.get_or_create(documento_id=instance.pk)
+
+
 class LogAcceso(models.Model):
     """Modelo para registrar accesos y descargas"""
     documento = models.ForeignKey(Documento, on_delete=models.CASCADE, related_name='logs_acceso')
     ip_address = models.GenericIPAddressField()
     user_agent = models.TextField(blank=True, null=True)
-    fecha_acceso = models.DateTimeField(auto_now_add=True)
-    tipo_acceso = models.CharField(max_length=20, choices=[
-        ('VISUALIZACION', 'Visualización'),
-        ('DESCARGA', 'Descarga'),
-    ])
+    # Se fija al encolar el acceso (publico/accesos.py), no al escribirlo en lote
+    fecha_acceso = models.DateTimeField(default=timezone.now, editable=False)
+    tipo_acceso = models.CharField(max_length=20, choices=TIPO_ACCESO_CHOICES)
     
     class Meta:
         verbose_name = "Log de Acceso"
         verbose_name_plural = "Logs de Acceso"
         ordering = ['-fecha_acceso']
+        indexes = [
+            models.Index(fields=['tipo_acceso', 'fecha_acceso'], name='log_tipo_fecha_idx'),
+            models.Index(fields=['documento', 'tipo_acceso'], name='log_documento_tipo_idx'),
+            models.Index(fields=['fecha_acceso'], name='log_fecha_idx'),
+            models.Index(fields=['ip_address'], name='log_ip_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.documento} - {self.tipo_acceso} - {self.fecha_acceso.strftime('%d/%m/%Y %H:%M')}"
\ No newline at end of file
+        return f"{self.documento} - {self.tipo_acceso} - {self.fecha_acceso.strftime('%d/%m/%Y %H:%M')}"
+
+
+class LogAccesoDiario(models.Model):
+    """Resumen diario de accesos por documento (lo alimenta el comando agregar_accesos)"""
+    fecha = models.DateField()
+    documento = models.ForeignKey(Documento, on_delete=models.CASCADE, related_name='accesos_diarios')
+    tipo_acceso = models.CharField(max_length=20, choices=TIPO_ACCESO_CHOICES)
+    total = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Acceso Diario"
+        verbose_name_plural = "Accesos Diarios"
+        ordering = ['-fecha']
+        unique_together = ['fecha', 'documento', 'tipo_acceso']
+    
+    def __str__(self):
+        return f"{self.documento} - {self.tipo_acceso} - {self.fecha.strftime('%d/%m/%Y')}: {self.total}"
+
+
+class LogAccesoDiarioIP(models.Model):
+    """Resumen diario de accesos por dirección IP (lo alimenta el comando agregar_accesos)"""
+    fecha = models.DateField()
+    ip_address = models.GenericIPAddressField()
+    total = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Acceso Diario por IP"
+        verbose_name_plural = "Accesos Diarios por IP"
+        ordering = ['-fecha']
+        unique_together = ['fecha', 'ip_address']
+    
+    def __str__(self):
+        return f"{self.ip_address} - {self.fecha.strftime('%d/%m/%Y')}: {self.total}"
+
+
+class SubidaDocumento(models.Model):
+    """
+    Subida fragmentada y reanudable de un PDF (ver subidas.py). Los fragmentos
+    se escriben en un archivo temporal; al finalizar se crea el Documento.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subidas')
+    tipo_documento = models.ForeignKey(TipoDocumento, on_delete=models.CASCADE, related_name='subidas')
+    año = models.IntegerField(choices=YEAR_CHOICES)
+    trimestre = models.CharField(max_length=2, choices=TRIMESTRE_CHOICES, blank=True, null=True)
+    activo = models.BooleanField(default=True)
+    nombre_archivo = models.CharField(max_length=255)
+    tamaño_total = models.PositiveBigIntegerField()
+    recibido = models.PositiveBigIntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_modificacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Subida de Documento"
+        verbose_name_plural = "Subidas de Documentos"
+        ordering = ['-fecha_creacion']
+    
+    def __str__(self):
+        return f"{self.nombre_archivo} ({self.recibido}/{self.tamaño_total})"
+    
+    @property
+    def completa(self):
+        return self.recibido == self.tamaño_total
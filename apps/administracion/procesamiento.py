@@ -0,0 +1,232 @@
+"""
+Procesamiento en segundo plano de los PDF subidos.
+
+La cola es la propia tabla de documentos: Documento.save marca como PENDIENTE
+los que traen un archivo nuevo y el comando procesar_documentos los reclama
+uno a uno (varios procesos pueden trabajar a la vez). Por cada documento se
+valida la estructura del PDF, se linealiza para que el visor del navegador
+muestre la primera página sin descargar el archivo completo, se cuentan las
+páginas, se genera una miniatura de la primera página y se extrae el texto
+para la búsqueda.
+
+La linealización, el conteo exacto, la miniatura y el texto usan qpdf,
+pdftoppm y pdftotext (poppler-utils) si están instalados; sin ellos solo se
+valida el archivo y se estima el número de páginas.
+"""
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .almacenamiento import sha256_de
+from .models import ArchivoAlmacenado, Documento, IndiceBusqueda
+
+
+logger = logging.getLogger(__name__)
+
+CABECERA_PDF = b'%PDF-'
+BLOQUE = 64 * 1024
+PAGINA_RE = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+# Se envía al confirmar el resultado del procesamiento, ya con el texto en el índice de búsqueda
+documento_procesado = Signal()
+
+
+class ErrorPDF(Exception):
+    pass
+
+
+def herramienta(nombre):
+    """Ruta de qpdf / pdftoppm / pdftotext o None. PROCESAMIENTO_<NOMBRE> fija la ruta ('' para no usarlo)"""
+    configurada = getattr(settings, f'PROCESAMIENTO_{nombre.upper()}', None)
+    if configurada is not None:
+        return configurada or None
+    return shutil.which(nombre)
+
+
+def _ejecutar(*argumentos):
+    return subprocess.run(
+        argumentos, capture_output=True, timeout=getattr(settings, 'PROCESAMIENTO_TIMEOUT', 120)
+    )
+
+
+def validar_estructura(ruta):
+    """Cabecera %PDF-, marca %%EOF final y, con qpdf, la tabla de referencias"""
+    with open(ruta, 'rb') as archivo:
+        if archivo.read(len(CABECERA_PDF)) != CABECERA_PDF:
+            raise ErrorPDF('El archivo no empieza con la cabecera %PDF-.')
+        archivo.seek(max(os.path.getsize(ruta) - 2048, 0))
+        if b'%%EOF' not in archivo.read():
+            raise ErrorPDF('El archivo está truncado (falta %%EOF).')
+
+    qpdf = herramienta('qpdf')
+    if qpdf:
+        # 0 = correcto, 3 = advertencias (el PDF se puede abrir), 2 = errores
+        resultado = _ejecutar(qpdf, '--check', ruta)
+        if resultado.returncode not in (0, 3):
+            raise ErrorPDF(resultado.stderr.decode(errors='replace').strip() or 'qpdf --check falló.')
+
+
+def contar_paginas(ruta):
+    qpdf = herramienta('qpdf')
+    if qpdf:
+        resultado = _ejecutar(qpdf, '--show-npages', ruta)
+        if resultado.returncode in (0, 3):
+            return int(resultado.stdout.strip())
+
+    # Estimación sin qpdf: objetos /Type /Page sin comprimir (None si no hay ninguno visible)
+    total = 0
+    anterior = b''
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(BLOQUE), b''):
+            datos = anterior + bloque
+            # Los últimos bytes pasan al bloque siguiente por si un objeto quedó partido
+            corte = len(datos) - 32 if len(bloque) == BLOQUE else len(datos)
+            total += sum(1 for coincidencia in PAGINA_RE.finditer(datos) if coincidencia.start() < corte)
+            anterior = datos[corte:]
+    return total or None
+
+
+def linealizar(ruta, directorio):
+    """Ruta de una copia linealizada, o None si ya lo está o no hay qpdf"""
+    qpdf = herramienta('qpdf')
+    if not qpdf:
+        return None
+    if _ejecutar(qpdf, '--check-linearization', ruta).returncode == 0:
+        return None
+    destino = os.path.join(directorio, 'linealizado.pdf')
+    resultado = _ejecutar(qpdf, '--linearize', ruta, destino)
+    if resultado.returncode not in (0, 3):
+        raise ErrorPDF(resultado.stderr.decode(errors='replace').strip() or 'qpdf --linearize falló.')
+    return destino
+
+
+def renderizar_miniatura(ruta, directorio):
+    """PNG de la primera página, o None si no hay pdftoppm"""
+    pdftoppm = herramienta('pdftoppm')
+    if not pdftoppm:
+        return None
+    prefijo = os.path.join(directorio, 'miniatura')
+    ancho = str(getattr(settings, 'PROCESAMIENTO_MINIATURA_ANCHO', 320))
+    resultado = _ejecutar(pdftoppm, '-png', '-f', '1', '-l', '1', '-singlefile', '-scale-to', ancho, ruta, prefijo)
+    if resultado.returncode != 0:
+        logger.warning('pdftoppm falló: %s', resultado.stderr.decode(errors='replace'))
+        return None
+    with open(f'{prefijo}.png', 'rb') as archivo:
+        return archivo.read()
+
+
+def extraer_texto(ruta):
+    """Texto del PDF para el índice de búsqueda (como máximo BUSQUEDA_MAX_CARACTERES)"""
+    pdftotext = herramienta('pdftotext')
+    if not pdftotext:
+        return ''
+    resultado = _ejecutar(pdftotext, '-q', '-enc', 'UTF-8', ruta, '-')
+    if resultado.returncode != 0:
+        logger.warning('pdftotext falló: %s', resultado.stderr.decode(errors='replace'))
+        return ''
+    texto = resultado.stdout.decode('utf-8', errors='replace')
+    # Saltos de página y espacios repetidos no aportan nada al índice
+    texto = re.sub(r'\s+', ' ', texto).strip()
+    return texto[:getattr(settings, 'BUSQUEDA_MAX_CARACTERES', 200000)]
+
+
+def reclamar_siguiente():
+    """
+    Marca como PROCESANDO el siguiente documento pendiente y lo devuelve. Los
+    que llevan más de PROCESAMIENTO_TIMEOUT_RECLAMO segundos en PROCESANDO (un
+    proceso que murió) vuelven a reclamarse.
+    """
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'PROCESAMIENTO_TIMEOUT_RECLAMO', 900))
+    candidatos = Documento.objects.filter(
+        Q(estado_procesamiento='PENDIENTE')
+        | Q(estado_procesamiento='PROCESANDO', fecha_procesamiento__lt=limite)
+    ).order_by('fecha_subida').values_list('pk', 'estado_procesamiento', 'fecha_procesamiento')[:20]
+    for pk, estado, fecha in candidatos:
+        # La actualización condicional garantiza que solo un proceso lo reclame
+        if Documento.objects.filter(pk=pk, estado_procesamiento=estado, fecha_procesamiento=fecha).update(
+            estado_procesamiento='PROCESANDO', fecha_procesamiento=timezone.now()
+        ):
+            return Documento.objects.select_related('tipo_documento__subarticulo').get(pk=pk)
+    return None
+
+
+def procesar(documento):
+    """Procesa un documento reclamado y guarda el resultado en el modelo"""
+    campos = ['estado_procesamiento', 'error_procesamiento', 'fecha_procesamiento',
+              'num_paginas', 'linealizado', 'miniatura', 'archivo', 'sha256', 'tamaño_archivo']
+    archivo_reclamado = documento.archivo.name
+    texto = ''
+    try:
+        ruta = documento.archivo.path
+        validar_estructura(ruta)
+        with tempfile.TemporaryDirectory() as directorio:
+            linealizado = linealizar(ruta, directorio)
+            if linealizado:
+                # Otro contenido, otro blob: el anterior se libera en la señal post_save
+                with open(linealizado, 'rb') as archivo:
+                    documento.archivo.save(documento.get_nombre_archivo(), File(archivo), save=False)
+                ruta = documento.archivo.path
+            # Con qpdf y sin copia nueva es que ya estaba linealizado
+            documento.linealizado = bool(linealizado) or herramienta('qpdf') is not None
+            documento.num_paginas = contar_paginas(ruta)
+            texto = extraer_texto(ruta)
+
+            png = renderizar_miniatura(ruta, directorio)
+            if png:
+                nombre = f'miniaturas/{sha256_de(documento.archivo.name) or documento.pk}.png'
+                if not default_storage.exists(nombre):
+                    nombre = default_storage.save(nombre, ContentFile(png))
+                documento.miniatura.name = nombre
+        documento.estado_procesamiento = 'LISTO'
+        documento.error_procesamiento = ''
+    except (ErrorPDF, OSError, subprocess.SubprocessError) as error:
+        logger.warning('No se pudo procesar el documento %s: %s', documento.pk, error)
+        documento.estado_procesamiento = 'ERROR'
+        documento.error_procesamiento = str(error)
+    documento.fecha_procesamiento = timezone.now()
+    archivo_nuevo = documento.archivo.name != archivo_reclamado
+    if archivo_nuevo:
+        # Cambian SHA-256 y tamaño: el feed y el manifiesto deben informarlo
+        campos.append('fecha_modificacion')
+        documento.fecha_modificacion = documento.fecha_procesamiento
+    with transaction.atomic():
+        actual = Documento.objects.select_for_update().filter(pk=documento.pk).values_list(
+            'archivo', 'estado_procesamiento'
+        ).first()
+        if actual != (archivo_reclamado, 'PROCESANDO'):
+            # Se reemplazó el archivo o se eliminó el documento mientras tanto: el
+            # resultado ya no vale (si el documento sigue, está otra vez en la cola)
+            if archivo_nuevo:
+                ArchivoAlmacenado.descartar([documento.archivo.name])
+            return None
+        # update_fields: no vuelve a encolar el documento; fecha_modificacion solo
+        # cambia si la linealización produjo otro archivo
+        documento.save(update_fields=campos)
+        IndiceBusqueda.objects.filter(documento_id=documento.pk).update(contenido=texto)
+        transaction.on_commit(lambda: documento_procesado.send(sender=Documento, documento=documento))
+    return documento
+
+
+def procesar_pendientes(limite=None):
+    """Procesa documentos pendientes hasta vaciar la cola (o `limite`); devuelve cuántos"""
+    procesados = 0
+    while limite is None or procesados < limite:
+        documento = reclamar_siguiente()
+        if documento is None:
+            break
+        procesar(documento)
+        procesados += 1
+    return procesados
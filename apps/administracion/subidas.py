@@ -0,0 +1,206 @@
+"""
+Subida fragmentada y reanudable de documentos PDF.
+
+El cliente abre una subida (SubidaDocumento), envía el archivo en fragmentos
+de como máximo SUBIDAS_FRAGMENTO_BYTES con su desplazamiento y su SHA-256, y
+la finaliza. Cada fragmento se copia del cuerpo de la petición al archivo
+temporal en bloques pequeños, así que la memoria usada no depende del tamaño
+del PDF. Si la conexión se corta, el cliente consulta `recibido` y continúa
+desde ahí. Al finalizar, el archivo temporal se enlaza como blob del
+almacenamiento por contenido y el Documento se crea dentro de una transacción.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .almacenamiento import sha256_archivo
+from .models import Documento, SubidaDocumento
+
+
+BLOQUE = 64 * 1024
+CABECERA_PDF = b'%PDF-'
+
+
+class ErrorSubida(Exception):
+    """Error de validación de una subida; `status` es el código HTTP a devolver"""
+
+    def __init__(self, mensaje, status=400, **datos):
+        super().__init__(mensaje)
+        self.status = status
+        self.datos = datos
+
+
+class ArchivoTemporal(File):
+    """Archivo ya escrito en disco: el almacenamiento lo enlaza en lugar de copiarlo"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def tamaño_fragmento():
+    return getattr(settings, 'SUBIDAS_FRAGMENTO_BYTES', 4 * 1024 * 1024)
+
+
+def tamaño_maximo():
+    return getattr(settings, 'SUBIDAS_MAXIMO_BYTES', 50 * 1024 * 1024)
+
+
+def directorio_temporal():
+    # Dentro de MEDIA_ROOT para que el blob se cree con un enlace, sin copiar los bytes
+    return getattr(settings, 'SUBIDAS_DIR', os.path.join(settings.MEDIA_ROOT, '.subidas'))
+
+
+def ruta_temporal(subida):
+    return os.path.join(directorio_temporal(), f'{subida.id}.part')
+
+
+def validar_destino(usuario, tipo_documento, año, trimestre):
+    """Permisos, periodicidad y duplicados; devuelve el trimestre normalizado"""
+    if hasattr(usuario, 'perfil') and not usuario.perfil.puede_subir_documento(tipo_documento):
+        raise ErrorSubida('No tiene permisos para subir este tipo de documento.', status=403)
+
+    periodicidad = tipo_documento.subarticulo.periodicidad
+    if periodicidad == 'ANUAL':
+        trimestre = None
+    elif not trimestre:
+        raise ErrorSubida('Los documentos trimestrales requieren especificar el trimestre.')
+
+    if Documento.objects.filter(tipo_documento=tipo_documento, año=año, trimestre=trimestre).exists():
+        periodo = f'{trimestre} de {año}' if trimestre else f'el año {año}'
+        raise ErrorSubida(f'Ya existe un documento de este tipo para {periodo}.', status=409)
+    return trimestre
+
+
+def iniciar(usuario, tipo_documento, año, trimestre, nombre_archivo, tamaño_total, activo=True):
+    """Valida el destino y crea la subida con su archivo temporal vacío"""
+    nombre_archivo = os.path.basename(nombre_archivo or '')
+    if not nombre_archivo.lower().endswith('.pdf'):
+        raise ErrorSubida('Solo se permiten archivos PDF.')
+    if not 0 < tamaño_total <= tamaño_maximo():
+        raise ErrorSubida(
+            f'El archivo debe pesar como máximo {tamaño_maximo() // (1024 * 1024)} MB.', status=413
+        )
+    trimestre = validar_destino(usuario, tipo_documento, año, trimestre)
+
+    limpiar_vencidas()
+    subida = SubidaDocumento.objects.create(
+        usuario=usuario, tipo_documento=tipo_documento, año=año, trimestre=trimestre,
+        activo=activo, nombre_archivo=nombre_archivo, tamaño_total=tamaño_total,
+    )
+    os.makedirs(directorio_temporal(), exist_ok=True)
+    open(ruta_temporal(subida), 'wb').close()
+    return subida
+
+
+def escribir_fragmento(subida, desplazamiento, flujo, longitud, sha256):
+    """
+    Añade un fragmento leído de `flujo` en la posición `desplazamiento`. Solo
+    se acepta el siguiente fragmento esperado; si el checksum no coincide, el
+    archivo vuelve a su longitud anterior y el fragmento puede reintentarse.
+    """
+    with transaction.atomic():
+        # Serializa los fragmentos de una misma subida
+        subida = SubidaDocumento.objects.select_for_update().get(pk=subida.pk)
+        if desplazamiento != subida.recibido:
+            raise ErrorSubida('Desplazamiento inesperado.', status=409, recibido=subida.recibido)
+        if not 0 < longitud <= tamaño_fragmento():
+            raise ErrorSubida(f'Los fragmentos deben ser de 1 a {tamaño_fragmento()} bytes.', status=413)
+        if desplazamiento + longitud > subida.tamaño_total:
+            raise ErrorSubida('El fragmento excede el tamaño declarado del archivo.')
+        if not sha256:
+            raise ErrorSubida('Falta el SHA-256 del fragmento.')
+
+        ruta = ruta_temporal(subida)
+        if not os.path.exists(ruta):
+            raise ErrorSubida('La subida ya no está disponible.', status=410)
+
+        digest = hashlib.sha256()
+        escritos = 0
+        with open(ruta, 'r+b') as archivo:
+            archivo.seek(desplazamiento)
+            while escritos < longitud:
+                bloque = flujo.read(min(BLOQUE, longitud - escritos))
+                if not bloque:
+                    break
+                digest.update(bloque)
+                archivo.write(bloque)
+                escritos += len(bloque)
+
+            if escritos != longitud or digest.hexdigest() != sha256.lower():
+                archivo.truncate(desplazamiento)
+                raise ErrorSubida(
+                    'El fragmento llegó incompleto o dañado; vuelva a enviarlo.',
+                    status=422, recibido=desplazamiento
+                )
+            archivo.flush()
+            os.fsync(archivo.fileno())
+
+        subida.recibido = desplazamiento + longitud
+        subida.save(update_fields=['recibido', 'fecha_modificacion'])
+    return subida
+
+
+def finalizar(subida, sha256=None):
+    """
+    Crea el Documento con el archivo completo. Todo o nada: el archivo temporal
+    solo se elimina si la transacción se confirma, así que si algo falla la
+    subida queda como estaba y puede finalizarse de nuevo.
+    """
+    with transaction.atomic():
+        subida = SubidaDocumento.objects.select_for_update().select_related(
+            'tipo_documento__subarticulo__ley', 'usuario'
+        ).get(pk=subida.pk)
+        if not subida.completa:
+            raise ErrorSubida('La subida no está completa.', status=409, recibido=subida.recibido)
+
+        ruta = ruta_temporal(subida)
+        with open(ruta, 'rb') as archivo:
+            if archivo.read(len(CABECERA_PDF)) != CABECERA_PDF:
+                raise ErrorSubida('El archivo no es un PDF válido.', status=422)
+        contenido_sha256 = sha256_archivo(ruta)
+        if sha256 and contenido_sha256 != sha256.lower():
+            raise ErrorSubida('El SHA-256 del archivo no coincide.', status=422)
+
+        trimestre = validar_destino(subida.usuario, subida.tipo_documento, subida.año, subida.trimestre)
+        documento = Documento(
+            tipo_documento=subida.tipo_documento,
+            año=subida.año,
+            trimestre=trimestre,
+            activo=subida.activo,
+            usuario_subida=subida.usuario,
+            nombre_archivo=subida.nombre_archivo,
+        )
+        with open(ruta, 'rb') as temporal:
+            archivo = ArchivoTemporal(temporal)
+            archivo.sha256 = contenido_sha256
+            documento.archivo.save(subida.nombre_archivo, archivo, save=False)
+        documento.save()
+        subida.delete()
+        transaction.on_commit(lambda: _eliminar_temporal(ruta))
+    return documento
+
+
+def cancelar(subida):
+    ruta = ruta_temporal(subida)
+    with transaction.atomic():
+        subida.delete()
+        transaction.on_commit(lambda: _eliminar_temporal(ruta))
+
+
+def _eliminar_temporal(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+
+
+def limpiar_vencidas():
+    """Elimina las subidas abandonadas (sin fragmentos en SUBIDAS_VIGENCIA_HORAS)"""
+    limite = timezone.now() - timedelta(hours=getattr(settings, 'SUBIDAS_VIGENCIA_HORAS', 24))
+    for subida in SubidaDocumento.objects.filter(fecha_modificacion__lt=limite):
+        cancelar(subida)
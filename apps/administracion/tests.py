@@ -1,3 +1,911 @@
-from django.test import TestCase
+import hashlib
+import os
+import random
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Ley, SubArticulo, TipoDocumento, Documento, LogAcceso, LogAccesoDiario, LogAccesoDiarioIP, AlcanceTipoUsuario,
+    DisponibilidadAnual, SubidaDocumento, ArchivoAlmacenado
+)
+from .forms import DocumentoForm
+from . import carga_masiva, estadisticas, subidas, procesamiento
+from .almacenamiento import nombre_blob
+
+
+class MediaTemporalMixin:
+    """MEDIA_ROOT en un directorio temporal por clase; ajustes_adicionales se sobrescriben a la vez"""
+
+    ajustes_adicionales = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.override = override_settings(MEDIA_ROOT=cls.media_root, **cls.ajustes_adicionales)
+        cls.override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+
+def crear_documentos(cantidad=2):
+    """Crea documentos anuales sin archivo físico (bulk_create omite Documento.save)"""
+    ley = Ley.objects.create(nombre='Ley de Prueba', orden=1)
+    subarticulo = SubArticulo.objects.create(ley=ley, nombre='Presupuesto', periodicidad='ANUAL')
+    tipo = TipoDocumento.objects.create(subarticulo=subarticulo, nombre='Presupuesto de Egresos')
+    año = timezone.now().year
+    return Documento.objects.bulk_create([
+        Documento(tipo_documento=tipo, año=año - i, archivo=f'documentos/prueba_{i}.pdf')
+        for i in range(cantidad)
+    ])
+
+
+def registrar_accesos(documento, tipo_acceso, cantidad, dias_atras=0, ip_address='10.0.0.1'):
+    """Crea logs de acceso con la fecha indicada"""
+    fecha = timezone.now() - timedelta(days=dias_atras)
+    logs = LogAcceso.objects.bulk_create([
+        LogAcceso(documento=documento, ip_address=ip_address, tipo_acceso=tipo_acceso)
+        for _ in range(cantidad)
+    ])
+    # auto_now_add fija la fecha al insertar; se ajusta después
+    LogAcceso.objects.filter(pk__in=[log.pk for log in logs]).update(fecha_acceso=fecha)
+
+
+class AgregarAccesosTest(TestCase):
+    """Resumen diario de accesos y estadísticas con el día en curso en vivo"""
+
+    def setUp(self):
+        self.doc_a, self.doc_b = crear_documentos()
+        registrar_accesos(self.doc_a, 'DESCARGA', 3, dias_atras=2)
+        registrar_accesos(self.doc_a, 'VISUALIZACION', 1, dias_atras=2, ip_address='10.0.0.2')
+        registrar_accesos(self.doc_b, 'DESCARGA', 1, dias_atras=1)
+
+    def test_agrega_solo_dias_completos_y_es_idempotente(self):
+        call_command('agregar_accesos', stdout=StringIO())
+        registrar_accesos(self.doc_b, 'DESCARGA', 4)
+
+        self.assertEqual(LogAccesoDiario.objects.count(), 3)
+        self.assertEqual(
+            LogAccesoDiario.objects.get(documento=self.doc_a, tipo_acceso='DESCARGA').total, 3
+        )
+        self.assertEqual(sum(LogAccesoDiarioIP.objects.filter(ip_address='10.0.0.1').values_list('total', flat=True)), 4)
+        self.assertEqual(estadisticas.marca_agregacion(), timezone.localdate() - timedelta(days=1))
+
+        call_command('agregar_accesos', stdout=StringIO())
+        call_command('agregar_accesos', desde=str(timezone.localdate() - timedelta(days=5)), stdout=StringIO())
+        self.assertEqual(LogAccesoDiario.objects.count(), 3)
+
+    def test_estadisticas_combinan_resumen_y_dia_en_curso(self):
+        call_command('agregar_accesos', stdout=StringIO())
+        registrar_accesos(self.doc_b, 'DESCARGA', 4, ip_address='10.0.0.9')
+        registrar_accesos(self.doc_b, 'VISUALIZACION', 1, ip_address='10.0.0.9')
+
+        self.assertEqual(estadisticas.total_accesos('DESCARGA'), 8)
+        self.assertEqual(estadisticas.total_accesos('VISUALIZACION'), 2)
+
+        top = estadisticas.top_documentos('DESCARGA', 10, atributo='num_descargas')
+        self.assertEqual([(doc.pk, doc.num_descargas) for doc in top], [(self.doc_b.pk, 5), (self.doc_a.pk, 3)])
+
+        with CaptureQueriesContext(connection) as consultas:
+            ips = estadisticas.top_ips(2)
+        # El orden y el límite se aplican en la base de datos
+        self.assertIn('LIMIT', consultas.captured_queries[-1]['sql'])
+        self.assertEqual(ips, [
+            {'ip_address': '10.0.0.9', 'total_accesos': 5},
+            {'ip_address': '10.0.0.1', 'total_accesos': 4},
+        ])
+
+        mes = timezone.localdate()
+        totales = estadisticas.totales_por_mes('DESCARGA', mes.replace(day=1) - timedelta(days=40))
+        self.assertEqual(sum(totales.values()), 8)
+
+    def test_sin_resumen_todo_se_calcula_en_vivo(self):
+        self.assertIsNone(estadisticas.marca_agregacion())
+        self.assertEqual(estadisticas.total_accesos('DESCARGA'), 4)
+
+    def test_dashboard_lee_del_resumen(self):
+        call_command('agregar_accesos', stdout=StringIO())
+        registrar_accesos(self.doc_b, 'VISUALIZACION', 2)
+        user = User.objects.create_user('admin', password='secreta')
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('administracion:dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_visualizaciones'], 3)
+        mas_vistos = response.context['documentos_mas_vistos']
+        self.assertEqual([(doc.pk, doc.num_visualizaciones) for doc in mas_vistos],
+                         [(self.doc_b.pk, 2), (self.doc_a.pk, 1)])
+
+
+def plan_de_consulta(sql):
+    """Plan de ejecución de una consulta SQL ya interpolada"""
+    prefijo = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefijo + sql)
+        return '\n'.join(' '.join(str(columna) for columna in fila) for fila in cursor.fetchall())
+
+
+def escaneos_secuenciales(plan, tablas):
+    """Tablas de la lista que el plan recorre completas sin usar un índice"""
+    encontradas = []
+    for tabla in tablas:
+        if connection.vendor == 'postgresql':
+            patron = rf'Seq Scan on {tabla}\b'
+        else:
+            patron = rf'\bSCAN (?:TABLE )?{tabla}\b(?! USING)'
+        if re.search(patron, plan):
+            encontradas.append(tabla)
+    return encontradas
+
+
+class PlanesDeConsultaTest(TestCase):
+    """Las consultas de las vistas principales deben usar índices sobre las tablas grandes"""
+
+    TABLAS_GRANDES = [Documento._meta.db_table, LogAcceso._meta.db_table]
+
+    @classmethod
+    def setUpTestData(cls):
+        # Volumen parecido al de producción: 10 sub-artículos x 9 tipos x 8 años x 4 trimestres
+        azar = random.Random(0)
+        ley = Ley.objects.create(nombre='Ley de Prueba', orden=1)
+        tipos = []
+        for i in range(10):
+            subarticulo = SubArticulo.objects.create(ley=ley, nombre=f'Sub-artículo {i}', periodicidad='TRIMESTRAL', orden=i)
+            tipos += [TipoDocumento(subarticulo=subarticulo, nombre=f'Tipo {j}', orden=j) for j in range(9)]
+        tipos = TipoDocumento.objects.bulk_create(tipos)
+        año_actual = timezone.now().year
+        documentos = Documento.objects.bulk_create([
+            Documento(tipo_documento=tipo, año=año, trimestre=trimestre, archivo='documentos/prueba.pdf')
+            for tipo in tipos
+            for año in range(año_actual - 7, año_actual + 1)
+            for trimestre in ['T1', 'T2', 'T3', 'T4']
+        ])
+        LogAcceso.objects.bulk_create([
+            LogAcceso(
+                documento=azar.choice(documentos),
+                ip_address=f'10.0.{azar.randint(0, 255)}.{azar.randint(0, 255)}',
+                tipo_acceso=azar.choice(['DESCARGA', 'VISUALIZACION'])
+            )
+            for _ in range(10000)
+        ], batch_size=1000)
+        LogAcceso.objects.update(fecha_acceso=timezone.now() - timedelta(days=30))
+        cls.subarticulo = SubArticulo.objects.first()
+        cls.año = año_actual
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertSinEscaneoSecuencial(self, consultas):
+        for consulta in consultas:
+            sql = consulta['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = plan_de_consulta(sql)
+            self.assertEqual(escaneos_secuenciales(plan, self.TABLAS_GRANDES), [], f'{sql}\n{plan}')
+
+    def test_vistas_publicas_del_subarticulo(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('publico:subarticulo_detail', args=[self.subarticulo.id]), {'año': self.año})
+            self.client.get(reverse('publico:api_subarticulo_content', args=[self.subarticulo.id]), {'año': self.año})
+        self.assertSinEscaneoSecuencial(consultas)
+
+    def test_estadisticas_en_vivo(self):
+        call_command('agregar_accesos', stdout=StringIO())
+        with CaptureQueriesContext(connection) as consultas:
+            estadisticas.total_accesos('DESCARGA')
+            estadisticas.top_documentos('DESCARGA', 10)
+            estadisticas.top_ips(10)
+            estadisticas.totales_por_mes('DESCARGA', timezone.localdate() - timedelta(days=365))
+        self.assertSinEscaneoSecuencial(consultas)
+
+
+class AlcanceTipoUsuarioTest(TestCase):
+    """Permisos por tipo de usuario materializados en AlcanceTipoUsuario"""
+
+    def setUp(self):
+        cache.clear()
+        ley = Ley.objects.create(nombre='Ley de Prueba', orden=1)
+        self.inventario = SubArticulo.objects.create(ley=ley, nombre='Inventario Físico de Bienes', periodicidad='ANUAL')
+        self.presupuesto = SubArticulo.objects.create(ley=ley, nombre='Presupuesto de Egresos', periodicidad='ANUAL')
+        self.tipo_inventario = TipoDocumento.objects.create(subarticulo=self.inventario, nombre='Inventario')
+        self.tipo_presupuesto = TipoDocumento.objects.create(subarticulo=self.presupuesto, nombre='Presupuesto')
+        año = timezone.now().year
+        Documento.objects.bulk_create([
+            Documento(tipo_documento=self.tipo_inventario, año=año, archivo='documentos/inventario.pdf'),
+            Documento(tipo_documento=self.tipo_presupuesto, año=año, archivo='documentos/presupuesto.pdf'),
+        ])
+
+    def crear_usuario(self, tipo_usuario):
+        user = User.objects.create_user(tipo_usuario.lower(), password='secreta')
+        user.perfil.tipo_usuario = tipo_usuario
+        user.perfil.save()
+        return User.objects.get(pk=user.pk)
+
+    def test_alcances_por_defecto_al_crear_subarticulo(self):
+        self.assertEqual(AlcanceTipoUsuario.subarticulos_permitidos('RECURSOS_MATERIALES'), {self.inventario.id})
+        self.assertEqual(AlcanceTipoUsuario.subarticulos_permitidos('PLANEACION'), {self.presupuesto.id})
+
+    def test_puede_subir_documento_sin_consultas(self):
+        perfil = self.crear_usuario('RECURSOS_MATERIALES').perfil
+        perfil.subarticulos_permitidos()
+
+        with self.assertNumQueries(0):
+            self.assertTrue(perfil.puede_subir_documento(self.tipo_inventario))
+            self.assertFalse(perfil.puede_subir_documento(self.tipo_presupuesto))
+
+        admin = self.crear_usuario('ADMIN').perfil
+        self.assertTrue(admin.puede_subir_documento(self.tipo_inventario))
+
+    def test_cambio_de_alcance_invalida_cache(self):
+        perfil = self.crear_usuario('PLANEACION').perfil
+        self.assertFalse(perfil.puede_subir_documento(self.tipo_inventario))
+
+        AlcanceTipoUsuario.objects.create(tipo_usuario='PLANEACION', subarticulo=self.inventario)
+
+        self.assertTrue(perfil.puede_subir_documento(self.tipo_inventario))
+
+    def test_listado_y_formulario_filtran_por_alcance(self):
+        user = self.crear_usuario('RECURSOS_MATERIALES')
+        self.client.force_login(user)
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('administracion:documento_list'))
+        self.assertEqual(
+            [doc.tipo_documento_id for doc in response.context['documentos']], [self.tipo_inventario.id]
+        )
+        self.assertFalse(any('LIKE' in consulta['sql'] for consulta in consultas))
+
+        form = DocumentoForm(user=user)
+        self.assertEqual(list(form.fields['tipo_documento'].queryset), [self.tipo_inventario])
+
+        response = self.client.get(reverse('administracion:dashboard'))
+        self.assertEqual(response.context['total_documentos'], 1)
+
+
+class DisponibilidadAnualTest(MediaTemporalMixin, TestCase):
+    """Índice de años disponibles mantenido por las señales de Documento"""
+
+    def setUp(self):
+        cache.clear()
+        ley = Ley.objects.create(nombre='Ley de Prueba', orden=1)
+        self.subarticulo = SubArticulo.objects.create(ley=ley, nombre='Presupuesto', periodicidad='ANUAL')
+        self.otro = SubArticulo.objects.create(ley=ley, nombre='Anexos', periodicidad='ANUAL')
+        self.tipo = TipoDocumento.objects.create(subarticulo=self.subarticulo, nombre='Presupuesto de Egresos')
+        self.año = timezone.now().year
+
+    def crear_documento(self, año, tipo=None):
+        return Documento.objects.create(
+            tipo_documento=tipo or self.tipo,
+            año=año,
+            archivo=SimpleUploadedFile(f'doc_{año}.pdf', b'%PDF-1.4', content_type='application/pdf')
+        )
+
+    def test_alta_cambio_y_baja_de_documentos(self):
+        documento = self.crear_documento(self.año - 1)
+        self.crear_documento(self.año - 2)
+        self.assertEqual(DisponibilidadAnual.años(self.subarticulo.id), [self.año - 2, self.año - 1])
+        self.assertEqual(
+            DisponibilidadAnual.ultima_actualizacion_de(self.subarticulo.id, [self.año - 1]),
+            Documento.objects.get(pk=documento.pk).fecha_modificacion
+        )
+
+        documento.año = self.año
+        documento.save()
+        self.assertEqual(DisponibilidadAnual.años(self.subarticulo.id), [self.año - 2, self.año])
+
+        documento.activo = False
+        documento.save()
+        self.assertEqual(DisponibilidadAnual.años(self.subarticulo.id), [self.año - 2])
+
+        Documento.objects.filter(año=self.año - 2).first().delete()
+        self.assertEqual(DisponibilidadAnual.años(self.subarticulo.id), [])
+        self.assertFalse(DisponibilidadAnual.objects.exists())
+
+    def test_ultima_actualizacion_es_la_mayor_de_subida_y_modificacion(self):
+        antiguo = self.crear_documento(self.año - 1)
+        reciente = self.crear_documento(self.año)
+        hace_un_mes = timezone.now() - timedelta(days=30)
+        # Modificación anterior a la subida en uno, subida anterior a la modificación en el otro
+        Documento.objects.filter(pk=antiguo.pk).update(fecha_modificacion=hace_un_mes)
+        Documento.objects.filter(pk=reciente.pk).update(fecha_subida=hace_un_mes)
+        antiguo.refresh_from_db()
+        reciente.refresh_from_db()
+
+        with self.assertNumQueries(1):
+            filas = list(Documento.objects.filter(tipo_documento=self.tipo).resumen_por_año())
+        ultimas = {fila['año']: fila['ultima'] for fila in filas}
+        self.assertEqual(ultimas, {self.año - 1: antiguo.fecha_subida, self.año: reciente.fecha_modificacion})
+
+        for año in (self.año - 1, self.año):
+            DisponibilidadAnual.recalcular(self.subarticulo.id, año)
+        self.assertEqual(
+            DisponibilidadAnual.ultimas_actualizaciones(self.subarticulo.id, [self.año - 1, self.año]), ultimas
+        )
+
+    def test_año_preferido(self):
+        self.assertEqual(DisponibilidadAnual.año_preferido(self.subarticulo.id, self.año), self.año)
+        self.crear_documento(self.año - 3)
+        self.crear_documento(self.año - 1, TipoDocumento.objects.create(subarticulo=self.otro, nombre='Anexo'))
+
+        self.assertEqual(DisponibilidadAnual.año_preferido(self.subarticulo.id, self.año), self.año - 3)
+        self.assertEqual(DisponibilidadAnual.año_preferido(None, self.año), self.año - 1)
+        self.assertEqual(DisponibilidadAnual.año_preferido(self.subarticulo.id, self.año - 3), self.año - 3)
+
+    def test_mover_tipo_de_subarticulo_y_reconstruir(self):
+        self.crear_documento(self.año)
+        self.tipo.subarticulo = self.otro
+        self.tipo.save()
+        self.assertEqual(DisponibilidadAnual.años(self.subarticulo.id), [])
+        self.assertEqual(DisponibilidadAnual.años(self.otro.id), [self.año])
+
+        DisponibilidadAnual.objects.all().delete()
+        call_command('reconstruir_disponibilidad', stdout=StringIO())
+        self.assertEqual(DisponibilidadAnual.años(self.otro.id), [self.año])
+
+    def test_redirecciones_sin_consultas_de_años(self):
+        self.crear_documento(self.año - 1)
+        DisponibilidadAnual.indice()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('publico:home'))
+        self.assertRedirects(response, f'/subarticulo/1/?año={self.año - 1}', fetch_redirect_response=False)
+
+        url = reverse('publico:subarticulo_detail', args=[self.subarticulo.id])
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertRedirects(response, f'{url}?año={self.año - 1}', fetch_redirect_response=False)
+
+
+@override_settings(SUBIDAS_FRAGMENTO_BYTES=1024)
+class SubidaFragmentadaTest(MediaTemporalMixin, TestCase):
+    """Subida de PDF por fragmentos reanudables"""
+
+    def setUp(self):
+        cache.clear()
+        ley = Ley.objects.create(nombre='Ley de Prueba', orden=1)
+        subarticulo = SubArticulo.objects.create(ley=ley, nombre='Presupuesto', periodicidad='TRIMESTRAL')
+        self.tipo = TipoDocumento.objects.create(subarticulo=subarticulo, nombre='Estado Analítico')
+        self.user = User.objects.create_user('admin', password='secreta')
+        self.user.perfil.tipo_usuario = 'ADMIN'
+        self.user.perfil.save()
+        self.client.force_login(self.user)
+        self.año = timezone.now().year
+        self.contenido = b'%PDF-1.4\n' + bytes(random.getrandbits(8) for _ in range(2500))
+
+    def iniciar(self, trimestre='T1', **extra):
+        datos = {
+            'tipo_documento': self.tipo.id, 'año': self.año, 'trimestre': trimestre,
+            'nombre': 'estado.pdf', 'tamaño': len(self.contenido), **extra
+        }
+        return self.client.post(reverse('administracion:api_subida_iniciar'), datos)
+
+    def enviar(self, subida_id, inicio, datos, sha256=None):
+        return self.client.put(
+            reverse('administracion:api_subida', args=[subida_id]), datos,
+            content_type='application/octet-stream',
+            headers={
+                'Content-Range': f'bytes {inicio}-{inicio + len(datos) - 1}/{len(self.contenido)}',
+                'X-Checksum-SHA256': sha256 or hashlib.sha256(datos).hexdigest(),
+            }
+        )
+
+    def test_subida_reanudable_y_finalizacion(self):
+        respuesta = self.iniciar().json()
+        subida_id = respuesta['id']
+        self.assertEqual((respuesta['recibido'], respuesta['tamaño_fragmento']), (0, 1024))
+
+        self.assertEqual(self.enviar(subida_id, 0, self.contenido[:1024]).json()['recibido'], 1024)
+
+        # Fragmento dañado: no avanza y el archivo temporal no crece
+        response = self.enviar(subida_id, 1024, self.contenido[1024:2048], sha256='0' * 64)
+        self.assertEqual((response.status_code, response.json()['recibido']), (422, 1024))
+        temporal = subidas.ruta_temporal(SubidaDocumento.objects.get())
+        self.assertEqual(os.path.getsize(temporal), 1024)
+
+        # Desplazamiento equivocado: el servidor indica desde dónde seguir
+        response = self.enviar(subida_id, 2048, self.contenido[2048:])
+        self.assertEqual((response.status_code, response.json()['recibido']), (409, 1024))
+
+        # Reanudar consultando el estado
+        recibido = self.client.get(reverse('administracion:api_subida', args=[subida_id])).json()['recibido']
+        while recibido < len(self.contenido):
+            response = self.enviar(subida_id, recibido, self.contenido[recibido:recibido + 1024])
+            recibido = response.json()['recibido']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('administracion:api_subida_finalizar', args=[subida_id]),
+                {'sha256': hashlib.sha256(self.contenido).hexdigest()}
+            )
+        self.assertEqual(response.status_code, 201)
+        documento = Documento.objects.get(pk=response.json()['documento'])
+        self.assertEqual((documento.trimestre, documento.usuario_subida, documento.tamaño_archivo),
+                         ('T1', self.user, len(self.contenido)))
+        with documento.archivo.open('rb') as archivo:
+            self.assertEqual(archivo.read(), self.contenido)
+        self.assertFalse(SubidaDocumento.objects.exists())
+        self.assertFalse(os.path.exists(temporal))
+        self.assertEqual(DisponibilidadAnual.años(self.tipo.subarticulo_id), [self.año])
+
+    def test_fragmentos_y_finalizacion_invalidos(self):
+        subida_id = self.iniciar().json()['id']
+        grande = self.contenido[:1025]
+        self.assertEqual(self.enviar(subida_id, 0, grande).status_code, 413)
+
+        self.enviar(subida_id, 0, self.contenido[:1024])
+        response = self.client.post(reverse('administracion:api_subida_finalizar', args=[subida_id]))
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Documento.objects.exists())
+
+        # Solo el dueño ve la subida
+        otro = User.objects.create_user('otro', password='secreta')
+        self.client.force_login(otro)
+        response = self.client.get(reverse('administracion:api_subida', args=[subida_id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_validaciones_al_iniciar(self):
+        self.assertEqual(self.iniciar(trimestre='').status_code, 400)
+        self.assertEqual(self.iniciar(nombre='estado.exe').status_code, 400)
+        self.assertEqual(self.iniciar(tamaño=60 * 1024 * 1024).status_code, 413)
+
+        Documento.objects.bulk_create([Documento(
+            tipo_documento=self.tipo, año=self.año, trimestre='T2', archivo='documentos/t2.pdf'
+        )])
+        self.assertEqual(self.iniciar(trimestre='T2').status_code, 409)
+
+        self.user.perfil.tipo_usuario = 'RECURSOS_MATERIALES'
+        self.user.perfil.save()
+        self.assertEqual(self.iniciar().status_code, 403)
+
+
+class AlmacenamientoPorContenidoTest(MediaTemporalMixin, TestCase):
+    """PDF guardados una sola vez por SHA-256 con conteo de referencias"""
+
+    def setUp(self):
+        cache.clear()
+        ley = Ley.objects.create(nombre='Ley de Prueba', orden=1)
+        subarticulo = SubArticulo.objects.create(ley=ley, nombre='Anexos', periodicidad='ANUAL')
+        self.tipo = TipoDocumento.objects.create(subarticulo=subarticulo, nombre='Anexo A')
+        self.otro_tipo = TipoDocumento.objects.create(subarticulo=subarticulo, nombre='Anexo B')
+        self.año = timezone.now().year
+        self.contenido = b'%PDF-1.4 anexo ' + os.urandom(64)
+        self.sha256 = hashlib.sha256(self.contenido).hexdigest()
+
+    def crear(self, tipo, nombre, contenido=None):
+        return Documento.objects.create(
+            tipo_documento=tipo, año=self.año,
+            archivo=SimpleUploadedFile(nombre, contenido or self.contenido, content_type='application/pdf')
+        )
+
+    def test_mismo_contenido_un_solo_blob(self):
+        primero = self.crear(self.tipo, 'anexo.pdf')
+        segundo = self.crear(self.otro_tipo, 'anexo (copia).pdf')
+
+        self.assertEqual(primero.archivo.name, nombre_blob(self.sha256))
+        self.assertEqual(segundo.archivo.name, primero.archivo.name)
+        self.assertEqual((primero.sha256, primero.tamaño_archivo), (self.sha256, len(self.contenido)))
+        self.assertEqual(segundo.get_nombre_archivo(), 'anexo (copia).pdf')
+        self.assertEqual(ArchivoAlmacenado.objects.get().referencias, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            primero.delete()
+        self.assertTrue(os.path.exists(segundo.archivo.path))
+        self.assertEqual(ArchivoAlmacenado.objects.get().referencias, 1)
+
+        # Reemplazar el archivo libera el contenido anterior
+        ruta = segundo.archivo.path
+        segundo.archivo = SimpleUploadedFile('nuevo.pdf', b'%PDF-1.4 nuevo')
+        with self.captureOnCommitCallbacks(execute=True):
+            segundo.save()
+        self.assertFalse(os.path.exists(ruta))
+        self.assertEqual(
+            list(ArchivoAlmacenado.objects.values_list('sha256', flat=True)),
+            [hashlib.sha256(b'%PDF-1.4 nuevo').hexdigest()]
+        )
+
+    def test_periodicidad_invalida_no_deja_blob(self):
+        trimestral = SubArticulo.objects.create(ley=self.tipo.subarticulo.ley, nombre='Estados', periodicidad='TRIMESTRAL')
+        tipo = TipoDocumento.objects.create(subarticulo=trimestral, nombre='Estado de Actividades')
+        antes = [archivo for _, _, archivos in os.walk(self.media_root) for archivo in archivos]
+        with self.assertRaises(ValueError):
+            self.crear(tipo, 'sin_trimestre.pdf')
+        self.assertEqual([archivo for _, _, archivos in os.walk(self.media_root) for archivo in archivos], antes)
+        self.assertFalse(ArchivoAlmacenado.objects.exists())
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=16)
+    def test_subida_multipart_calcula_hash_al_recibir(self):
+        user = User.objects.create_user('admin', password='secreta')
+        self.client.force_login(user)
+        response = self.client.post(reverse('administracion:documento_create'), {
+            'tipo_documento': self.tipo.id, 'año': self.año, 'activo': 'on',
+            'archivo': SimpleUploadedFile('presupuesto.pdf', self.contenido, content_type='application/pdf'),
+        })
+        self.assertEqual(response.status_code, 302)
+        documento = Documento.objects.get()
+        self.assertEqual((documento.sha256, documento.nombre_archivo), (self.sha256, 'presupuesto.pdf'))
+        with documento.archivo.open('rb') as archivo:
+            self.assertEqual(archivo.read(), self.contenido)
+
+    def test_comando_deduplica_el_arbol_existente(self):
+        rutas = ['documentos/ley_1/sub_1/2024/anexo.pdf', 'documentos/ley_1/sub_1/2024/anexo_x7Yz.pdf']
+        for ruta in rutas:
+            os.makedirs(os.path.join(self.media_root, os.path.dirname(ruta)), exist_ok=True)
+            with open(os.path.join(self.media_root, ruta), 'wb') as archivo:
+                archivo.write(self.contenido)
+        Documento.objects.bulk_create([
+            Documento(tipo_documento=self.tipo, año=self.año, archivo=rutas[0]),
+            Documento(tipo_documento=self.otro_tipo, año=self.año, archivo=rutas[1]),
+        ])
+
+        salida = StringIO()
+        call_command('deduplicar_documentos', '--dry-run', stdout=salida)
+        self.assertIn('1 repetidos', salida.getvalue())
+        self.assertTrue(all(os.path.exists(os.path.join(self.media_root, r)) for r in rutas))
+
+        salida = StringIO()
+        call_command('deduplicar_documentos', stdout=salida)
+        self.assertIn(f'Espacio liberado: {float(len(self.contenido)):.1f} B', salida.getvalue())
+        self.assertEqual(
+            set(Documento.objects.values_list('archivo', 'sha256', 'nombre_archivo')),
+            {(nombre_blob(self.sha256), self.sha256, 'anexo.pdf'),
+             (nombre_blob(self.sha256), self.sha256, 'anexo_x7Yz.pdf')}
+        )
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'documentos/ley_1')))
+        self.assertEqual(ArchivoAlmacenado.objects.get().referencias, 2)
+
+
+PDF_DOS_PAGINAS = (
+    b'%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n'
+    b'2 0 obj << /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >> endobj\n'
+    b'3 0 obj << /Type /Page /Parent 2 0 R >> endobj\n'
+    b'4 0 obj << /Type/Page /Parent 2 0 R >> endobj\n'
+    b'trailer << /Root 1 0 R >>\n%%EOF\n'
+)
+
+
+@override_settings(PROCESAMIENTO_QPDF='', PROCESAMIENTO_PDFTOPPM='')
+class ProcesamientoDocumentosTest(MediaTemporalMixin, TestCase):
+    """Cola de procesamiento de PDF en la tabla de documentos"""
+
+    def setUp(self):
+        cache.clear()
+        ley = Ley.objects.create(nombre='Ley de Prueba', orden=1)
+        subarticulo = SubArticulo.objects.create(ley=ley, nombre='Presupuesto', periodicidad='ANUAL')
+        self.tipo = TipoDocumento.objects.create(subarticulo=subarticulo, nombre='Presupuesto de Egresos')
+        self.año = timezone.now().year
+
+    def crear(self, contenido, año=None):
+        return Documento.objects.create(
+            tipo_documento=self.tipo, año=año or self.año,
+            archivo=SimpleUploadedFile('presupuesto.pdf', contenido, content_type='application/pdf')
+        )
+
+    def test_guardar_encola_y_el_comando_procesa(self):
+        documento = self.crear(PDF_DOS_PAGINAS)
+        roto = self.crear(b'%PDF-1.4 sin final', año=self.año - 1)
+        self.assertEqual(documento.estado_procesamiento, 'PENDIENTE')
+        self.assertIsNone(documento.num_paginas)
+
+        with self.assertLogs('apps.administracion.procesamiento', 'WARNING'):
+            call_command('procesar_documentos', '--una-vez', stdout=StringIO())
+
+        documento.refresh_from_db()
+        self.assertEqual((documento.estado_procesamiento, documento.num_paginas), ('LISTO', 2))
+        self.assertIsNotNone(documento.fecha_procesamiento)
+        roto.refresh_from_db()
+        self.assertEqual(roto.estado_procesamiento, 'ERROR')
+        self.assertIn('%%EOF', roto.error_procesamiento)
+
+        # Editar metadatos no vuelve a encolar; un archivo nuevo sí
+        fecha_modificacion = documento.fecha_modificacion
+        documento.descripcion = 'Actualizada'
+        documento.save()
+        self.assertEqual(documento.estado_procesamiento, 'LISTO')
+        self.assertGreater(documento.fecha_modificacion, fecha_modificacion)
+        documento.archivo = SimpleUploadedFile('nuevo.pdf', PDF_DOS_PAGINAS + b' ')
+        documento.save()
+        self.assertEqual(documento.estado_procesamiento, 'PENDIENTE')
+
+    def test_reclamo_exclusivo_y_resultado_descartado_si_cambia(self):
+        documento = self.crear(PDF_DOS_PAGINAS)
+        reclamado = procesamiento.reclamar_siguiente()
+        self.assertEqual(reclamado.pk, documento.pk)
+        self.assertIsNone(procesamiento.reclamar_siguiente())
+
+        # Se reemplaza el archivo mientras se procesaba
+        nuevo = Documento.objects.get(pk=documento.pk)
+        nuevo.archivo = SimpleUploadedFile('nuevo.pdf', PDF_DOS_PAGINAS + b'%%EOF\n')
+        nuevo.save()
+
+        self.assertIsNone(procesamiento.procesar(reclamado))
+        nuevo.refresh_from_db()
+        self.assertEqual(nuevo.estado_procesamiento, 'PENDIENTE')
+        self.assertEqual(procesamiento.procesar_pendientes(), 1)
+
+    def test_linealizar_cambia_fecha_modificacion_o_descarta_el_blob(self):
+        linealizado = PDF_DOS_PAGINAS + b'% linealizado\n'
+
+        def linealizar(ruta, directorio):
+            destino = os.path.join(directorio, 'linealizado.pdf')
+            with open(destino, 'wb') as archivo:
+                archivo.write(linealizado)
+            return destino
+
+        documento = self.crear(PDF_DOS_PAGINAS)
+        fecha_modificacion = documento.fecha_modificacion
+        with mock.patch.object(procesamiento, 'linealizar', linealizar):
+            procesamiento.procesar(procesamiento.reclamar_siguiente())
+        documento.refresh_from_db()
+        self.assertEqual(documento.sha256, hashlib.sha256(linealizado).hexdigest())
+        self.assertGreater(documento.fecha_modificacion, fecha_modificacion)
+
+        # Si el archivo cambió mientras tanto, el linealizado no queda huérfano
+        otro = self.crear(PDF_DOS_PAGINAS + b' ', año=self.año - 1)
+        reclamado = procesamiento.reclamar_siguiente()
+        Documento.objects.filter(pk=otro.pk).update(archivo=nombre_blob('0' * 64))
+        linealizado = PDF_DOS_PAGINAS + b'% otro\n'
+        with mock.patch.object(procesamiento, 'linealizar', linealizar):
+            self.assertIsNone(procesamiento.procesar(reclamado))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.media_root, nombre_blob(hashlib.sha256(linealizado).hexdigest()))
+        ))
+
+
+class ImportarDocumentosTest(MediaTemporalMixin, TestCase):
+    """Carga masiva desde un directorio o un CSV (comando importar_documentos)"""
+
+    def setUp(self):
+        cache.clear()
+        self.origen = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.origen, ignore_errors=True)
+        ley = Ley.objects.create(nombre='Ley de Prueba', orden=1)
+        self.anual = SubArticulo.objects.create(ley=ley, nombre='Presupuesto', periodicidad='ANUAL')
+        self.trimestral = SubArticulo.objects.create(ley=ley, nombre='Avance', periodicidad='TRIMESTRAL')
+        self.tipo_anual = TipoDocumento.objects.create(subarticulo=self.anual, nombre='Egresos')
+        self.tipo_trimestral = TipoDocumento.objects.create(subarticulo=self.trimestral, nombre='Informe')
+        self.año = timezone.now().year
+
+    def escribir(self, ruta, contenido=None):
+        ruta = os.path.join(self.origen, ruta)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as archivo:
+            archivo.write(contenido or b'%PDF-1.4 ' + os.urandom(32))
+        return ruta
+
+    def importar(self, *args):
+        salida = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('importar_documentos', *args, stdout=salida, stderr=StringIO())
+        return salida.getvalue()
+
+    def test_importa_directorio_y_mantiene_indices(self):
+        self.escribir(f'Ley de Prueba/Presupuesto/Egresos/{self.año}/egresos.pdf')
+        for trimestre in (1, 2):
+            self.escribir(f'Ley de Prueba/Avance/informe/{self.año}/informe_T{trimestre}.pdf')
+
+        salida = self.importar(self.origen, '--dry-run')
+        self.assertIn('3 creados', salida)
+        self.assertFalse(Documento.objects.exists())
+
+        salida = self.importar(self.origen)
+        self.assertIn('3 creados, 0 reemplazados, 0 omitidos', salida)
+        self.assertEqual(
+            set(Documento.objects.values_list('tipo_documento_id', 'trimestre')),
+            {(self.tipo_anual.pk, None), (self.tipo_trimestral.pk, 'T1'), (self.tipo_trimestral.pk, 'T2')}
+        )
+        documento = Documento.objects.get(trimestre='T1')
+        self.assertEqual(documento.nombre_archivo, 'informe_T1.pdf')
+        self.assertTrue(os.path.exists(documento.archivo.path))
+        self.assertEqual(ArchivoAlmacenado.objects.count(), 3)
+        self.assertEqual(DisponibilidadAnual.objects.get(subarticulo=self.trimestral, año=self.año).total_documentos, 2)
+        self.assertEqual(documento.indice_busqueda.titulo, 'Informe')
+
+        # Repetir la importación omite lo existente; --reemplazar actualiza en su lugar
+        self.assertIn('0 creados, 0 reemplazados, 3 omitidos', self.importar(self.origen))
+        anterior = documento.archivo.path
+        self.escribir(f'Ley de Prueba/Avance/informe/{self.año}/informe_T1.pdf')
+        self.assertIn('0 creados, 3 reemplazados', self.importar(self.origen, '--reemplazar'))
+        nuevo = Documento.objects.get(pk=documento.pk)
+        self.assertNotEqual(nuevo.sha256, documento.sha256)
+        self.assertEqual(nuevo.estado_procesamiento, 'PENDIENTE')
+        self.assertFalse(os.path.exists(anterior))
+        self.assertEqual(ArchivoAlmacenado.objects.count(), 3)
+
+    def test_lote_con_errores_no_importa_nada(self):
+        self.escribir(f'Ley de Prueba/Presupuesto/Egresos/{self.año}/egresos.pdf')
+        self.escribir(f'Ley de Prueba/Avance/Informe/{self.año}/informe.pdf')
+        self.escribir(f'Ley de Prueba/Avance/Informe/{self.año - 1}/informe_T3.pdf', b'no es un pdf')
+        self.escribir(f'Ley de Prueba/Otro/Informe/{self.año}/informe_T1.pdf')
+
+        antes = [archivo for _, _, archivos in os.walk(self.media_root) for archivo in archivos]
+        errores = StringIO()
+        with self.assertRaisesMessage(CommandError, '3 errores'):
+            call_command('importar_documentos', self.origen, stdout=StringIO(), stderr=errores)
+        self.assertIn('es trimestral', errores.getvalue())
+        self.assertIn('no es un PDF válido', errores.getvalue())
+        self.assertIn('no existe el tipo de documento', errores.getvalue())
+        self.assertFalse(Documento.objects.exists())
+        self.assertEqual([archivo for _, _, archivos in os.walk(self.media_root) for archivo in archivos], antes)
+
+    def test_importa_csv(self):
+        self.escribir('pdfs/a.pdf')
+        self.escribir('pdfs/b.pdf')
+        ruta_csv = os.path.join(self.origen, 'lote.csv')
+        with open(ruta_csv, 'w', encoding='utf-8') as archivo:
+            archivo.write('archivo,tipo_documento,año,trimestre,titulo_personalizado,activo\n')
+            archivo.write(f'pdfs/a.pdf,{self.tipo_anual.pk},{self.año},,Presupuesto aprobado,si\n')
+            archivo.write(f'pdfs/b.pdf,Ley de Prueba/Avance/Informe,{self.año},t4,,no\n')
+
+        self.assertIn('2 creados', self.importar(ruta_csv))
+        self.assertEqual(
+            set(Documento.objects.values_list('tipo_documento_id', 'trimestre', 'titulo_personalizado', 'activo')),
+            {(self.tipo_anual.pk, None, 'Presupuesto aprobado', True), (self.tipo_trimestral.pk, 'T4', None, False)}
+        )
+
+
+class SubidaMasivaTest(MediaTemporalMixin, TestCase):
+    """Subida de varios documentos desde el panel en un solo lote"""
+
+    def setUp(self):
+        cache.clear()
+        ley = Ley.objects.create(nombre='Ley de Prueba', orden=1)
+        self.anual = SubArticulo.objects.create(ley=ley, nombre='Presupuesto', periodicidad='ANUAL')
+        trimestral = SubArticulo.objects.create(ley=ley, nombre='Avance', periodicidad='TRIMESTRAL')
+        self.tipo_anual = TipoDocumento.objects.create(subarticulo=self.anual, nombre='Egresos')
+        self.tipo_trimestral = TipoDocumento.objects.create(subarticulo=trimestral, nombre='Informe')
+        self.user = User.objects.create_user('admin', password='secreta')
+        self.user.perfil.tipo_usuario = 'ADMIN'
+        self.user.perfil.save()
+        self.client.force_login(self.user)
+        self.año = timezone.now().year
+
+    def fila(self, indice, tipo, trimestre='', contenido=None, nombre='documento.pdf'):
+        return {
+            f'fila-{indice}-tipo_documento': tipo.id, f'fila-{indice}-año': self.año,
+            f'fila-{indice}-trimestre': trimestre,
+            f'fila-{indice}-archivo': SimpleUploadedFile(nombre, contenido or b'%PDF-1.4 ' + os.urandom(32)),
+        }
+
+    def test_lote_mixto_se_crea_de_una_vez(self):
+        Documento.objects.bulk_create([Documento(
+            tipo_documento=self.tipo_trimestral, año=self.año, trimestre='T3', archivo='documentos/t3.pdf'
+        )])
+        datos = {
+            **self.fila(0, self.tipo_anual, trimestre='T1'),
+            **self.fila(1, self.tipo_trimestral, trimestre='T1'),
+            **self.fila(4, self.tipo_trimestral, trimestre='T2'),
+            **self.fila(5, self.tipo_trimestral, trimestre='T3'),
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('administracion:documento_bulk_create'), datos)
+        self.assertRedirects(response, reverse('administracion:documento_list'), fetch_redirect_response=False)
+        self.assertEqual(
+            set(Documento.objects.filter(usuario_subida=self.user).values_list('tipo_documento_id', 'trimestre')),
+            {(self.tipo_anual.pk, None), (self.tipo_trimestral.pk, 'T1'), (self.tipo_trimestral.pk, 'T2')}
+        )
+        self.assertEqual(DisponibilidadAnual.años(self.anual.pk), [self.año])
+        mensajes = [str(m) for m in response.wsgi_request._messages]
+        self.assertIn('Se subieron 3 documentos exitosamente.', mensajes)
+        self.assertTrue(any('ya existía' in mensaje for mensaje in mensajes))
+
+    def test_un_archivo_invalido_revierte_todo(self):
+        datos = {
+            **self.fila(0, self.tipo_anual),
+            **self.fila(1, self.tipo_trimestral, trimestre='T1', contenido=b'no es un pdf'),
+        }
+        antes = [archivo for _, _, archivos in os.walk(self.media_root) for archivo in archivos]
+        response = self.client.post(reverse('administracion:documento_bulk_create'), datos)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'no es un PDF válido')
+        self.assertFalse(Documento.objects.exists())
+        self.assertEqual([archivo for _, _, archivos in os.walk(self.media_root) for archivo in archivos], antes)
+
+    def test_documento_concurrente_no_deja_archivos(self):
+        validar = carga_masiva.validar
+
+        def validar_y_adelantarse(elementos, usuario=None):
+            errores = validar(elementos, usuario)
+            # Otra petición crea el mismo periodo entre la validación y la inserción
+            Documento.objects.bulk_create([Documento(
+                tipo_documento=self.tipo_trimestral, año=self.año, trimestre='T1', archivo='documentos/t1.pdf'
+            )])
+            return errores
+
+        datos = {**self.fila(0, self.tipo_anual), **self.fila(1, self.tipo_trimestral, trimestre='T1')}
+        antes = [archivo for _, _, archivos in os.walk(self.media_root) for archivo in archivos]
+        with mock.patch.object(carga_masiva, 'validar', validar_y_adelantarse):
+            response = self.client.post(reverse('administracion:documento_bulk_create'), datos)
+        self.assertContains(response, 'vuelva a intentarlo')
+        self.assertEqual(Documento.objects.count(), 1)
+        self.assertEqual([archivo for _, _, archivos in os.walk(self.media_root) for archivo in archivos], antes)
+
+    def test_fallo_al_confirmar_descarta_los_archivos(self):
+        ruta = os.path.join(self.media_root, 'anual.pdf')
+        with open(ruta, 'wb') as archivo:
+            archivo.write(b'%PDF-1.4 ' + os.urandom(32))
+        elemento = carga_masiva.Elemento(self.tipo_anual, self.año, None, ruta)
+
+        def fallar(guardados):
+            raise RuntimeError('fallo al confirmar')
+
+        with self.assertRaises(RuntimeError):
+            carga_masiva.cargar([elemento], al_confirmar=fallar)
+        self.assertFalse(Documento.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, elemento.blob)))
+
+    def test_subidas_fragmentadas_se_finalizan_en_lote(self):
+        contenido = b'%PDF-1.4 ' + os.urandom(64)
+        ids = []
+        for trimestre in ('T1', 'T2'):
+            subida = subidas.iniciar(self.user, self.tipo_trimestral, self.año, trimestre, 'informe.pdf', len(contenido))
+            with open(subidas.ruta_temporal(subida), 'wb') as archivo:
+                archivo.write(contenido)
+            SubidaDocumento.objects.filter(pk=subida.pk).update(recibido=len(contenido))
+            ids.append(subida.id)
+
+        datos = {}
+        for indice, (subida_id, trimestre) in enumerate(zip(ids, ('T1', 'T2'))):
+            datos.update({
+                f'fila-{indice}-tipo_documento': self.tipo_trimestral.id, f'fila-{indice}-año': self.año,
+                f'fila-{indice}-trimestre': trimestre, f'fila-{indice}-subida': subida_id,
+            })
+        temporales = [subidas.ruta_temporal(subida) for subida in SubidaDocumento.objects.all()]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('administracion:documento_bulk_create'), datos)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            list(Documento.objects.order_by('trimestre').values_list('trimestre', 'nombre_archivo')),
+            [('T1', 'informe.pdf'), ('T2', 'informe.pdf')]
+        )
+        self.assertEqual(ArchivoAlmacenado.objects.get().referencias, 2)
+        self.assertFalse(SubidaDocumento.objects.exists())
+        self.assertFalse(any(os.path.exists(ruta) for ruta in temporales))
+
+    def test_subida_fragmentada_de_fila_omitida_se_conserva(self):
+        contenido = b'%PDF-1.4 ' + os.urandom(64)
+        datos, filas = {}, {}
+        for indice, trimestre in enumerate(('T1', 'T2')):
+            subida = subidas.iniciar(self.user, self.tipo_trimestral, self.año, trimestre, 'informe.pdf', len(contenido))
+            with open(subidas.ruta_temporal(subida), 'wb') as archivo:
+                archivo.write(contenido)
+            SubidaDocumento.objects.filter(pk=subida.pk).update(recibido=len(contenido))
+            filas[trimestre] = subida
+            datos.update({
+                f'fila-{indice}-tipo_documento': self.tipo_trimestral.id, f'fila-{indice}-año': self.año,
+                f'fila-{indice}-trimestre': trimestre, f'fila-{indice}-subida': subida.id,
+            })
+        # Otro usuario publica T1 mientras se subía el archivo: la fila se omite
+        existente = Documento.objects.create(
+            tipo_documento=self.tipo_trimestral, año=self.año, trimestre='T1',
+            archivo=SimpleUploadedFile('previo.pdf', b'%PDF-1.4 previo')
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('administracion:documento_bulk_create'), datos)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Documento.objects.get(trimestre='T1'), existente)
+        self.assertTrue(Documento.objects.filter(trimestre='T2').exists())
+
+        # Solo se elimina la subida que se convirtió en documento
+        self.assertEqual(list(SubidaDocumento.objects.values_list('pk', flat=True)), [filas['T1'].pk])
+        self.assertTrue(os.path.exists(subidas.ruta_temporal(filas['T1'])))
+        self.assertFalse(os.path.exists(subidas.ruta_temporal(filas['T2'])))
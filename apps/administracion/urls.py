@@ -17,6 +17,9 @@ urlpatterns = [
     
     # API endpoints
     path('api/tipo-documento/<int:tipo_id>/periodicidad/', views.TipoDocumentoPeriodicidadAPIView.as_view(), name='api_tipo_documento_periodicidad'),
+    path('api/subidas/', views.SubidaIniciarAPIView.as_view(), name='api_subida_iniciar'),
+    path('api/subidas/<uuid:subida_id>/', views.SubidaAPIView.as_view(), name='api_subida'),
+    path('api/subidas/<uuid:subida_id>/finalizar/', views.SubidaFinalizarAPIView.as_view(), name='api_subida_finalizar'),
     
 
     
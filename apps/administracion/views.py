@@ -1,3 +1,8 @@
+import re
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
 from django.shortcuts import render
 
 # Create your views here.
@@ -7,11 +12,15 @@ from django.contrib import messages
 from django.views.generic import (
     TemplateView, ListView, CreateView, UpdateView, DeleteView, View
 )
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.db.models import Count, Q
 from django.http import JsonResponse
-from .models import Documento, Ley, SubArticulo, TipoDocumento, LogAcceso, PerfilUsuario
+from .models import (
+    Documento, Ley, SubArticulo, TipoDocumento, PerfilUsuario, SubidaDocumento, filtrar_por_alcance,
+    TRIMESTRE_CHOICES, YEAR_CHOICES
+)
 from .forms import DocumentoForm
+from . import carga_masiva, estadisticas, subidas
 from django.core.exceptions import PermissionDenied
 
 
@@ -22,26 +31,14 @@ class DashboardView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Filtrar documentos según el tipo de usuario
-        documentos_queryset = Documento.objects.all()
-        if hasattr(self.request.user, 'perfil'):
-            perfil = self.request.user.perfil
-            if perfil.tipo_usuario == 'RECURSOS_MATERIALES':
-                documentos_queryset = documentos_queryset.filter(
-                    tipo_documento__subarticulo__nombre__icontains='inventario'
-                ).filter(tipo_documento__subarticulo__nombre__icontains='físico')
-            elif perfil.tipo_usuario == 'PLANEACION':
-                documentos_queryset = documentos_queryset.exclude(
-                    Q(tipo_documento__subarticulo__nombre__icontains='inventario') & 
-                    Q(tipo_documento__subarticulo__nombre__icontains='físico')
-                )
+        # Filtrar documentos según el alcance del tipo de usuario
+        documentos_queryset = filtrar_por_alcance(Documento.objects.all(), self.request.user)
         
-        # Estadísticas generales
+        # Estadísticas generales (accesos desde el resumen diario)
         context['total_documentos'] = documentos_queryset.filter(activo=True).count()
-        context['total_visualizaciones'] = LogAcceso.objects.filter(
-            tipo_acceso='VISUALIZACION',
-            documento__in=documentos_queryset
-        ).count()
+        context['total_visualizaciones'] = estadisticas.total_accesos(
+            'VISUALIZACION', documentos=documentos_queryset
+        )
         context['documentos_pendientes'] = documentos_queryset.filter(activo=False).count()
         
         # Documentos recientes
@@ -50,12 +47,11 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         ).order_by('-fecha_subida')[:5]
         
         # Documentos más vistos
-        documentos_mas_vistos = documentos_queryset.filter(
-            activo=True
-        ).annotate(
-            num_visualizaciones=Count('logs_acceso', filter=Q(logs_acceso__tipo_acceso='VISUALIZACION'))
-        ).order_by('-num_visualizaciones')[:5]
-        context['documentos_mas_vistos'] = documentos_mas_vistos
+        context['documentos_mas_vistos'] = estadisticas.top_documentos(
+            'VISUALIZACION', 5,
+            documentos=documentos_queryset.filter(activo=True),
+            atributo='num_visualizaciones'
+        )
         
         # Distribución por ley
         distribucion_leyes = Ley.objects.annotate(
@@ -77,20 +73,8 @@ class DocumentoListView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         queryset = Documento.objects.all().order_by('-fecha_subida')
         
-        # Filtrar según el tipo de usuario
-        if hasattr(self.request.user, 'perfil'):
-            perfil = self.request.user.perfil
-            if perfil.tipo_usuario == 'RECURSOS_MATERIALES':
-                # Solo documentos del subarticulo inventarios físicos de bienes
-                queryset = queryset.filter(
-                    tipo_documento__subarticulo__nombre__icontains='inventario'
-                ).filter(tipo_documento__subarticulo__nombre__icontains='físico')
-            elif perfil.tipo_usuario == 'PLANEACION':
-                # Todo excepto documentos del subarticulo inventarios físicos de bienes
-                queryset = queryset.exclude(
-                    Q(tipo_documento__subarticulo__nombre__icontains='inventario') & 
-                    Q(tipo_documento__subarticulo__nombre__icontains='físico')
-                )
+        # Filtrar según el alcance del tipo de usuario
+        queryset = filtrar_por_alcance(queryset, self.request.user)
         
         # Filtros adicionales
         ley_id = self.request.GET.get('ley')
@@ -201,147 +185,135 @@ class EstadisticasView(LoginRequiredMixin, TemplateView):
         
         fecha_inicio = timezone.now() - timedelta(days=365)
         
-        # Descargas por mes
+        # Descargas por mes (una consulta sobre el resumen diario + el día en curso)
+        totales = estadisticas.totales_por_mes('DESCARGA', timezone.localdate(fecha_inicio).replace(day=1))
         descargas_mensuales = {}
         for i in range(12):
             fecha = timezone.now() - timedelta(days=30*i)
             mes_nombre = calendar.month_name[fecha.month]
             año = fecha.year
             
-            descargas = LogAcceso.objects.filter(
-                tipo_acceso='DESCARGA',
-                fecha_acceso__year=año,
-                fecha_acceso__month=fecha.month
-            ).count()
-            
-            descargas_mensuales[f"{mes_nombre} {año}"] = descargas
+            descargas_mensuales[f"{mes_nombre} {año}"] = totales.get((año, fecha.month), 0)
         
         context['descargas_mensuales'] = descargas_mensuales
         
         # Top 10 documentos más descargados
-        top_documentos = Documento.objects.annotate(
-            num_descargas=Count('logs_acceso', filter=Q(logs_acceso__tipo_acceso='DESCARGA'))
-        ).order_by('-num_descargas')[:10]
-        
-        context['top_documentos'] = top_documentos
+        context['top_documentos'] = estadisticas.top_documentos('DESCARGA', 10, atributo='num_descargas')
         
         # Estadísticas por IP (para detectar uso intensivo)
-        top_ips = LogAcceso.objects.values('ip_address').annotate(
-            total_accesos=Count('id')
-        ).order_by('-total_accesos')[:10]
-        
-        context['top_ips'] = top_ips
+        context['top_ips'] = estadisticas.top_ips(10)
         
         return context
 
 
+FILA_BULK_RE = re.compile(r'^fila-(\d+)-')
+
+
 class DocumentoBulkCreateView(LoginRequiredMixin, View):
-    """Vista temporal para subir múltiples trimestres a la vez"""
+    """
+    Subida de varios documentos a la vez: cada fila lleva su tipo (anual o
+    trimestral), año, trimestre y un PDF, ya sea en el formulario o como una
+    subida fragmentada completa (fila-N-subida). El lote se carga entero o no
+    se carga (carga_masiva.cargar).
+    """
     template_name = 'admin/documento_form_bulk.html'
     
+    def contexto(self, filas=None):
+        return {
+            'tipos': TipoDocumento.objects.filter(activo=True).select_related('subarticulo__ley').order_by(
+                'subarticulo__ley__orden', 'subarticulo__orden', 'orden', 'nombre'
+            ),
+            'años': [año for año, _ in YEAR_CHOICES],
+            'trimestres': TRIMESTRE_CHOICES,
+            'filas': filas or [{}],
+        }
+    
     def get(self, request):
-        # Crear un formulario simple sin validaciones complejas
-        from django import forms
-        
-        class SimpleBulkForm(forms.Form):
-            tipo_documento = forms.ModelChoiceField(
-                queryset=TipoDocumento.objects.filter(activo=True),
-                widget=forms.Select(attrs={'class': 'form-select', 'id': 'id_tipo_documento'}),
-                label='Tipo de Documento'
-            )
-            año = forms.ChoiceField(
-                choices=[(r, r) for r in range(2019, 2031)],
-                widget=forms.Select(attrs={'class': 'form-select'}),
-                label='Año'
-            )
-        
-        form = SimpleBulkForm()
-        return render(request, self.template_name, {'form': form})
+        return render(request, self.template_name, self.contexto())
     
     def post(self, request):
-        from django import forms
-        
-        class SimpleBulkForm(forms.Form):
-            tipo_documento = forms.ModelChoiceField(
-                queryset=TipoDocumento.objects.filter(activo=True),
-                widget=forms.Select(attrs={'class': 'form-select', 'id': 'id_tipo_documento'}),
-                label='Tipo de Documento'
-            )
-            año = forms.ChoiceField(
-                choices=[(r, r) for r in range(2019, 2031)],
-                widget=forms.Select(attrs={'class': 'form-select'}),
-                label='Año'
-            )
-        
-        form = SimpleBulkForm(request.POST)
-        
-        if not form.is_valid():
-            messages.error(request, 'Debe seleccionar tipo de documento y año.')
-            return render(request, self.template_name, {'form': form})
-        
-        tipo_documento = form.cleaned_data['tipo_documento']
-        año = int(form.cleaned_data['año'])
-        
-        # Verificar que sea trimestral
-        if tipo_documento.subarticulo.periodicidad != 'TRIMESTRAL':
-            messages.error(request, 'Este formulario solo funciona con documentos trimestrales.')
-            return render(request, self.template_name, {'form': form})
-        
-        # Verificar permisos
-        if hasattr(request.user, 'perfil'):
-            perfil = request.user.perfil
-            if not perfil.puede_subir_documento(tipo_documento):
-                messages.error(request, 'No tiene permisos para subir este tipo de documento.')
-                return render(request, self.template_name, {'form': form})
-        
-        documentos_creados = 0
-        errores = []
-        
-        # Procesar cada trimestre
-        trimestres = ['T1', 'T2', 'T3', 'T4']
-        for i, trimestre in enumerate(trimestres, 1):
-            archivo_field = f'archivo_t{i}'
-            archivo = request.FILES.get(archivo_field)
-            
-            if archivo:
-                try:
-                    # Verificar si ya existe
-                    if Documento.objects.filter(
-                        tipo_documento=tipo_documento,
-                        año=año,
-                        trimestre=trimestre
-                    ).exists():
-                        errores.append(f'Ya existe un documento para {trimestre} del año {año}')
+        indices = sorted({int(m[1]) for m in map(FILA_BULK_RE.match, [*request.POST, *request.FILES]) if m})
+        filas = [{
+            'tipo_documento': request.POST.get(f'fila-{i}-tipo_documento', ''),
+            'año': request.POST.get(f'fila-{i}-año', ''),
+            'trimestre': request.POST.get(f'fila-{i}-trimestre', ''),
+            'archivo': request.FILES.get(f'fila-{i}-archivo'),
+            'subida': request.POST.get(f'fila-{i}-subida', ''),
+        } for i in indices]
+        filas = [fila for fila in filas if fila['archivo'] or fila['subida']]
+        if not filas:
+            messages.error(request, 'Debe seleccionar al menos un archivo para subir.')
+            return render(request, self.template_name, self.contexto())
+        
+        # Tipos y subidas fragmentadas de todas las filas en una consulta cada uno
+        tipos = TipoDocumento.objects.filter(activo=True).select_related('subarticulo').in_bulk(
+            [int(f['tipo_documento']) for f in filas if f['tipo_documento'].isdigit()]
+        )
+        ids_subidas = []
+        for fila in filas:
+            try:
+                fila['subida'] = uuid.UUID(fila['subida']) if fila['subida'] else None
+            except ValueError:
+                fila['subida'] = None
+            if fila['subida']:
+                ids_subidas.append(fila['subida'])
+        subidas_usuario = SubidaDocumento.objects.filter(usuario=request.user).in_bulk(ids_subidas)
+        
+        elementos, errores, usadas = [], [], []
+        with ExitStack() as abiertos:
+            for numero, fila in enumerate(filas, 1):
+                tipo = tipos.get(int(fila['tipo_documento'])) if fila['tipo_documento'].isdigit() else None
+                if tipo is None or not fila['año'].isdigit():
+                    errores.append(f'Fila {numero}: seleccione tipo de documento y año.')
+                    continue
+                trimestre = None if tipo.subarticulo.periodicidad == 'ANUAL' else fila['trimestre']
+                campos = {}
+                if fila['archivo']:
+                    archivo, nombre = fila['archivo'], fila['archivo'].name
+                else:
+                    subida = subidas_usuario.get(fila['subida'])
+                    if subida is None or not subida.completa:
+                        errores.append(f'Fila {numero}: la subida del archivo no está completa.')
                         continue
-                    
-                    # Crear documento
-                    documento = Documento(
-                        tipo_documento=tipo_documento,
-                        año=año,
-                        trimestre=trimestre,
-                        archivo=archivo,
-                        usuario_subida=request.user,
-                        activo=True
+                    archivo = abiertos.enter_context(
+                        subidas.ArchivoTemporal(open(subidas.ruta_temporal(subida), 'rb'))
                     )
-                    documento.save()
-                    documentos_creados += 1
-                    
-                except Exception as e:
-                    errores.append(f'Error al subir {trimestre}: {str(e)}')
-        
-        # Mostrar resultados
-        if documentos_creados > 0:
-            messages.success(request, f'Se subieron {documentos_creados} documentos exitosamente.')
-        
-        if errores:
-            for error in errores:
-                messages.warning(request, error)
-        
-        if documentos_creados == 0:
-            messages.error(request, 'No se pudo subir ningún documento.')
-            return render(request, self.template_name, {'form': form})
-        
+                    nombre, campos['activo'] = subida.nombre_archivo, subida.activo
+                elemento = carga_masiva.Elemento(
+                    tipo, int(fila['año']), trimestre, archivo,
+                    origen=f'Fila {numero} ({nombre})', nombre_archivo=nombre, **campos
+                )
+                elementos.append(elemento)
+                if not fila['archivo']:
+                    usadas.append((elemento, subida))
+            
+            try:
+                if errores:
+                    raise carga_masiva.ErrorCarga(errores + carga_masiva.validar(elementos, request.user))
+                resumen = carga_masiva.cargar(
+                    elementos, usuario=request.user, hilos=getattr(settings, 'SUBIDAS_HILOS', 4),
+                    al_confirmar=lambda guardados: self.eliminar_subidas(usadas, guardados)
+                )
+            except carga_masiva.ErrorCarga as e:
+                messages.error(request, 'No se subió ningún documento; corrija lo siguiente y vuelva a intentarlo.')
+                for error in e.errores:
+                    messages.warning(request, error)
+                return render(request, self.template_name, self.contexto(filas))
+        
+        for elemento in elementos:
+            if elemento.existente:
+                messages.warning(request, f'{elemento.origen}: ya existía un documento para ese periodo; se omitió.')
+        if resumen['creados']:
+            messages.success(request, f'Se subieron {resumen["creados"]} documentos exitosamente.')
         return redirect('administracion:documento_list')
+    
+    @staticmethod
+    def eliminar_subidas(usadas, guardados):
+        # Las subidas fragmentadas que ya son documentos se eliminan en la misma
+        # transacción que crea el lote; las de filas omitidas se conservan
+        for elemento, subida in usadas:
+            if any(elemento is guardado for guardado in guardados):
+                subidas.cancelar(subida)
 
 
 class TipoDocumentoPeriodicidadAPIView(LoginRequiredMixin, View):
@@ -358,4 +330,99 @@ class TipoDocumentoPeriodicidadAPIView(LoginRequiredMixin, View):
         except Exception as e:
             return JsonResponse({
                 'error': str(e)
-            }, status=404)
\ No newline at end of file
+            }, status=404)
+
+
+def _error_subida(error):
+    return JsonResponse({'success': False, 'error': str(error), **error.datos}, status=error.status)
+
+
+def _estado_subida(subida):
+    return {
+        'success': True,
+        'id': str(subida.id),
+        'recibido': subida.recibido,
+        'tamaño': subida.tamaño_total,
+        'tamaño_fragmento': subidas.tamaño_fragmento(),
+    }
+
+
+class SubidaIniciarAPIView(LoginRequiredMixin, View):
+    """Abre una subida fragmentada de un PDF"""
+    
+    def post(self, request):
+        tipo_id = request.POST.get('tipo_documento', '')
+        tipo_documento = None
+        if tipo_id.isdigit():
+            tipo_documento = TipoDocumento.objects.select_related('subarticulo').filter(
+                id=tipo_id, activo=True
+            ).first()
+        if tipo_documento is None:
+            return JsonResponse({'success': False, 'error': 'Tipo de documento no válido.'}, status=400)
+        try:
+            año = int(request.POST.get('año', ''))
+            tamaño = int(request.POST.get('tamaño', ''))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Año y tamaño son obligatorios.'}, status=400)
+        
+        try:
+            subida = subidas.iniciar(
+                request.user, tipo_documento, año,
+                request.POST.get('trimestre') or None,
+                request.POST.get('nombre', ''), tamaño,
+                activo=request.POST.get('activo', 'true').lower() in ('true', 'on', '1'),
+            )
+        except subidas.ErrorSubida as e:
+            return _error_subida(e)
+        return JsonResponse(_estado_subida(subida), status=201)
+
+
+class SubidaAPIView(LoginRequiredMixin, View):
+    """
+    Estado (GET), fragmento (PUT con Content-Range y X-Checksum-SHA256) y
+    cancelación (DELETE) de una subida del usuario
+    """
+    
+    def dispatch(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            self.subida = get_object_or_404(SubidaDocumento, id=kwargs['subida_id'], usuario=request.user)
+        return super().dispatch(request, *args, **kwargs)
+    
+    def get(self, request, subida_id):
+        return JsonResponse(_estado_subida(self.subida))
+    
+    def put(self, request, subida_id):
+        # Content-Range: bytes <inicio>-<fin>/<total>
+        rango = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+)', request.headers.get('Content-Range', ''))
+        if not rango or int(rango[2]) < int(rango[1]):
+            return JsonResponse({'success': False, 'error': 'Falta Content-Range.'}, status=400)
+        inicio, fin = int(rango[1]), int(rango[2])
+        try:
+            subida = subidas.escribir_fragmento(
+                self.subida, inicio, request, fin - inicio + 1,
+                request.headers.get('X-Checksum-SHA256', '')
+            )
+        except subidas.ErrorSubida as e:
+            return _error_subida(e)
+        return JsonResponse(_estado_subida(subida))
+    
+    def delete(self, request, subida_id):
+        subidas.cancelar(self.subida)
+        return JsonResponse({'success': True})
+
+
+class SubidaFinalizarAPIView(LoginRequiredMixin, View):
+    """Crea el Documento de una subida completa"""
+    
+    def post(self, request, subida_id):
+        subida = get_object_or_404(SubidaDocumento, id=subida_id, usuario=request.user)
+        try:
+            documento = subidas.finalizar(subida, sha256=request.POST.get('sha256'))
+        except subidas.ErrorSubida as e:
+            return _error_subida(e)
+        messages.success(request, f'Documento "{documento}" creado exitosamente.')
+        return JsonResponse({
+            'success': True,
+            'documento': documento.id,
+            'redirect': reverse('administracion:documento_list'),
+        }, status=201)
@@ -0,0 +1,189 @@
+"""
+Registro asíncrono de LogAcceso: las vistas encolan las entradas y un hilo en
+segundo plano las inserta con bulk_create cada ACCESS_LOG_BATCH_SIZE entradas
+o cada ACCESS_LOG_FLUSH_INTERVAL_MS milisegundos.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from apps.administracion.models import LogAcceso
+
+
+logger = logging.getLogger(__name__)
+
+
+class EscritorLogAcceso:
+    """Escribe los registros de acceso en lotes desde un hilo en segundo plano"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cola = None
+        self._hilo = None
+        self._pid = None
+        self._detener = threading.Event()
+        self._contadores = {'encolados': 0, 'escritos': 0, 'descartados': 0, 'errores': 0}
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'ACCESS_LOG_BATCH_SIZE', 100)
+
+    @property
+    def intervalo(self):
+        return getattr(settings, 'ACCESS_LOG_FLUSH_INTERVAL_MS', 500) / 1000.0
+
+    def _contar(self, contador, cantidad=1):
+        with self._lock:
+            self._contadores[contador] += cantidad
+
+    def _asegurar_hilo(self):
+        """Arranca el hilo la primera vez (y de nuevo tras un fork del proceso)"""
+        if self._hilo is not None and self._pid == os.getpid() and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is not None and self._pid == os.getpid() and self._hilo.is_alive():
+                return
+            if self._pid is None:
+                atexit.register(self.detener)
+            self._pid = os.getpid()
+            self._cola = queue.Queue(maxsize=getattr(settings, 'ACCESS_LOG_QUEUE_SIZE', 10000))
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._ejecutar, name='log-acceso', daemon=True)
+            self._hilo.start()
+
+    def registrar(self, **campos):
+        """Encola un LogAcceso; si el modo asíncrono está desactivado lo inserta directamente"""
+        # La hora es la de la petición, no la de la escritura del lote
+        campos.setdefault('fecha_acceso', timezone.now())
+        if not getattr(settings, 'ACCESS_LOG_ASYNC', True):
+            LogAcceso.objects.create(**campos)
+            self._contar('escritos')
+            return
+
+        self._asegurar_hilo()
+        entrada = LogAcceso(**campos)
+        try:
+            if getattr(settings, 'ACCESS_LOG_OVERFLOW', 'drop') == 'block':
+                self._cola.put(entrada, timeout=getattr(settings, 'ACCESS_LOG_BLOCK_TIMEOUT', 1.0))
+            else:
+                self._cola.put_nowait(entrada)
+        except queue.Full:
+            self._contar('descartados')
+            return
+        self._contar('encolados')
+
+    def registrar_varios(self, lista_campos):
+        """Varios LogAcceso de una misma petición; sin modo asíncrono, en un solo INSERT"""
+        ahora = timezone.now()
+        lista_campos = [{'fecha_acceso': ahora, **campos} for campos in lista_campos]
+        if not getattr(settings, 'ACCESS_LOG_ASYNC', True):
+            LogAcceso.objects.bulk_create([LogAcceso(**campos) for campos in lista_campos])
+            self._contar('escritos', len(lista_campos))
+            return
+        # El hilo los escribe con bulk_create junto con el resto de la cola
+        for campos in lista_campos:
+            self.registrar(**campos)
+
+    def _tomar_lote(self):
+        """Espera hasta completar un lote o hasta que venza el intervalo"""
+        lote = []
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.batch_size:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _escribir(self, lote):
+        close_old_connections()
+        try:
+            LogAcceso.objects.bulk_create(lote, batch_size=self.batch_size)
+        except Exception:
+            logger.exception('No se pudieron escribir %d registros de acceso', len(lote))
+            self._contar('errores', len(lote))
+        else:
+            self._contar('escritos', len(lote))
+
+    def _ejecutar(self):
+        try:
+            while not self._detener.is_set():
+                lote = self._tomar_lote()
+                if lote:
+                    self._escribir(lote)
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Escribe en el hilo actual todo lo que esté pendiente en la cola"""
+        if self._cola is None:
+            return
+        lote = []
+        while True:
+            try:
+                lote.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+            if len(lote) >= self.batch_size:
+                self._escribir(lote)
+                lote = []
+        if lote:
+            self._escribir(lote)
+
+    def detener(self, timeout=5.0):
+        """Detiene el hilo vaciando la cola (se registra con atexit)"""
+        hilo = self._hilo
+        self._detener.set()
+        if hilo is not None and hilo.is_alive() and hilo is not threading.current_thread():
+            hilo.join(timeout)
+        self.flush()
+
+    def estadisticas(self):
+        """Contadores de entradas encoladas, escritas, descartadas y con error"""
+        with self._lock:
+            datos = dict(self._contadores)
+        datos['pendientes'] = self._cola.qsize() if self._cola is not None else 0
+        return datos
+
+
+escritor = EscritorLogAcceso()
+
+
+def registrar_acceso(documento, ip_address, user_agent, tipo_acceso):
+    """Registra un acceso a un documento sin esperar a la base de datos"""
+    escritor.registrar(
+        documento=documento,
+        ip_address=ip_address,
+        user_agent=user_agent,
+        tipo_acceso=tipo_acceso
+    )
+
+
+def registrar_accesos(documentos, ip_address, user_agent, tipo_acceso):
+    """Un registro por documento (p. ej. los de un paquete ZIP)"""
+    escritor.registrar_varios([
+        {'documento': documento, 'ip_address': ip_address, 'user_agent': user_agent, 'tipo_acceso': tipo_acceso}
+        for documento in documentos
+    ])
+
+
+async def aregistrar_acceso(documento, ip_address, user_agent, tipo_acceso):
+    """
+    Versión para vistas asíncronas: encolar en modo 'drop' no bloquea, así que
+    se hace directamente; la escritura síncrona o el modo 'block' van a un hilo.
+    """
+    if getattr(settings, 'ACCESS_LOG_ASYNC', True) and getattr(settings, 'ACCESS_LOG_OVERFLOW', 'drop') != 'block':
+        registrar_acceso(documento, ip_address, user_agent, tipo_acceso)
+    else:
+        await sync_to_async(registrar_acceso)(documento, ip_address, user_agent, tipo_acceso)
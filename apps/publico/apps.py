@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class PublicoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.publico'
\ No newline at end of file
+    name = 'apps.publico'
+
+    def ready(self):
+        from . import signals  # noqa: F401
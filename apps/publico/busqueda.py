@@ -0,0 +1,124 @@
+"""
+Búsqueda de texto completo en los documentos publicados.
+
+Busca en el nombre del tipo de documento, el título personalizado, el
+sub-artículo y la ley, la descripción y el texto extraído del PDF
+(IndiceBusqueda, ver la migración 0010 de administracion). En PostgreSQL usa
+la columna tsvector con índice GIN y derivación en español; en SQLite, la
+tabla FTS5 (sin derivación: cada término se busca como prefijo). Los
+resultados se ordenan por relevancia y se paginan en la base de datos, así que
+una página son dos consultas independientemente del número de documentos.
+"""
+import math
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from apps.administracion.models import Documento, IndiceBusqueda
+
+
+TABLA = IndiceBusqueda._meta.db_table
+TERMINO_RE = re.compile(r'\w+')
+MAX_TERMINOS = 10
+MAX_LONGITUD = 200
+
+SQL_POSTGRESQL = f"""
+    SELECT i.documento_id, ts_rank_cd(i.vector, q.consulta) AS rango, count(*) OVER () AS total
+    FROM {TABLA} i, websearch_to_tsquery('spanish', %s) AS q(consulta)
+    WHERE i.visible AND i.vector @@ q.consulta
+    ORDER BY rango DESC, i.documento_id DESC
+    LIMIT %s OFFSET %s
+"""
+
+# bm25() es menor cuanto más relevante; pesos por columna: título, contexto, descripción, texto
+# (bm25() no puede usarse junto a una función de ventana: va en la subconsulta)
+SQL_SQLITE = f"""
+    SELECT documento_id, rango, count(*) OVER () AS total FROM (
+        SELECT f.rowid AS documento_id, -bm25({TABLA}_fts, 10.0, 4.0, 2.0, 1.0) AS rango
+        FROM {TABLA}_fts f JOIN {TABLA} i ON i.documento_id = f.rowid
+        WHERE {TABLA}_fts MATCH %s AND i.visible
+    )
+    ORDER BY rango DESC, documento_id DESC
+    LIMIT %s OFFSET %s
+"""
+
+
+def por_pagina():
+    return getattr(settings, 'BUSQUEDA_POR_PAGINA', 20)
+
+
+def terminos(consulta):
+    return TERMINO_RE.findall(consulta.lower())[:MAX_TERMINOS]
+
+
+def _postgresql(consulta, limite, desplazamiento):
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_POSTGRESQL, [consulta, limite, desplazamiento])
+        return cursor.fetchall()
+
+
+def _sqlite(consulta, limite, desplazamiento):
+    # Cada término entre comillas (la sintaxis de FTS5 no llega del usuario) y como prefijo
+    expresion = ' '.join(f'"{termino}"*' for termino in terminos(consulta))
+    if not expresion:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_SQLITE, [expresion, limite, desplazamiento])
+        return cursor.fetchall()
+
+
+def _generica(consulta, limite, desplazamiento):
+    """Otras bases de datos: todos los términos en alguna columna, sin relevancia"""
+    filtro = Q(visible=True)
+    for termino in terminos(consulta):
+        filtro &= (Q(titulo__icontains=termino) | Q(contexto__icontains=termino)
+                   | Q(descripcion__icontains=termino) | Q(contenido__icontains=termino))
+    coincidencias = IndiceBusqueda.objects.filter(filtro)
+    total = coincidencias.count()
+    ids = coincidencias.order_by('-documento__año', '-documento_id').values_list(
+        'documento_id', flat=True
+    )[desplazamiento:desplazamiento + limite]
+    return [(documento_id, 0.0, total) for documento_id in ids]
+
+
+def _motor():
+    return {'postgresql': _postgresql, 'sqlite': _sqlite}.get(connection.vendor, _generica)
+
+
+def buscar(consulta, pagina=1):
+    """
+    Página `pagina` de los documentos visibles que coinciden con `consulta`,
+    ordenados por relevancia. Cada documento lleva su puntuación en `rango`.
+    """
+    consulta = (consulta or '').strip()[:MAX_LONGITUD]
+    resultado = {'consulta': consulta, 'pagina': 1, 'paginas': 0, 'total': 0, 'documentos': []}
+    if not terminos(consulta):
+        return resultado
+
+    motor = _motor()
+    limite = por_pagina()
+    pagina = max(pagina, 1)
+    filas = motor(consulta, limite, (pagina - 1) * limite)
+    if not filas and pagina > 1:
+        # Página fuera de rango: la primera
+        pagina = 1
+        filas = motor(consulta, limite, 0)
+    if not filas:
+        return resultado
+
+    rangos = {documento_id: rango for documento_id, rango, _ in filas}
+    documentos = Documento.objects.select_related('tipo_documento__subarticulo__ley').in_bulk(list(rangos))
+    ordenados = []
+    for documento_id, rango in rangos.items():
+        documento = documentos.get(documento_id)
+        if documento is not None:
+            documento.rango = rango
+            ordenados.append(documento)
+
+    total = filas[0][2]
+    resultado.update(
+        pagina=pagina, paginas=math.ceil(total / limite), total=total, documentos=ordenados
+    )
+    return resultado
@@ -0,0 +1,93 @@
+"""
+Caché de fragmentos HTML de las APIs públicas, invalidada por una versión
+de contenido que se incrementa desde signals.py.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+VERSION_KEY = 'publico:contenido:version'
+
+_estadisticas = {'hits': 0, 'misses': 0}
+_estadisticas_lock = threading.Lock()
+
+
+def _timeout():
+    return getattr(settings, 'PUBLICO_FRAGMENT_CACHE_TIMEOUT', 3600)
+
+
+def obtener_version():
+    """Obtiene la versión actual del contenido público"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Si la clave se perdió (p. ej. al purgar la caché), una versión que no
+        # pueda coincidir con la de fragmentos antiguos todavía vigentes; add()
+        # no pisa una versión creada en paralelo por otro proceso
+        version = time.time_ns()
+        cache.add(VERSION_KEY, version, timeout=None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def incrementar_version():
+    """Invalida todos los fragmentos incrementando la versión de contenido"""
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(VERSION_KEY, version, timeout=None)
+        return version
+
+
+def _clave(tipo, objeto_id, año, version):
+    return f'publico:fragmento:{tipo}:{objeto_id}:{año or "todos"}:v{version}'
+
+
+def _contar(fragmento):
+    with _estadisticas_lock:
+        _estadisticas['hits' if fragmento is not None else 'misses'] += 1
+    return fragmento
+
+
+def obtener_fragmento(tipo, objeto_id, año=None):
+    """Devuelve el fragmento guardado o None, contabilizando aciertos y fallos"""
+    return _contar(cache.get(_clave(tipo, objeto_id, año, obtener_version())))
+
+
+def guardar_fragmento(tipo, objeto_id, fragmento, año=None):
+    """Guarda un fragmento bajo la versión de contenido actual"""
+    cache.set(_clave(tipo, objeto_id, año, obtener_version()), fragmento, timeout=_timeout())
+
+
+# Equivalentes asíncronos para views_async.py (API asíncrona de la caché)
+
+async def aobtener_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        await cache.aadd(VERSION_KEY, version, timeout=None)
+        version = await cache.aget(VERSION_KEY, version)
+    return version
+
+
+async def aobtener_fragmento(tipo, objeto_id, año=None):
+    return _contar(await cache.aget(_clave(tipo, objeto_id, año, await aobtener_version())))
+
+
+async def aguardar_fragmento(tipo, objeto_id, fragmento, año=None):
+    await cache.aset(_clave(tipo, objeto_id, año, await aobtener_version()), fragmento, timeout=_timeout())
+
+
+def estadisticas():
+    """Contadores de aciertos y fallos de este proceso"""
+    with _estadisticas_lock:
+        return dict(_estadisticas, version=obtener_version())
+
+
+def reiniciar_estadisticas():
+    with _estadisticas_lock:
+        _estadisticas['hits'] = 0
+        _estadisticas['misses'] = 0
@@ -0,0 +1,107 @@
+"""
+Cabeceras de caché HTTP para las páginas y APIs públicas.
+
+El ETag se deriva de la versión de contenido que ya mantiene signals.py (una
+lectura de caché), así que un If-None-Match vigente recibe 304 antes de que
+la vista consulte la base de datos o renderice. Las peticiones con cookie de
+sesión (personal del admin) o con mensajes pendientes (base.html los muestra)
+no pasan por aquí y se marcan como privadas, igual que las respuestas que
+consumen o añaden mensajes.
+
+El ETag usa la versión global y no una por sub-artículo (el máximo de
+fecha_modificacion de sus documentos): ese máximo no cambia al eliminar o
+retirar un documento que no era el más reciente, ni al renombrar tipos,
+sub-artículos o leyes, y todas las páginas incluyen el menú de base.html, que
+depende de cualquier ley o sub-artículo. A cambio, cualquier edición invalida
+todas las páginas en navegadores y en nginx; se revalidan con un 304 barato.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from . import cache as fragmentos
+
+
+def _etag(version, request):
+    semilla = f'{version}:{request.get_full_path()}'
+    return f'W/"{hashlib.sha1(semilla.encode()).hexdigest()[:20]}"'
+
+
+def calcular_etag(request):
+    """ETag débil: nginx puede comprimir la respuesta sin invalidarlo"""
+    return _etag(fragmentos.obtener_version(), request)
+
+
+async def acalcular_etag(request):
+    return _etag(await fragmentos.aobtener_version(), request)
+
+
+def es_cacheable(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and CookieStorage.cookie_name not in request.COOKIES
+    )
+
+
+def usa_mensajes(request):
+    """La respuesta mostró o dejó mensajes de django.contrib.messages: es de un solo visitante"""
+    mensajes = getattr(request, '_messages', None)
+    return mensajes is not None and (mensajes.used or mensajes.added_new)
+
+
+def _cabeceras_publicas(response, etag):
+    if response.status_code == 200 or isinstance(response, HttpResponseNotModified):
+        response['ETag'] = etag
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=getattr(settings, 'PUBLICO_HTTP_MAX_AGE', 0),
+            s_maxage=getattr(settings, 'PUBLICO_HTTP_S_MAXAGE', 60),
+        )
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def _cabeceras_privadas(response):
+    patch_cache_control(response, private=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def cache_publico(view):
+    """
+    Decorador para vistas públicas (síncronas o asíncronas): responde 304 si el
+    ETag coincide y añade Cache-Control / Vary para navegadores y nginx.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def _view(request, *args, **kwargs):
+            if not es_cacheable(request):
+                return _cabeceras_privadas(await view(request, *args, **kwargs))
+            etag = await acalcular_etag(request)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+                if usa_mensajes(request):
+                    return _cabeceras_privadas(response)
+            return _cabeceras_publicas(response, etag)
+        return markcoroutinefunction(_view)
+
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        if not es_cacheable(request):
+            return _cabeceras_privadas(view(request, *args, **kwargs))
+        etag = calcular_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            if usa_mensajes(request):
+                return _cabeceras_privadas(response)
+        return _cabeceras_publicas(response, etag)
+    return _view
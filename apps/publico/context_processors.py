@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from .navegacion import obtener_arbol
+
+
+def navegacion(request):
+    """
+    Árbol del menú lateral para todos los templates. Es perezoso: solo se
+    consulta la versión (y en su caso se reconstruye) si el template lo usa.
+    """
+    return {'navegacion_leyes': SimpleLazyObject(lambda: obtener_arbol().leyes)}
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import content_disposition_header, http_date
+
+
+# Tamaño de bloque para leer el PDF: la memoria por petición no depende del archivo
+BLOCK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class LectorRango:
+    """Envuelve un archivo abierto para leer solo `longitud` bytes desde la posición actual"""
+
+    def __init__(self, archivo, longitud):
+        self.archivo = archivo
+        self.restante = longitud
+
+    def read(self, size=-1):
+        if self.restante <= 0:
+            return b''
+        if size < 0 or size > self.restante:
+            size = self.restante
+        datos = self.archivo.read(size)
+        self.restante -= len(datos)
+        return datos
+
+    def close(self):
+        self.archivo.close()
+
+
+def obtener_etag(documento, tamaño):
+    """ETag derivado de la fecha de modificación y el tamaño del documento"""
+    marca = int(documento.fecha_modificacion.timestamp())
+    return quote_etag(f'{documento.pk}-{documento.tamaño_archivo or tamaño}-{marca}')
+
+
+def parsear_rango(request, tamaño, etag):
+    """
+    Devuelve (inicio, fin) para una cabecera Range de un solo intervalo,
+    None si debe servirse el archivo completo o False si es insatisfacible.
+    """
+    cabecera = request.META.get('HTTP_RANGE', '').strip()
+    if not cabecera:
+        return None
+
+    # If-Range: solo se respeta el rango si el cliente tiene la versión actual
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range.strip() != etag:
+        return None
+
+    coincidencia = RANGE_RE.match(cabecera)
+    if not coincidencia:
+        # Rangos múltiples o mal formados: se sirve el archivo completo
+        return None
+
+    inicio, fin = coincidencia.groups()
+    if not inicio and not fin:
+        return None
+    if not inicio:
+        # bytes=-N: los últimos N bytes
+        sufijo = int(fin)
+        if sufijo == 0:
+            return False
+        return max(tamaño - sufijo, 0), tamaño - 1
+
+    inicio = int(inicio)
+    fin = min(int(fin), tamaño - 1) if fin else tamaño - 1
+    if inicio >= tamaño or inicio > fin:
+        return False
+    return inicio, fin
+
+
+def es_rango_continuacion(request):
+    """Indica si la petición pide un fragmento intermedio del archivo (no su inicio)"""
+    coincidencia = RANGE_RE.match(request.META.get('HTTP_RANGE', '').strip())
+    return bool(coincidencia) and coincidencia.group(1) not in ('', '0')
+
+
+def respuesta_delegada(documento, as_attachment, backend):
+    """
+    Respuesta vacía que delega el envío del archivo al servidor web
+    (X-Accel-Redirect para nginx, X-Sendfile para Apache/lighttpd).
+    """
+    response = HttpResponse(content_type='application/pdf')
+    response['Content-Disposition'] = content_disposition_header(
+        as_attachment, documento.get_nombre_archivo()
+    )
+    if backend == 'nginx':
+        prefijo = getattr(settings, 'DOCUMENT_DELIVERY_INTERNAL_URL', '/protected-media/')
+        response['X-Accel-Redirect'] = prefijo.rstrip('/') + '/' + quote(documento.archivo.name)
+    else:
+        response['X-Sendfile'] = documento.archivo.path
+    return response
+
+
+def _preparar_entrega(request, documento, as_attachment):
+    """
+    Resuelve la parte de la entrega que no depende de cómo se envían los bytes.
+    Devuelve (response, None) si ya hay respuesta (304, 416 o delegada) o
+    (None, (ruta, tamaño, rango, etag, last_modified)) si hay que enviar el archivo.
+    """
+    ruta = documento.archivo.path
+    tamaño = os.path.getsize(ruta)
+    etag = obtener_etag(documento, tamaño)
+    last_modified = int(documento.fecha_modificacion.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response, None
+
+    backend = getattr(settings, 'DOCUMENT_DELIVERY_BACKEND', 'django')
+    if backend in ('nginx', 'sendfile'):
+        # El servidor web atiende los rangos y mueve los bytes con sendfile
+        response = respuesta_delegada(documento, as_attachment, backend)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response, None
+
+    rango = parsear_rango(request, tamaño, etag)
+    if rango is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{tamaño}'
+        response['Accept-Ranges'] = 'bytes'
+        return response, None
+
+    return None, (ruta, tamaño, rango, etag, last_modified)
+
+
+def _completar_cabeceras(response, tamaño, rango, etag, last_modified):
+    if rango is not None:
+        inicio, fin = rango
+        response['Content-Length'] = str(fin - inicio + 1)
+        response['Content-Range'] = f'bytes {inicio}-{fin}/{tamaño}'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def servir_documento(request, documento, as_attachment):
+    """
+    Sirve el PDF con soporte de Range (206) y GET condicional (ETag /
+    Last-Modified → 304). Según DOCUMENT_DELIVERY_BACKEND el archivo se envía
+    en streaming desde Django ('django') o lo envía el servidor web ('nginx',
+    'sendfile').
+    """
+    response, entrega = _preparar_entrega(request, documento, as_attachment)
+    if response is not None:
+        return response
+    ruta, tamaño, rango, etag, last_modified = entrega
+
+    archivo = open(ruta, 'rb')
+    filename = documento.get_nombre_archivo()
+
+    if rango is None:
+        response = FileResponse(
+            archivo,
+            as_attachment=as_attachment,
+            filename=filename,
+            content_type='application/pdf'
+        )
+    else:
+        inicio, fin = rango
+        archivo.seek(inicio)
+        response = FileResponse(
+            LectorRango(archivo, fin - inicio + 1),
+            as_attachment=as_attachment,
+            filename=filename,
+            content_type='application/pdf',
+            status=206
+        )
+
+    response.block_size = BLOCK_SIZE
+    return _completar_cabeceras(response, tamaño, rango, etag, last_modified)
+
+
+async def leer_archivo(ruta, inicio, longitud):
+    """
+    Generador asíncrono con los bytes [inicio, inicio + longitud) del archivo.
+    Cada lectura de disco se hace en un hilo y se libera mientras el cliente
+    consume el bloque anterior, así un cliente lento no ocupa un hilo.
+    """
+    archivo = await asyncio.to_thread(open, ruta, 'rb')
+    try:
+        await asyncio.to_thread(archivo.seek, inicio)
+        restante = longitud
+        while restante > 0:
+            datos = await asyncio.to_thread(archivo.read, min(BLOCK_SIZE, restante))
+            if not datos:
+                break
+            restante -= len(datos)
+            yield datos
+    finally:
+        archivo.close()
+
+
+async def aservir_documento(request, documento, as_attachment):
+    """Versión asíncrona de servir_documento para las vistas servidas por ASGI"""
+    response, entrega = await asyncio.to_thread(_preparar_entrega, request, documento, as_attachment)
+    if response is not None:
+        return response
+    ruta, tamaño, rango, etag, last_modified = entrega
+
+    inicio, fin = rango if rango is not None else (0, tamaño - 1)
+    response = StreamingHttpResponse(
+        leer_archivo(ruta, inicio, fin - inicio + 1),
+        content_type='application/pdf',
+        status=206 if rango is not None else 200
+    )
+    response['Content-Length'] = str(tamaño)
+    response['Content-Disposition'] = content_disposition_header(
+        as_attachment, documento.get_nombre_archivo()
+    )
+    return _completar_cabeceras(response, tamaño, rango, etag, last_modified)
@@ -0,0 +1,149 @@
+"""
+Feed JSON de documentos publicados para espejos y agregadores.
+
+Los documentos se recorren en orden de (fecha_modificacion, id) con un cursor
+opaco que codifica la última fila entregada: cada página es una consulta por
+índice (doc_modificacion_idx) sin OFFSET, así que la página mil cuesta lo
+mismo que la primera y un documento modificado durante el recorrido no se
+salta ni se repite. Con `updated_since` un espejo pide solo lo que cambió desde
+su última sincronización, incluidos los documentos retirados (`"activo":
+false`) para que deje de publicarlos. La respuesta se serializa fila a fila en streaming.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from apps.administracion.models import Documento
+
+
+CAMPOS = (
+    'id', 'activo', 'tipo_documento_id', 'tipo_documento__nombre', 'tipo_documento__subarticulo_id',
+    'año', 'trimestre', 'titulo_personalizado', 'tamaño_archivo', 'sha256', 'num_paginas',
+    'fecha_subida', 'fecha_modificacion',
+)
+
+
+class ErrorFeed(ValueError):
+    pass
+
+
+def limite_por_defecto():
+    return getattr(settings, 'DOCUMENTOS_FEED_LIMITE', 100)
+
+
+def limite_maximo():
+    return getattr(settings, 'DOCUMENTOS_FEED_LIMITE_MAXIMO', 1000)
+
+
+def codificar_cursor(fecha_modificacion, documento_id):
+    valor = f'{fecha_modificacion.isoformat()}|{documento_id}'
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        valor = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        fecha, documento_id = valor.split('|')
+        return datetime.fromisoformat(fecha), int(documento_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ErrorFeed('Cursor no válido.')
+
+
+def parsear_fecha(valor):
+    """Fecha u hora ISO 8601; sin zona horaria se interpreta en la hora local"""
+    try:
+        fecha = parse_datetime(valor)
+        if fecha is None:
+            dia = parse_date(valor)
+            fecha = datetime.combine(dia, time.min) if dia else None
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise ErrorFeed('updated_since debe ser una fecha ISO 8601 (AAAA-MM-DD o AAAA-MM-DDTHH:MM:SS).')
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def parsear_entero(valor, nombre):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ErrorFeed(f'{nombre} debe ser un número entero.')
+
+
+def consultar(parametros):
+    """Queryset de una página (limite + 1 filas, para saber si hay más) y el límite"""
+    # Con updated_since también los retirados, para que el espejo los quite
+    documentos = Documento.objects.all() if parametros.get('updated_since') else Documento.objects.filter(activo=True)
+    for parametro, campo in (('ley_id', 'tipo_documento__subarticulo__ley_id'),
+                             ('subarticulo_id', 'tipo_documento__subarticulo_id'),
+                             ('año', 'año')):
+        if parametros.get(parametro):
+            documentos = documentos.filter(**{campo: parsear_entero(parametros[parametro], parametro)})
+
+    if parametros.get('updated_since'):
+        documentos = documentos.filter(fecha_modificacion__gte=parsear_fecha(parametros['updated_since']))
+    if parametros.get('cursor'):
+        fecha, documento_id = decodificar_cursor(parametros['cursor'])
+        documentos = documentos.filter(
+            Q(fecha_modificacion__gt=fecha) | Q(fecha_modificacion=fecha, id__gt=documento_id)
+        )
+
+    limite = parametros.get('limite')
+    limite = parsear_entero(limite, 'limite') if limite else limite_por_defecto()
+    limite = min(max(limite, 1), limite_maximo())
+    filas = documentos.order_by('fecha_modificacion', 'id').values(*CAMPOS)[:limite + 1]
+    return filas, limite
+
+
+def tamaño_legible(tamaño):
+    if not tamaño:
+        return "Desconocido"
+    for unidad in ['B', 'KB', 'MB', 'GB']:
+        if tamaño < 1024.0:
+            return f"{tamaño:.1f} {unidad}"
+        tamaño /= 1024.0
+    return f"{tamaño:.1f} TB"
+
+
+def serializar(fila):
+    return {
+        'id': fila['id'],
+        'activo': fila['activo'],
+        'tipo_documento': fila['tipo_documento__nombre'],
+        'tipo_documento_id': fila['tipo_documento_id'],
+        'subarticulo_id': fila['tipo_documento__subarticulo_id'],
+        'año': fila['año'],
+        'trimestre': fila['trimestre'],
+        'titulo': fila['titulo_personalizado'] or fila['tipo_documento__nombre'],
+        'url_descarga': f'/documento/{fila["id"]}/descargar/',
+        'tamaño': tamaño_legible(fila['tamaño_archivo']),
+        'tamaño_bytes': fila['tamaño_archivo'],
+        'sha256': fila['sha256'],
+        'num_paginas': fila['num_paginas'],
+        'fecha_subida': timezone.localtime(fila['fecha_subida']).strftime('%d/%m/%Y'),
+        'fecha_modificacion': fila['fecha_modificacion'],
+    }
+
+
+def generar(filas, limite):
+    """Fragmentos del JSON {"documentos": [...], "siguiente": cursor|null}"""
+    yield '{"documentos": ['
+    ultima = None
+    hay_mas = False
+    for posicion, fila in enumerate(filas.iterator(chunk_size=limite + 1)):
+        if posicion == limite:
+            hay_mas = True
+            break
+        yield (',' if ultima else '') + json.dumps(serializar(fila), cls=DjangoJSONEncoder, ensure_ascii=False)
+        ultima = fila
+    siguiente = codificar_cursor(ultima['fecha_modificacion'], ultima['id']) if hay_mas else None
+    yield f'], "siguiente": {json.dumps(siguiente)}}}'
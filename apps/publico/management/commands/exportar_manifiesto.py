@@ -0,0 +1,58 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.administracion.models import Documento
+from apps.publico import manifiesto_documentos
+from apps.publico.feed import ErrorFeed, parsear_fecha
+
+
+class Command(BaseCommand):
+    help = (
+        'Escribe el manifiesto JSONL de los documentos publicados (id, ubicación, periodo, tamaño, '
+        'SHA-256 y fecha de modificación) para espejos y respaldos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--salida', help='Archivo de destino (por defecto la salida estándar)')
+        parser.add_argument('--desde', help='Solo documentos modificados desde esta fecha ISO 8601 (modo delta)')
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = parsear_fecha(options['desde'])
+            except ErrorFeed as e:
+                raise CommandError(str(e))
+
+        generado = timezone.now()
+        total = 0
+        salida = options['salida']
+        if salida:
+            # Se escribe a un temporal y se renombra: un espejo nunca lee un manifiesto a medias
+            temporal = f'{salida}.{os.getpid()}.tmp'
+            try:
+                with open(temporal, 'w', encoding='utf-8') as archivo:
+                    for linea in manifiesto_documentos.generar(desde):
+                        archivo.write(linea)
+                        total += 1
+                os.replace(temporal, salida)
+            finally:
+                if os.path.exists(temporal):
+                    os.remove(temporal)
+        else:
+            for linea in manifiesto_documentos.generar(desde):
+                self.stdout.write(linea, ending='')
+                total += 1
+
+        sin_sha256 = Documento.objects.filter(activo=True, sha256__isnull=True).count()
+        if sin_sha256:
+            self.stderr.write(
+                f'⚠️  {sin_sha256} documentos sin SHA-256 (archivos anteriores al almacenamiento por '
+                'contenido): ejecute deduplicar_documentos para calcularlo'
+            )
+        # A stderr para no mezclarlo con el manifiesto; es el --desde de la siguiente exportación
+        self.stderr.write(self.style.SUCCESS(
+            f'✅ {total} documentos en el manifiesto. Generado: {generado.isoformat()}'
+        ))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.publico.publicacion import ErrorPublicacion, publicar, raiz_publicacion
+
+
+class Command(BaseCommand):
+    help = (
+        'Renderiza el sitio público (leyes, sub-artículos por año y fragmentos JSON) en una '
+        'versión estática nueva y la activa cambiando el enlace "actual" que sirve nginx'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--destino', help='Directorio raíz (por defecto PUBLICO_SNAPSHOT_ROOT)')
+        parser.add_argument(
+            '--completo', action='store_true',
+            help='Renderizar todo aunque no haya cambiado (p. ej. tras modificar templates)'
+        )
+        parser.add_argument('--conservar', type=int, default=3, help='Versiones anteriores a conservar')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        try:
+            resumen = publicar(
+                raiz=options['destino'] or raiz_publicacion(),
+                completo=options['completo'],
+                conservar=options['conservar']
+            )
+        except ErrorPublicacion as e:
+            raise CommandError(f'No se publicó la versión: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Versión publicada en {resumen["version"]}: '
+            f'{resumen["renderizados"]} archivos renderizados, {resumen["reutilizados"]} reutilizados '
+            f'({time.monotonic() - inicio:.1f}s)'
+        ))
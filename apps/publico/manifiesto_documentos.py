@@ -0,0 +1,78 @@
+"""
+Manifiesto JSONL de los documentos publicados (comando exportar_manifiesto y
+/api/documentos/manifiesto/).
+
+Una línea por documento activo con su ubicación (ley, sub-artículo, tipo,
+periodo), tamaño, SHA-256 y fecha de modificación, en orden de
+(fecha_modificacion, id). El SHA-256 es el que Documento guarda al subir el
+archivo (almacenamiento por contenido): generar el manifiesto no lee ningún
+PDF. En modo delta (`desde`) solo salen los documentos modificados a partir de
+esa fecha, incluidos los que se retiraron (`"activo": false`) y, al final,
+los eliminados (`"eliminado": true`), para que el espejo los borre. La fecha
+de generación sirve como `desde` de la siguiente sincronización. Un espejo
+compara el SHA-256 con su copia y descarga solo lo que cambió.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from apps.administracion.models import Documento, DocumentoEliminado
+
+
+CAMPOS = (
+    'id', 'activo', 'año', 'trimestre', 'titulo_personalizado', 'nombre_archivo', 'tamaño_archivo', 'sha256',
+    'fecha_modificacion', 'tipo_documento_id', 'tipo_documento__nombre',
+    'tipo_documento__subarticulo_id', 'tipo_documento__subarticulo__nombre',
+    'tipo_documento__subarticulo__ley_id', 'tipo_documento__subarticulo__ley__nombre',
+)
+
+
+def documentos(desde=None):
+    if desde is None:
+        filas = Documento.objects.filter(activo=True)
+    else:
+        # En modo delta también los retirados, para que el espejo los borre
+        filas = Documento.objects.filter(fecha_modificacion__gte=desde)
+    # Mismo orden que el índice doc_modificacion_idx
+    return filas.order_by('fecha_modificacion', 'id').values(*CAMPOS)
+
+
+def eliminados(desde):
+    return DocumentoEliminado.objects.filter(fecha_eliminacion__gte=desde).values_list(
+        'documento_id', 'fecha_eliminacion'
+    )
+
+
+def linea(fila):
+    return json.dumps({
+        'id': fila['id'],
+        'activo': fila['activo'],
+        'ley': {'id': fila['tipo_documento__subarticulo__ley_id'],
+                'nombre': fila['tipo_documento__subarticulo__ley__nombre']},
+        'subarticulo': {'id': fila['tipo_documento__subarticulo_id'],
+                        'nombre': fila['tipo_documento__subarticulo__nombre']},
+        'tipo_documento': {'id': fila['tipo_documento_id'], 'nombre': fila['tipo_documento__nombre']},
+        'año': fila['año'],
+        'trimestre': fila['trimestre'],
+        'titulo': fila['titulo_personalizado'] or fila['tipo_documento__nombre'],
+        'nombre_archivo': fila['nombre_archivo'],
+        'tamaño': fila['tamaño_archivo'],
+        'sha256': fila['sha256'],
+        'modificado': fila['fecha_modificacion'],
+        'url': f'/documento/{fila["id"]}/descargar/',
+    }, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def linea_eliminado(documento_id, fecha_eliminacion):
+    return json.dumps({
+        'id': documento_id, 'activo': False, 'eliminado': True, 'modificado': fecha_eliminacion,
+    }, cls=DjangoJSONEncoder) + '\n'
+
+
+def generar(desde=None):
+    """Líneas del manifiesto; las filas se leen por lotes, sin cargarlas todas"""
+    for fila in documentos(desde).iterator(chunk_size=2000):
+        yield linea(fila)
+    if desde is not None:
+        for documento_id, fecha_eliminacion in eliminados(desde).iterator(chunk_size=2000):
+            yield linea_eliminado(documento_id, fecha_eliminacion)
@@ -0,0 +1,99 @@
+"""
+Árbol de navegación Ley → SubArticulo (solo activos) que usan el menú lateral
+y /api/leyes-subarticulos/. Se construye con una consulta con prefetch y se
+conserva por proceso; la versión vive en la caché de Django para que todos los
+procesos lo reconstruyan cuando se edita una ley o un sub-artículo.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.urls import reverse
+from django.utils.cache import quote_etag
+
+from apps.administracion.models import Ley, SubArticulo
+
+
+VERSION_KEY = 'publico:navegacion:version'
+
+# Iconos del menú según el nombre del sub-artículo (el primero que coincide)
+ICONOS = [
+    (('Presupuesto',), 'fas fa-file-invoice-dollar'),
+    (('Contable',), 'fas fa-calculator'),
+    (('Presupuestaria',), 'fas fa-chart-bar'),
+    (('Programática',), 'fas fa-project-diagram'),
+    (('Ayudas', 'Subsidios'), 'fas fa-hand-holding-usd'),
+    (('Cuenta Pública',), 'fas fa-file-contract'),
+    (('Cualitativa',), 'fas fa-clipboard-check'),
+    (('Inventario', 'Bienes'), 'fas fa-boxes'),
+    (('Disciplina',), 'fas fa-gavel'),
+    (('Anexos',), 'fas fa-paperclip'),
+]
+ICONO_POR_DEFECTO = 'fas fa-file-alt'
+
+_arbol_cache = {'version': None, 'arbol': None}
+_arbol_lock = threading.Lock()
+
+
+def icono_subarticulo(nombre):
+    for palabras, icono in ICONOS:
+        if any(palabra in nombre for palabra in palabras):
+            return icono
+    return ICONO_POR_DEFECTO
+
+
+def construir_arbol():
+    """Lista de leyes activas con sus sub-artículos activos, ya serializable"""
+    leyes = Ley.objects.filter(activa=True).order_by('orden', 'nombre').prefetch_related(
+        Prefetch('subarticulos', queryset=SubArticulo.objects.filter(activo=True).order_by('orden', 'nombre'))
+    )
+    return [
+        {
+            'id': ley.id,
+            'nombre': ley.nombre,
+            'orden': ley.orden,
+            'subarticulos': [
+                {
+                    'id': subarticulo.id,
+                    'nombre': subarticulo.nombre,
+                    'icon': icono_subarticulo(subarticulo.nombre),
+                    'url': reverse('publico:subarticulo_detail', args=[subarticulo.id]),
+                }
+                for subarticulo in ley.subarticulos.all()
+            ],
+        }
+        for ley in leyes
+    ]
+
+
+class ArbolNavegacion:
+    """Árbol ya construido junto con su JSON y su ETag"""
+
+    def __init__(self, leyes):
+        self.leyes = leyes
+        # Mismo formato que espera loadSubarticulosFromServer() en base.html
+        self.json = json.dumps(
+            {str(ley['id']): ley for ley in leyes}, ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+        self.etag = quote_etag(hashlib.sha256(self.json).hexdigest()[:32])
+
+
+def obtener_arbol():
+    """ArbolNavegacion vigente (se reconstruye solo si cambió la versión)"""
+    version = cache.get(VERSION_KEY, 0)
+    with _arbol_lock:
+        if _arbol_cache['version'] != version or _arbol_cache['arbol'] is None:
+            _arbol_cache['arbol'] = ArbolNavegacion(construir_arbol())
+            _arbol_cache['version'] = version
+        return _arbol_cache['arbol']
+
+
+def invalidar_arbol():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Si la clave se perdió, una versión nueva que no pueda coincidir con la anterior
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
@@ -0,0 +1,202 @@
+"""
+Paquete ZIP con todos los documentos de un sub-artículo en un año.
+
+El ZIP se genera al vuelo desde los PDF almacenados, sin archivos temporales y
+con memoria constante. Las entradas van sin comprimir (los PDF ya lo están) y
+con descriptor de datos, así que la posición de cada byte del paquete se
+conoce antes de leer ningún archivo: el tamaño total va en Content-Length y
+una descarga interrumpida se reanuda con Range / If-Range sobre un ETag que
+cambia solo si cambian los documentos.
+
+El CRC-32 de cada PDF se calcula mientras se envía y se guarda en caché por
+su SHA-256; al reanudar, los CRC de lo ya enviado salen de la caché (o se
+recalculan leyendo el archivo) para escribir el directorio central.
+"""
+import hashlib
+import json
+import os
+import re
+import struct
+import zlib
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.http import quote_etag
+
+from apps.administracion.models import Documento
+
+
+BLOQUE = 64 * 1024
+LIMITE_ZIP32 = 0xFFFFFFFF
+MAX_ENTRADAS = 0xFFFF
+
+# Bit 3: CRC y tamaños en el descriptor de datos; bit 11: nombres en UTF-8
+BANDERAS = 0x0808
+VERSION = 20
+LOCAL = struct.Struct('<IHHHHHIIIHH')
+DESCRIPTOR = struct.Struct('<IIII')
+CENTRAL = struct.Struct('<IHHHHHHIIIHHHHHII')
+FIN = struct.Struct('<IHHHHIIH')
+
+CARACTERES_INVALIDOS_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+
+class PaqueteDemasiadoGrande(Exception):
+    pass
+
+
+def limpiar(nombre):
+    return CARACTERES_INVALIDOS_RE.sub('-', nombre).strip(' .') or 'documento'
+
+
+def fecha_dos(fecha):
+    fecha = timezone.localtime(fecha)
+    hora = (fecha.hour << 11) | (fecha.minute << 5) | (fecha.second // 2)
+    dia = ((max(fecha.year, 1980) - 1980) << 9) | (fecha.month << 5) | fecha.day
+    return hora, dia
+
+
+class Entrada:
+    def __init__(self, documento, nombre, ruta, tamaño):
+        self.documento = documento
+        self.nombre = nombre.encode('utf-8')
+        self.ruta = ruta
+        self.tamaño = tamaño
+        self.hora, self.dia = fecha_dos(documento.fecha_modificacion)
+        self.desplazamiento = 0
+
+    @property
+    def clave_crc(self):
+        if self.documento.sha256:
+            return f'paquetes:crc:{self.documento.sha256}'
+        marca = f'{self.ruta}:{self.tamaño}:{os.stat(self.ruta).st_mtime_ns}'
+        return f'paquetes:crc:{hashlib.sha1(marca.encode()).hexdigest()}'
+
+    def cabecera_local(self):
+        return LOCAL.pack(0x04034B50, VERSION, BANDERAS, 0, self.hora, self.dia,
+                          0, self.tamaño, self.tamaño, len(self.nombre), 0) + self.nombre
+
+    def descriptor(self, crc):
+        return DESCRIPTOR.pack(0x08074B50, crc, self.tamaño, self.tamaño)
+
+    def cabecera_central(self, crc):
+        return CENTRAL.pack(0x02014B50, VERSION, VERSION, BANDERAS, 0, self.hora, self.dia, crc,
+                            self.tamaño, self.tamaño, len(self.nombre), 0, 0, 0, 0, 0,
+                            self.desplazamiento) + self.nombre
+
+
+class PaqueteZip:
+    """Disposición determinista del ZIP; leer(inicio, fin) genera cualquier tramo"""
+
+    def __init__(self, entradas, nombre):
+        if len(entradas) > MAX_ENTRADAS:
+            raise PaqueteDemasiadoGrande('Demasiados documentos para un solo paquete.')
+        self.entradas = entradas
+        self.nombre = nombre
+        self.crcs = {}
+
+        # Tramos (inicio, longitud, tipo, entrada) en el orden del archivo
+        self.tramos = []
+        posicion = 0
+        for entrada in entradas:
+            entrada.desplazamiento = posicion
+            for tipo, longitud in (('local', LOCAL.size + len(entrada.nombre)),
+                                   ('datos', entrada.tamaño),
+                                   ('descriptor', DESCRIPTOR.size)):
+                self.tramos.append((posicion, longitud, tipo, entrada))
+                posicion += longitud
+        self.inicio_central = posicion
+        self.tamaño_central = sum(CENTRAL.size + len(e.nombre) for e in entradas)
+        if self.inicio_central + self.tamaño_central > LIMITE_ZIP32:
+            raise PaqueteDemasiadoGrande('El paquete supera los 4 GB.')
+        self.tramos.append((posicion, self.tamaño_central + FIN.size, 'central', None))
+        self.tamaño = posicion + self.tamaño_central + FIN.size
+
+        firma = [(e.nombre.decode(), e.documento.archivo.name, e.tamaño, e.hora, e.dia) for e in entradas]
+        self.etag = quote_etag(hashlib.sha1(json.dumps(firma).encode()).hexdigest()[:24])
+        self.ultima_modificacion = max(e.documento.fecha_modificacion for e in entradas)
+
+    def crc(self, entrada):
+        if entrada not in self.crcs:
+            crc = cache.get(entrada.clave_crc)
+            if crc is None:
+                crc = 0
+                with open(entrada.ruta, 'rb') as archivo:
+                    for bloque in iter(lambda: archivo.read(BLOQUE), b''):
+                        crc = zlib.crc32(bloque, crc)
+                cache.set(entrada.clave_crc, crc, None)
+            self.crcs[entrada] = crc
+        return self.crcs[entrada]
+
+    def _datos(self, entrada, desde, hasta):
+        completo = desde == 0 and hasta == entrada.tamaño
+        crc = 0
+        with open(entrada.ruta, 'rb') as archivo:
+            archivo.seek(desde)
+            restante = hasta - desde
+            while restante > 0:
+                bloque = archivo.read(min(BLOQUE, restante))
+                if not bloque:
+                    raise OSError(f'{entrada.ruta} cambió de tamaño durante la descarga')
+                if completo:
+                    crc = zlib.crc32(bloque, crc)
+                restante -= len(bloque)
+                yield bloque
+        if completo and entrada not in self.crcs:
+            self.crcs[entrada] = crc
+            cache.set(entrada.clave_crc, crc, None)
+
+    def _central(self):
+        cabeceras = b''.join(e.cabecera_central(self.crc(e)) for e in self.entradas)
+        fin = FIN.pack(0x06054B50, 0, 0, len(self.entradas), len(self.entradas),
+                       self.tamaño_central, self.inicio_central, 0)
+        return cabeceras + fin
+
+    def leer(self, inicio=0, fin=None):
+        """Bytes [inicio, fin] del paquete, en bloques"""
+        fin = self.tamaño - 1 if fin is None else fin
+        for posicion, longitud, tipo, entrada in self.tramos:
+            if posicion + longitud <= inicio or longitud == 0:
+                continue
+            if posicion > fin:
+                break
+            desde = max(inicio - posicion, 0)
+            hasta = min(fin - posicion + 1, longitud)
+            if tipo == 'datos':
+                yield from self._datos(entrada, desde, hasta)
+            elif tipo == 'local':
+                yield entrada.cabecera_local()[desde:hasta]
+            elif tipo == 'descriptor':
+                yield entrada.descriptor(self.crc(entrada))[desde:hasta]
+            else:
+                yield self._central()[desde:hasta]
+
+
+def paquete_de(subarticulo, año):
+    """PaqueteZip con los documentos activos del sub-artículo en el año, o None si no hay"""
+    documentos = Documento.objects.filter(
+        tipo_documento__subarticulo=subarticulo, tipo_documento__activo=True, año=año, activo=True
+    ).select_related('tipo_documento').order_by('tipo_documento__orden', 'tipo_documento__nombre', 'trimestre')
+
+    carpeta = limpiar(f'{subarticulo.nombre} {año}')
+    entradas = []
+    usados = set()
+    for documento in documentos:
+        if not documento.archivo:
+            continue
+        try:
+            ruta = documento.archivo.path
+            tamaño = os.path.getsize(ruta)
+        except OSError:
+            continue
+        tipo = limpiar(documento.tipo_documento.nombre)
+        periodo = f'{año} {documento.trimestre}' if documento.trimestre else str(año)
+        nombre = f'{carpeta}/{tipo}/{tipo} {periodo}.pdf'
+        if nombre in usados:
+            nombre = f'{carpeta}/{tipo}/{tipo} {periodo} ({documento.pk}).pdf'
+        usados.add(nombre)
+        entradas.append(Entrada(documento, nombre, ruta, tamaño))
+
+    if not entradas:
+        return None
+    return PaqueteZip(entradas, f'{carpeta}.zip')
@@ -0,0 +1,204 @@
+"""
+Publicación estática del sitio público (comando publicar_sitio).
+
+Cada publicación se escribe en PUBLICO_SNAPSHOT_ROOT/versiones/<marca>/ con
+la misma estructura de URLs que sirve Django y se activa cambiando de forma
+atómica el enlace simbólico PUBLICO_SNAPSHOT_ROOT/actual, que es la raíz que
+usa nginx. Las páginas de cada ley y sub-artículo llevan una firma de su
+contenido; en la siguiente publicación solo se renderizan las que cambiaron y
+el resto se enlaza (hard link) desde la versión anterior.
+"""
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from apps.administracion.models import Ley, SubArticulo, TipoDocumento, DisponibilidadAnual
+from .navegacion import obtener_arbol
+
+
+MANIFIESTO = 'manifiesto.json'
+
+
+class ErrorPublicacion(Exception):
+    pass
+
+
+def raiz_publicacion():
+    return getattr(settings, 'PUBLICO_SNAPSHOT_ROOT', os.path.join(settings.BASE_DIR, 'snapshot'))
+
+
+def _firma(datos):
+    return hashlib.sha256(json.dumps(datos, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def firmas_contenido():
+    """
+    Firmas de lo que muestra cada página: {'global': ..., 'leyes': {id: ...},
+    'subarticulos': {id: ...}}. 'global' cubre el menú lateral (todas las
+    páginas HTML) y el año en curso (ventana de años del selector).
+    """
+    indice = DisponibilidadAnual.indice()
+    tipos = {}
+    for tipo in TipoDocumento.objects.values('id', 'subarticulo_id', 'nombre', 'activo', 'orden').order_by('id'):
+        tipos.setdefault(tipo['subarticulo_id'], []).append(tipo)
+
+    leyes_activas = {ley['id']: ley for ley in Ley.objects.filter(activa=True).values()}
+    por_ley = {ley_id: [] for ley_id in leyes_activas}
+    subarticulos = {}
+    for subarticulo in SubArticulo.objects.filter(ley_id__in=leyes_activas, activo=True).values().order_by('id'):
+        tipos_sub = tipos.get(subarticulo['id'], [])
+        por_ley[subarticulo['ley_id']].append((subarticulo, len(tipos_sub)))
+        subarticulos[subarticulo['id']] = _firma({
+            'ley': leyes_activas[subarticulo['ley_id']],
+            'subarticulo': subarticulo,
+            'tipos': tipos_sub,
+            'años': sorted(indice.get(subarticulo['id'], {}).items()),
+        })
+
+    leyes = {ley_id: _firma({'ley': ley, 'subarticulos': por_ley[ley_id]}) for ley_id, ley in leyes_activas.items()}
+
+    return {
+        'global': _firma({'menu': obtener_arbol().etag, 'año': datetime.now().year}),
+        'leyes': leyes,
+        'subarticulos': subarticulos,
+    }
+
+
+def paginas_de_ley(ley_id):
+    """[(ruta del archivo, url, parámetros GET)] de una ley"""
+    return [
+        (f'ley/{ley_id}/index.html', reverse('publico:ley_detail', args=[ley_id]), {}),
+        (f'api/ley/{ley_id}/content/todos.json', reverse('publico:api_ley_content', args=[ley_id]), {}),
+    ]
+
+
+def paginas_de_subarticulo(subarticulo_id):
+    """Página de cada año del selector y fragmentos JSON de la API del sub-artículo"""
+    año_actual = datetime.now().year
+    url = reverse('publico:subarticulo_detail', args=[subarticulo_id])
+    url_api = reverse('publico:api_subarticulo_content', args=[subarticulo_id])
+    paginas = [(f'api/subarticulo/{subarticulo_id}/content/todos.json', url_api, {})]
+    for año in DisponibilidadAnual.años(subarticulo_id, desde=año_actual - 6, hasta=año_actual):
+        paginas.append((f'subarticulo/{subarticulo_id}/{año}.html', url, {'año': año}))
+        paginas.append((f'api/subarticulo/{subarticulo_id}/content/{año}.json', url_api, {'año': año}))
+    # El año que muestra el selector cuando aún no hay documentos del año en curso
+    año_preferido = DisponibilidadAnual.año_preferido(subarticulo_id, año_actual)
+    if not any(pagina[2].get('año') == año_preferido for pagina in paginas):
+        paginas.append((f'subarticulo/{subarticulo_id}/{año_preferido}.html', url, {'año': año_preferido}))
+    return paginas
+
+
+def renderizar(url, parametros):
+    """Contenido de la respuesta de Django para un GET anónimo"""
+    request = RequestFactory(SERVER_NAME='localhost').get(url, parametros)
+    request.user = AnonymousUser()
+    coincidencia = resolve(url)
+    if iscoroutinefunction(coincidencia.func):
+        response = async_to_sync(coincidencia.func)(request, *coincidencia.args, **coincidencia.kwargs)
+    else:
+        response = coincidencia.func(request, *coincidencia.args, **coincidencia.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code != 200:
+        raise ErrorPublicacion(f'{url}?{request.META["QUERY_STRING"]} respondió {response.status_code}')
+    return response.content
+
+
+def _escribir(destino, contenido):
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    with open(destino, 'wb') as archivo:
+        archivo.write(contenido)
+
+
+def _reutilizar(origen, destino):
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    try:
+        os.link(origen, destino)
+    except OSError:
+        shutil.copy2(origen, destino)
+
+
+def version_actual(raiz):
+    enlace = os.path.join(raiz, 'actual')
+    return os.path.realpath(enlace) if os.path.islink(enlace) else None
+
+
+def activar(raiz, directorio):
+    """Cambia el enlace 'actual' de forma atómica (rename sobre el enlace existente)"""
+    enlace = os.path.join(raiz, 'actual')
+    temporal = os.path.join(raiz, f'.actual-{os.getpid()}')
+    if os.path.lexists(temporal):
+        os.remove(temporal)
+    os.symlink(os.path.relpath(directorio, raiz), temporal)
+    os.replace(temporal, enlace)
+
+
+def limpiar(raiz, conservar):
+    """Elimina las versiones antiguas, conservando la activa y las `conservar` más recientes"""
+    versiones = os.path.join(raiz, 'versiones')
+    activa = version_actual(raiz)
+    nombres = sorted(os.listdir(versiones), reverse=True)
+    for nombre in nombres[conservar:]:
+        ruta = os.path.join(versiones, nombre)
+        if os.path.realpath(ruta) != activa:
+            shutil.rmtree(ruta, ignore_errors=True)
+
+
+def publicar(raiz=None, completo=False, conservar=3):
+    """
+    Genera una versión nueva y la activa. Devuelve un resumen con la ruta de
+    la versión y el número de archivos renderizados y reutilizados.
+    """
+    raiz = raiz or raiz_publicacion()
+    anterior = version_actual(raiz)
+    manifiesto_anterior = {}
+    if anterior and not completo and os.path.exists(os.path.join(anterior, MANIFIESTO)):
+        with open(os.path.join(anterior, MANIFIESTO)) as archivo:
+            manifiesto_anterior = json.load(archivo)
+
+    firmas = firmas_contenido()
+    mismo_global = manifiesto_anterior.get('global') == firmas['global']
+    directorio = os.path.join(raiz, 'versiones', datetime.now().strftime('%Y%m%d%H%M%S%f'))
+    os.makedirs(directorio)
+
+    resumen = {'version': directorio, 'renderizados': 0, 'reutilizados': 0}
+    grupos = [('leyes', ley_id, paginas_de_ley(ley_id)) for ley_id in firmas['leyes']]
+    grupos += [('subarticulos', sub_id, paginas_de_subarticulo(sub_id)) for sub_id in firmas['subarticulos']]
+
+    try:
+        for tipo, objeto_id, paginas in grupos:
+            firma_anterior = manifiesto_anterior.get(tipo, {}).get(str(objeto_id))
+            sin_cambios = firma_anterior == firmas[tipo][objeto_id]
+            for ruta, url, parametros in paginas:
+                destino = os.path.join(directorio, ruta)
+                origen = os.path.join(anterior, ruta) if anterior else None
+                # El HTML lleva el menú lateral; los JSON solo dependen de su propio contenido
+                vigente = sin_cambios and (mismo_global or ruta.endswith('.json'))
+                if vigente and origen and os.path.exists(origen):
+                    _reutilizar(origen, destino)
+                    resumen['reutilizados'] += 1
+                else:
+                    _escribir(destino, renderizar(url, parametros))
+                    resumen['renderizados'] += 1
+
+        _escribir(os.path.join(directorio, MANIFIESTO), json.dumps({
+            'global': firmas['global'],
+            'leyes': {str(k): v for k, v in firmas['leyes'].items()},
+            'subarticulos': {str(k): v for k, v in firmas['subarticulos'].items()},
+            'fecha': datetime.now().isoformat(),
+        }, indent=2).encode())
+    except Exception:
+        shutil.rmtree(directorio, ignore_errors=True)
+        raise
+
+    activar(raiz, directorio)
+    limpiar(raiz, conservar)
+    return resumen
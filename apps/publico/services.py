@@ -0,0 +1,52 @@
+from apps.administracion.models import Documento
+
+
+TRIMESTRES = ['T1', 'T2', 'T3', 'T4']
+
+
+def _documentos_subarticulo(subarticulo, años):
+    return Documento.objects.filter(
+        tipo_documento__subarticulo=subarticulo,
+        año__in=años,
+        activo=True
+    ).select_related('tipo_documento')
+
+
+def _pivotear(subarticulo, tipos_documento, años, documentos):
+    # Indexar por (año, tipo, periodo); se conserva el primero según el orden del modelo
+    es_anual = subarticulo.periodicidad == 'ANUAL'
+    indice = {}
+    for documento in documentos:
+        periodo = 'ANUAL' if es_anual else documento.trimestre
+        indice.setdefault((documento.año, documento.tipo_documento_id, periodo), documento)
+
+    # Pivotear en memoria con la misma forma que antes
+    periodos = ['ANUAL'] if es_anual else TRIMESTRES
+    documentos_agrupados = {}
+    for año in años:
+        documentos_agrupados[año] = {}
+        for tipo_doc in tipos_documento:
+            documentos_agrupados[año][tipo_doc] = {
+                periodo: indice.get((año, tipo_doc.id, periodo))
+                for periodo in periodos
+            }
+
+    return documentos_agrupados
+
+
+def agrupar_documentos(subarticulo, tipos_documento, años):
+    """
+    Construye la rejilla {año: {tipo_documento: {periodo: documento}}} que usan
+    los templates, cargando todos los documentos activos en una sola consulta.
+    """
+    años = list(años)
+    tipos_documento = list(tipos_documento)
+    documentos = _documentos_subarticulo(subarticulo, años)
+    return _pivotear(subarticulo, tipos_documento, años, documentos)
+
+
+async def aagrupar_documentos(subarticulo, tipos_documento, años):
+    """Versión asíncrona de agrupar_documentos (años y tipos ya evaluados)"""
+    años = list(años)
+    documentos = [documento async for documento in _documentos_subarticulo(subarticulo, años)]
+    return _pivotear(subarticulo, tipos_documento, años, documentos)
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from apps.administracion.carga_masiva import documentos_cargados
+from apps.administracion.procesamiento import documento_procesado
+from apps.administracion.models import Ley, SubArticulo, TipoDocumento, Documento
+from . import cache as fragmentos
+from .navegacion import invalidar_arbol
+
+
+@receiver(post_save, sender=Ley)
+@receiver(post_delete, sender=Ley)
+@receiver(post_save, sender=SubArticulo)
+@receiver(post_delete, sender=SubArticulo)
+@receiver(post_save, sender=TipoDocumento)
+@receiver(post_delete, sender=TipoDocumento)
+@receiver(post_save, sender=Documento)
+@receiver(post_delete, sender=Documento)
+@receiver(documentos_cargados)
+@receiver(documento_procesado)
+def invalidar_contenido_publico(sender, **kwargs):
+    """Invalida los fragmentos en caché cuando cambia el contenido publicado"""
+    fragmentos.incrementar_version()
+
+
+@receiver(post_save, sender=Ley)
+@receiver(post_delete, sender=Ley)
+@receiver(post_save, sender=SubArticulo)
+@receiver(post_delete, sender=SubArticulo)
+def invalidar_navegacion(sender, **kwargs):
+    """Reconstruir el árbol del menú cuando cambia una ley o un sub-artículo"""
+    invalidar_arbol()
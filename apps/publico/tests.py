@@ -1,3 +1,899 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.models import User
+from django.contrib.messages import INFO
+from django.contrib.messages.storage.base import Message
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.administracion import procesamiento
+from apps.administracion.models import (
+    Ley, SubArticulo, TipoDocumento, Documento, LogAcceso, DisponibilidadAnual, IndiceBusqueda
+)
+from apps.administracion.tests import MediaTemporalMixin
+from .busqueda import buscar
+from .services import agrupar_documentos
+from . import cache as fragmentos
+from . import views_async
+from .cache_http import cache_publico, es_cacheable
+from .accesos import EscritorLogAcceso
+
+
+def crear_subarticulo_con_documentos(periodicidad='TRIMESTRAL', num_tipos=9, num_años=6):
+    """Crea un sub-artículo con documentos para cada tipo, año y trimestre"""
+    ley, _ = Ley.objects.get_or_create(nombre='Ley de Prueba', defaults={'orden': 1})
+    subarticulo = SubArticulo.objects.create(
+        ley=ley,
+        nombre=f'Sub-artículo {periodicidad}',
+        periodicidad=periodicidad,
+        orden=1
+    )
+    tipos = [
+        TipoDocumento.objects.create(subarticulo=subarticulo, nombre=f'Tipo {i}', orden=i)
+        for i in range(1, num_tipos + 1)
+    ]
+
+    año_actual = datetime.now().year
+    años = list(range(año_actual - num_años + 1, año_actual + 1))
+    periodos = [None] if periodicidad == 'ANUAL' else ['T1', 'T2', 'T3', 'T4']
+
+    # bulk_create evita Documento.save(), que requiere un archivo real
+    Documento.objects.bulk_create([
+        Documento(
+            tipo_documento=tipo,
+            año=año,
+            trimestre=trimestre,
+            archivo=f'documentos/prueba_{tipo.id}_{año}_{trimestre}.pdf',
+            tamaño_archivo=1024
+        )
+        for tipo in tipos
+        for año in años
+        for trimestre in periodos
+    ])
+    DisponibilidadAnual.reconstruir(subarticulo.id)
+    return subarticulo, tipos, años
+
+
+class AgruparDocumentosTest(TestCase):
+    """Pruebas del constructor de la rejilla de documentos"""
+
+    def test_rejilla_trimestral(self):
+        subarticulo, tipos, años = crear_subarticulo_con_documentos(num_tipos=2, num_años=2)
+        Documento.objects.filter(tipo_documento=tipos[0], año=años[0], trimestre='T3').update(activo=False)
+
+        with self.assertNumQueries(1):
+            agrupados = agrupar_documentos(subarticulo, tipos, años)
+
+        self.assertEqual(list(agrupados), años)
+        self.assertEqual(list(agrupados[años[0]]), tipos)
+        celda = agrupados[años[0]][tipos[0]]
+        self.assertEqual(list(celda), ['T1', 'T2', 'T3', 'T4'])
+        self.assertIsNone(celda['T3'])
+        self.assertEqual(celda['T1'].trimestre, 'T1')
+        self.assertEqual(celda['T1'].tipo_documento_id, tipos[0].id)
+
+    def test_rejilla_anual(self):
+        subarticulo, tipos, años = crear_subarticulo_con_documentos('ANUAL', num_tipos=2, num_años=2)
+
+        agrupados = agrupar_documentos(subarticulo, tipos, años + [años[-1] + 1])
+
+        self.assertEqual(agrupados[años[0]][tipos[1]]['ANUAL'].año, años[0])
+        self.assertEqual(agrupados[años[-1] + 1][tipos[0]], {'ANUAL': None})
+
+
+class SubArticuloQueryBudgetTest(TestCase):
+    """El número de consultas no debe crecer con los tipos, años o trimestres"""
+
+    PRESUPUESTO_CONSULTAS = 10
+
+    def setUp(self):
+        cache.clear()
+        self.subarticulo, self.tipos, self.años = crear_subarticulo_con_documentos()
+
+    def test_detalle_subarticulo(self):
+        url = reverse('publico:subarticulo_detail', args=[self.subarticulo.id])
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, {'año': self.años[-1]})
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(consultas), self.PRESUPUESTO_CONSULTAS)
+
+    def test_api_contenido_subarticulo(self):
+        url = reverse('publico:api_subarticulo_content', args=[self.subarticulo.id])
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, {'año': self.años[-1]})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+        self.assertLessEqual(len(consultas), self.PRESUPUESTO_CONSULTAS)
+
+
+class FragmentoCacheTest(TestCase):
+    """Caché versionada de las APIs de contenido"""
+
+    def setUp(self):
+        cache.clear()
+        fragmentos.reiniciar_estadisticas()
+        self.subarticulo, self.tipos, self.años = crear_subarticulo_con_documentos(num_tipos=2, num_años=2)
+        self.url = reverse('publico:api_subarticulo_content', args=[self.subarticulo.id])
+
+    def test_cache_caliente_no_consulta_la_base_de_datos(self):
+        primera = self.client.get(self.url, {'año': self.años[-1]})
+
+        with self.assertNumQueries(0):
+            segunda = self.client.get(self.url, {'año': self.años[-1]})
+
+        self.assertEqual(primera.json(), segunda.json())
+        self.assertEqual(fragmentos.estadisticas()['hits'], 1)
+        self.assertEqual(fragmentos.estadisticas()['misses'], 1)
+
+    def test_cambio_en_documento_invalida_fragmento(self):
+        self.client.get(self.url, {'año': self.años[-1]})
+        version = fragmentos.obtener_version()
+
+        Documento.objects.filter(tipo_documento=self.tipos[0], año=self.años[-1]).first().delete()
+
+        self.assertGreater(fragmentos.obtener_version(), version)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(self.url, {'año': self.años[-1]})
+        self.assertGreater(len(consultas), 0)
+        self.assertEqual(fragmentos.estadisticas()['misses'], 2)
+
+    def test_version_perdida_no_reutiliza_fragmentos_antiguos(self):
+        cache.delete(fragmentos.VERSION_KEY)
+        fragmentos.guardar_fragmento('prueba', 1, 'antiguo')
+        # La clave de versión se purga: la nueva no coincide con v1/v2
+        cache.delete(fragmentos.VERSION_KEY)
+        self.assertIsNone(fragmentos.obtener_fragmento('prueba', 1))
+        cache.delete(fragmentos.VERSION_KEY)
+        fragmentos.incrementar_version()
+        self.assertIsNone(fragmentos.obtener_fragmento('prueba', 1))
+
+    def test_cache_api_ley(self):
+        url = reverse('publico:api_ley_content', args=[self.subarticulo.ley_id])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertTrue(response.json()['success'])
+        TipoDocumento.objects.get(pk=self.tipos[0].pk).delete()
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(url)
+        self.assertGreater(len(consultas), 0)
+
+
+class ArbolNavegacionTest(TestCase):
+    """Árbol Ley → SubArticulo del menú lateral"""
+
+    def setUp(self):
+        cache.clear()
+        self.subarticulo, _, self.años = crear_subarticulo_con_documentos(num_tipos=1, num_años=1)
+        self.inactivo = SubArticulo.objects.create(
+            ley=self.subarticulo.ley, nombre='Inventario de Bienes', orden=2, activo=False
+        )
+        self.url = reverse('publico:api_leyes_subarticulos')
+
+    def test_api_en_memoria_con_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        subarticulos = datos[str(self.subarticulo.ley_id)]['subarticulos']
+        self.assertEqual([s['id'] for s in subarticulos], [self.subarticulo.id])
+        self.assertEqual(subarticulos[0]['url'], reverse('publico:subarticulo_detail', args=[self.subarticulo.id]))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_cambio_en_subarticulo_invalida_el_arbol(self):
+        etag = self.client.get(self.url)['ETag']
+
+        self.inactivo.activo = True
+        self.inactivo.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        subarticulos = response.json()[str(self.subarticulo.ley_id)]['subarticulos']
+        self.assertEqual(subarticulos[1]['icon'], 'fas fa-boxes')
+
+    def test_menu_lateral_usa_el_arbol(self):
+        url = reverse('publico:subarticulo_detail', args=[self.subarticulo.id])
+        response = self.client.get(url, {'año': self.años[-1]})
+        self.assertContains(response, 'class="subnav-item active"')
+        self.assertNotContains(response, 'Inventario de Bienes')
+
+        # Más leyes no añaden consultas al menú
+        with CaptureQueriesContext(connection) as antes:
+            self.client.get(url, {'año': self.años[-1]})
+        for i in range(3):
+            ley = Ley.objects.create(nombre=f'Otra ley {i}', orden=i + 2)
+            SubArticulo.objects.create(ley=ley, nombre='Anexos', orden=1)
+        self.client.get(url, {'año': self.años[-1]})
+        with CaptureQueriesContext(connection) as despues:
+            self.client.get(url, {'año': self.años[-1]})
+        self.assertEqual(len(despues), len(antes))
+
+
+    def test_menu_en_detalle_de_ley(self):
+        response = self.client.get(reverse('publico:ley_detail', args=[self.subarticulo.ley_id]))
+        self.assertContains(response, reverse('publico:subarticulo_detail', args=[self.subarticulo.id]))
+        self.assertNotContains(response, 'Inventario de Bienes')
+
+    def test_edicion_desde_el_admin_refresca_el_menu(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.client.force_login(admin)
+        self.client.get(self.url)
+
+        response = self.client.post(reverse('admin:administracion_subarticulo_change', args=[self.subarticulo.id]), {
+            'ley': self.subarticulo.ley_id,
+            'nombre': 'Sub-artículo renombrado',
+            'periodicidad': self.subarticulo.periodicidad,
+            'activo': 'on',
+            'orden': 1,
+        })
+        self.assertEqual(response.status_code, 302)
+
+        subarticulos = self.client.get(self.url).json()[str(self.subarticulo.ley_id)]['subarticulos']
+        self.assertEqual(subarticulos[0]['nombre'], 'Sub-artículo renombrado')
+
+class CacheHttpPublicoTest(TestCase):
+    """ETag, 304 y Cache-Control de las páginas públicas"""
+
+    def setUp(self):
+        cache.clear()
+        self.subarticulo, self.tipos, self.años = crear_subarticulo_con_documentos(num_tipos=2, num_años=2)
+        self.url = reverse('publico:subarticulo_detail', args=[self.subarticulo.id])
+        self.parametros = {'año': self.años[-1]}
+
+    def test_304_sin_consultas_ni_render(self):
+        response = self.client.get(self.url, self.parametros)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, self.parametros, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_cambio_de_contenido_cambia_el_etag(self):
+        etag = self.client.get(self.url, self.parametros)['ETag']
+        self.assertNotEqual(self.client.get(self.url, {'año': self.años[0]})['ETag'], etag)
+
+        # Un tipo de documento no tiene fecha de modificación; cuenta igual
+        self.tipos[0].nombre = 'Renombrado'
+        self.tipos[0].save()
+
+        response = self.client.get(self.url, self.parametros, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Renombrado')
+
+    def test_usuarios_con_sesion_no_se_cachean(self):
+        self.client.force_login(User.objects.create_user('editor', password='clave'))
+        response = self.client.get(self.url, self.parametros)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_mensajes_pendientes_no_se_cachean(self):
+        request = RequestFactory().get(self.url, self.parametros)
+        request.COOKIES[CookieStorage.cookie_name] = CookieStorage(request)._encode([Message(INFO, 'Guardado')])
+        self.assertFalse(es_cacheable(request))
+
+        def vista(request):
+            messages.info(request, 'Gracias por su consulta')
+            return HttpResponse('ok')
+        request = RequestFactory().get(self.url)
+        request._messages = CookieStorage(request)
+        response = cache_publico(vista)(request)
+        self.assertNotIn('ETag', response)
+        self.assertIn('private', response['Cache-Control'])
+
+    async def test_vista_asincrona(self):
+        vista = cache_publico(views_async.SubArticuloContentAPIView.as_view())
+        factory = AsyncRequestFactory()
+        response = await vista(factory.get('/', self.parametros), subarticulo_id=self.subarticulo.id)
+        self.assertEqual(response.status_code, 200)
+
+        request = factory.get('/', self.parametros, headers={'If-None-Match': response['ETag']})
+        response = await vista(request, subarticulo_id=self.subarticulo.id)
+        self.assertEqual(response.status_code, 304)
+
+
+class PublicacionEstaticaTest(TestCase):
+    """Comando publicar_sitio: versión estática con cambio atómico e incremental"""
+
+    def setUp(self):
+        cache.clear()
+        self.raiz = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.raiz, ignore_errors=True)
+        self.subarticulo, self.tipos, self.años = crear_subarticulo_con_documentos(num_tipos=2, num_años=2)
+        self.otro, _, _ = crear_subarticulo_con_documentos('ANUAL', num_tipos=1, num_años=1)
+
+    def publicar(self, **opciones):
+        salida = StringIO()
+        call_command('publicar_sitio', destino=self.raiz, stdout=salida, **opciones)
+        return os.path.join(self.raiz, 'actual'), salida.getvalue()
+
+    def test_publica_paginas_y_fragmentos(self):
+        actual, _ = self.publicar()
+        self.assertTrue(os.path.islink(actual))
+
+        pagina = os.path.join(actual, f'subarticulo/{self.subarticulo.id}/{self.años[-1]}.html')
+        with open(pagina, encoding='utf-8') as archivo:
+            self.assertIn(self.tipos[0].nombre, archivo.read())
+        self.assertTrue(os.path.exists(os.path.join(actual, f'ley/{self.subarticulo.ley_id}/index.html')))
+
+        fragmento = os.path.join(actual, f'api/subarticulo/{self.subarticulo.id}/content/{self.años[0]}.json')
+        with open(fragmento, encoding='utf-8') as archivo:
+            self.assertTrue(json.load(archivo)['success'])
+
+    def test_solo_se_renderiza_lo_que_cambia(self):
+        primera, _ = self.publicar()
+        primera = os.path.realpath(primera)
+
+        _, salida = self.publicar()
+        self.assertIn(' 0 archivos renderizados', salida)
+
+        self.tipos[0].nombre = 'Tipo renombrado'
+        self.tipos[0].save()
+        actual, salida = self.publicar()
+
+        # Solo el sub-artículo modificado: su página y su fragmento por año, más el fragmento 'todos'
+        self.assertIn(f' {2 * len(self.años) + 1} archivos renderizados', salida)
+        ruta = f'subarticulo/{self.otro.id}/{self.años[-1]}.html'
+        self.assertEqual(os.stat(os.path.join(actual, ruta)).st_ino, os.stat(os.path.join(primera, ruta)).st_ino)
+        pagina = os.path.join(actual, f'subarticulo/{self.subarticulo.id}/{self.años[-1]}.html')
+        with open(pagina, encoding='utf-8') as archivo:
+            self.assertIn('Tipo renombrado', archivo.read())
+
+    def test_conserva_solo_las_ultimas_versiones(self):
+        for _ in range(4):
+            self.publicar(conservar=2)
+        self.assertEqual(len(os.listdir(os.path.join(self.raiz, 'versiones'))), 2)
+
+
+class DescargaDocumentoTest(MediaTemporalMixin, TestCase):
+    """Entrega de PDFs en streaming con Range y GET condicional"""
+
+    CONTENIDO = b'%PDF-1.4\n' + bytes(range(256)) * 400
+
+    ajustes_adicionales = {'ACCESS_LOG_ASYNC': False}
+
+    def setUp(self):
+        subarticulo, tipos, _ = crear_subarticulo_con_documentos('ANUAL', num_tipos=1, num_años=1)
+        self.documento = Documento.objects.create(
+            tipo_documento=tipos[0],
+            año=datetime.now().year - 1,
+            archivo=SimpleUploadedFile('informe.pdf', self.CONTENIDO, content_type='application/pdf')
+        )
+        self.url_ver = reverse('publico:visualizar_documento', args=[self.documento.id])
+        self.url_descargar = reverse('publico:descargar_documento', args=[self.documento.id])
+
+    def test_respuesta_completa_en_streaming(self):
+        response = self.client.get(self.url_descargar)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENIDO)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(int(response['Content-Length']), len(self.CONTENIDO))
+        self.assertEqual(LogAcceso.objects.filter(tipo_acceso='DESCARGA').count(), 1)
+
+    def test_rango_parcial(self):
+        response = self.client.get(self.url_ver, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENIDO[100:200])
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.CONTENIDO)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertIn('inline', response['Content-Disposition'])
+        # Un rango intermedio no cuenta como una nueva visualización
+        self.assertEqual(LogAcceso.objects.count(), 0)
+
+    def test_rango_sufijo_e_insatisfacible(self):
+        response = self.client.get(self.url_ver, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENIDO[-10:])
+
+        response = self.client.get(self.url_ver, HTTP_RANGE=f'bytes={len(self.CONTENIDO)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.CONTENIDO)}')
+
+    def test_if_range_desactualizado_sirve_archivo_completo(self):
+        response = self.client.get(self.url_ver, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"otro"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_condicional(self):
+        response = self.client.get(self.url_ver)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        self.assertEqual(self.client.get(self.url_ver, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url_ver, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(self.url_ver, HTTP_IF_NONE_MATCH='"viejo"').status_code, 200)
+
+    @override_settings(DOCUMENT_DELIVERY_BACKEND='nginx', DOCUMENT_DELIVERY_INTERNAL_URL='/protected-media/')
+    def test_entrega_delegada_a_nginx(self):
+        response = self.client.get(self.url_descargar)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.documento.archivo.name)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(LogAcceso.objects.filter(tipo_acceso='DESCARGA').count(), 1)
+
+    @override_settings(DOCUMENT_DELIVERY_BACKEND='sendfile')
+    def test_entrega_delegada_x_sendfile(self):
+        response = self.client.get(self.url_ver)
+        self.assertEqual(response['X-Sendfile'], self.documento.archivo.path)
+        self.assertIn('inline', response['Content-Disposition'])
+
+
+class VistasAsincronasTest(MediaTemporalMixin, TestCase):
+    """Versiones asíncronas de las APIs de contenido y de la entrega de PDFs"""
+
+    CONTENIDO = DescargaDocumentoTest.CONTENIDO
+
+    ajustes_adicionales = {'ACCESS_LOG_ASYNC': False}
+
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+        self.subarticulo, tipos, self.años = crear_subarticulo_con_documentos(num_tipos=2, num_años=2)
+        self.documento = Documento.objects.create(
+            tipo_documento=tipos[0],
+            año=self.años[0] - 1,
+            trimestre='T1',
+            archivo=SimpleUploadedFile('informe.pdf', self.CONTENIDO, content_type='application/pdf')
+        )
+
+    async def _contenido(self, response):
+        return b''.join([bloque async for bloque in response.streaming_content])
+
+    async def test_descarga_completa(self):
+        request = self.factory.get('/documento/descargar/')
+        response = await views_async.DescargarDocumentoView.as_view()(request, documento_id=self.documento.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertEqual(await self._contenido(response), self.CONTENIDO)
+        self.assertEqual(int(response['Content-Length']), len(self.CONTENIDO))
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(await LogAcceso.objects.filter(tipo_acceso='DESCARGA').acount(), 1)
+
+    async def test_rango_y_get_condicional(self):
+        vista = views_async.VisualizarDocumentoView.as_view()
+        request = self.factory.get('/', headers={'Range': 'bytes=100-199'})
+        response = await vista(request, documento_id=self.documento.id)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(await self._contenido(response), self.CONTENIDO[100:200])
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.CONTENIDO)}')
+        self.assertEqual(response['Content-Length'], '100')
+
+        request = self.factory.get('/', headers={'If-None-Match': response['ETag']})
+        response = await vista(request, documento_id=self.documento.id)
+        self.assertEqual(response.status_code, 304)
+
+    async def test_documento_inexistente(self):
+        with self.assertRaises(Http404):
+            await views_async.DescargarDocumentoView.as_view()(self.factory.get('/'), documento_id=0)
+
+    async def test_apis_de_contenido_coinciden_con_las_sincronas(self):
+        año = str(self.años[-1])
+        response = await views_async.SubArticuloContentAPIView.as_view()(
+            self.factory.get('/', {'año': año}), subarticulo_id=self.subarticulo.id
+        )
+        asincrona = json.loads(response.content)
+        self.assertTrue(asincrona['success'])
+
+        cache.clear()
+        url = reverse('publico:api_subarticulo_content', args=[self.subarticulo.id])
+        sincrona = (await sync_to_async(self.client.get)(url, {'año': año})).json()
+        self.assertEqual(asincrona, sincrona)
+
+        response = await views_async.LeyContentAPIView.as_view()(self.factory.get('/'), ley_id=self.subarticulo.ley_id)
+        datos = json.loads(response.content)
+        self.assertTrue(datos['success'])
+        self.assertIn('2 documentos', datos['content'])
+
+
+class FeedDocumentosTest(TestCase):
+    """Feed /api/documentos/ paginado por cursor"""
+
+    def setUp(self):
+        cache.clear()
+        self.subarticulo, self.tipos, self.años = crear_subarticulo_con_documentos(num_tipos=2, num_años=2)
+        Documento.objects.filter(tipo_documento=self.tipos[0], trimestre='T4').update(activo=False)
+        self.url = reverse('publico:api_documentos')
+
+    def pagina(self, **parametros):
+        response = self.client.get(self.url, parametros)
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(1):
+            return json.loads(b''.join(response.streaming_content))
+
+    def test_recorrido_completo_por_cursor(self):
+        esperados = list(Documento.objects.filter(activo=True).order_by('fecha_modificacion', 'id').values_list(
+            'id', flat=True
+        ))
+        vistos = []
+        datos = self.pagina(limite=5)
+        while True:
+            self.assertLessEqual(len(datos['documentos']), 5)
+            vistos += [documento['id'] for documento in datos['documentos']]
+            if not datos['siguiente']:
+                break
+            datos = self.pagina(limite=5, cursor=datos['siguiente'])
+        self.assertEqual(vistos, esperados)
+
+        documento = datos['documentos'][-1]
+        self.assertEqual(documento['tipo_documento'], 'Tipo 2')
+        self.assertEqual(documento['tamaño'], '1.0 KB')
+        self.assertEqual(documento['url_descarga'], f'/documento/{documento["id"]}/descargar/')
+
+    def test_updated_since_y_filtros(self):
+        modificado = Documento.objects.filter(tipo_documento=self.tipos[1]).first()
+        Documento.objects.filter(pk=modificado.pk).update(fecha_modificacion=timezone.now() + timedelta(days=1))
+        desde = (timezone.localtime() + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%S')
+        self.assertEqual([d['id'] for d in self.pagina(updated_since=desde)['documentos']], [modificado.pk])
+
+        # Un documento retirado después de la última sincronización sale con activo: false
+        retirado = Documento.objects.filter(tipo_documento=self.tipos[1]).exclude(pk=modificado.pk).first()
+        Documento.objects.filter(pk=retirado.pk).update(activo=False, fecha_modificacion=timezone.now() + timedelta(days=2))
+        self.assertEqual(
+            [(d['id'], d['activo']) for d in self.pagina(updated_since=desde)['documentos']],
+            [(modificado.pk, True), (retirado.pk, False)]
+        )
+        self.assertNotIn(retirado.pk, [d['id'] for d in self.pagina(limite=1000)['documentos']])
+
+        datos = self.pagina(**{'subarticulo_id': self.subarticulo.id, 'año': self.años[0], 'limite': 100})
+        self.assertEqual(len(datos['documentos']), 7)
+        self.assertIsNone(datos['siguiente'])
+
+    def test_parametros_invalidos(self):
+        for parametros in ({'cursor': 'no-es-un-cursor'}, {'updated_since': 'ayer'}, {'limite': 'x'}):
+            response = self.client.get(self.url, parametros)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+
+
+class ManifiestoDocumentosTest(TestCase):
+    """Manifiesto JSONL con SHA-256 y modo delta"""
+
+    def setUp(self):
+        cache.clear()
+        self.subarticulo, self.tipos, self.años = crear_subarticulo_con_documentos(num_tipos=2, num_años=1)
+        Documento.objects.filter(tipo_documento=self.tipos[0], trimestre='T4').update(activo=False)
+        self.modificado = Documento.objects.filter(tipo_documento=self.tipos[1], trimestre='T2').get()
+        Documento.objects.filter(pk=self.modificado.pk).update(
+            sha256='a' * 64, fecha_modificacion=timezone.now() + timedelta(days=1)
+        )
+        self.url = reverse('publico:api_manifiesto_documentos')
+
+    def lineas(self, response, consultas=1):
+        with self.assertNumQueries(consultas):
+            return [json.loads(linea) for linea in b''.join(response.streaming_content).splitlines()]
+
+    def test_manifiesto_completo_y_delta(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        self.assertIn('X-Manifiesto-Generado', response)
+        lineas = self.lineas(response)
+        self.assertEqual(len(lineas), 7)
+        ultima = lineas[-1]
+        self.assertEqual(ultima['id'], self.modificado.pk)
+        self.assertEqual(ultima['sha256'], 'a' * 64)
+        self.assertEqual(ultima['subarticulo'], {'id': self.subarticulo.id, 'nombre': self.subarticulo.nombre})
+        self.assertEqual((ultima['ley']['id'], ultima['tipo_documento']['nombre']), (self.subarticulo.ley_id, 'Tipo 2'))
+        self.assertEqual((ultima['año'], ultima['trimestre'], ultima['tamaño']), (self.años[0], 'T2', 1024))
+
+        desde = (timezone.now() + timedelta(hours=1)).isoformat()
+        lineas = self.lineas(self.client.get(self.url, {'updated_since': desde}), consultas=2)
+        self.assertEqual([linea['id'] for linea in lineas], [self.modificado.pk])
+        self.assertEqual(self.client.get(self.url, {'updated_since': 'ayer'}).status_code, 400)
+
+    def test_delta_informa_retirados_y_eliminados(self):
+        desde = timezone.now()
+        retirado, eliminado = Documento.objects.filter(tipo_documento=self.tipos[0], activo=True)[:2]
+        # Como al desactivarlo desde el panel (los documentos de prueba no tienen archivo)
+        Documento.objects.filter(pk=retirado.pk).update(activo=False, fecha_modificacion=timezone.now())
+        eliminado_id = eliminado.pk
+        eliminado.delete()
+
+        lineas = self.lineas(self.client.get(self.url, {'updated_since': desde.isoformat()}), consultas=2)
+        self.assertEqual(
+            [(linea['id'], linea['activo'], linea.get('eliminado', False)) for linea in lineas],
+            [(retirado.pk, False, False), (self.modificado.pk, True, False), (eliminado_id, False, True)]
+        )
+        # El manifiesto completo sigue siendo solo lo publicado
+        self.assertTrue(all(linea['activo'] for linea in self.lineas(self.client.get(self.url))))
+
+    def test_comando(self):
+        destino = os.path.join(tempfile.mkdtemp(), 'manifiesto.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(destino))
+        errores = StringIO()
+        call_command('exportar_manifiesto', '--salida', destino, stdout=StringIO(), stderr=errores)
+        with open(destino, encoding='utf-8') as archivo:
+            self.assertEqual(len(archivo.readlines()), 7)
+        self.assertIn('6 documentos sin SHA-256', errores.getvalue())
+
+        salida = StringIO()
+        desde = (timezone.now() + timedelta(hours=1)).isoformat()
+        call_command('exportar_manifiesto', '--desde', desde, stdout=salida, stderr=StringIO())
+        self.assertEqual(json.loads(salida.getvalue())['id'], self.modificado.pk)
+
+
+class PaqueteZipTest(MediaTemporalMixin, TestCase):
+    """ZIP por sub-artículo y año generado al vuelo"""
+
+    ajustes_adicionales = {'ACCESS_LOG_ASYNC': False}
+
+    def setUp(self):
+        cache.clear()
+        ley = Ley.objects.create(nombre='Ley de Paquetes', orden=1)
+        self.subarticulo = SubArticulo.objects.create(ley=ley, nombre='Información Financiera', periodicidad='TRIMESTRAL')
+        self.año = datetime.now().year - 1
+        self.contenidos = {}
+        for orden, nombre in enumerate(['Estado de Actividades', 'Notas: Memoria'], start=1):
+            tipo = TipoDocumento.objects.create(subarticulo=self.subarticulo, nombre=nombre, orden=orden)
+            for trimestre in ['T1', 'T2']:
+                contenido = b'%PDF-1.4\n' + f'{nombre} {trimestre}'.encode() * 5000
+                Documento.objects.create(
+                    tipo_documento=tipo, año=self.año, trimestre=trimestre,
+                    archivo=SimpleUploadedFile('doc.pdf', contenido, content_type='application/pdf')
+                )
+                self.contenidos[f'{nombre} {trimestre}'] = contenido
+        Documento.objects.filter(trimestre='T2', tipo_documento=tipo).update(activo=False)
+        self.url = reverse('publico:paquete_subarticulo', args=[self.subarticulo.id, self.año])
+
+    def test_zip_completo_sin_compresion(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        contenido = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(contenido))
+        self.assertIn('Informaci', response['Content-Disposition'])
+
+        with zipfile.ZipFile(io.BytesIO(contenido)) as paquete:
+            self.assertIsNone(paquete.testzip())
+            carpeta = f'Información Financiera {self.año}'
+            self.assertEqual(paquete.namelist(), [
+                f'{carpeta}/Estado de Actividades/Estado de Actividades {self.año} T1.pdf',
+                f'{carpeta}/Estado de Actividades/Estado de Actividades {self.año} T2.pdf',
+                f'{carpeta}/Notas- Memoria/Notas- Memoria {self.año} T1.pdf',
+            ])
+            self.assertTrue(all(info.compress_type == zipfile.ZIP_STORED for info in paquete.infolist()))
+            self.assertEqual(paquete.read(paquete.namelist()[-1]), self.contenidos['Notas: Memoria T1'])
+
+        self.assertEqual(LogAcceso.objects.filter(tipo_acceso='DESCARGA').count(), 3)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_reanudar_con_rango(self):
+        response = self.client.get(self.url)
+        completo = b''.join(response.streaming_content)
+        # Sin los CRC en caché: se recalculan para el directorio central
+        cache.clear()
+        corte = len(completo) // 2
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={corte}-', HTTP_IF_RANGE=response['ETag'])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(completo[:corte] + b''.join(response.streaming_content), completo)
+        self.assertEqual(response['Content-Range'], f'bytes {corte}-{len(completo) - 1}/{len(completo)}')
+        self.assertEqual(LogAcceso.objects.count(), 3)
+
+        # Otra versión del paquete: If-Range no coincide y se envía completo
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={corte}-', HTTP_IF_RANGE='"viejo"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_head_no_registra_descargas(self):
+        response = self.client.head(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertFalse(LogAcceso.objects.exists())
+
+    def test_año_sin_documentos(self):
+        url = reverse('publico:paquete_subarticulo', args=[self.subarticulo.id, self.año - 5])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class BusquedaTest(MediaTemporalMixin, TestCase):
+    """Búsqueda de texto completo en metadatos y texto de los PDF"""
+
+    PDF = b'%PDF-1.4\n1 0 obj << /Type /Page >> endobj\n%%EOF\n'
+
+    ajustes_adicionales = {'PROCESAMIENTO_QPDF': '', 'PROCESAMIENTO_PDFTOPPM': ''}
+
+    def setUp(self):
+        cache.clear()
+        self.ley = Ley.objects.create(nombre='Ley General de Contabilidad Gubernamental', orden=1)
+        self.subarticulo = SubArticulo.objects.create(
+            ley=self.ley, nombre='Información Contable', periodicidad='TRIMESTRAL'
+        )
+        self.estado = TipoDocumento.objects.create(subarticulo=self.subarticulo, nombre='Estado de Situación Financiera')
+        self.notas = TipoDocumento.objects.create(subarticulo=self.subarticulo, nombre='Notas a los Estados')
+        self.año = datetime.now().year
+        self.balance = self.crear(self.estado, 'T1')
+        self.notas_t1 = self.crear(self.notas, 'T1', descripcion='Notas sobre la situación financiera del periodo')
+
+    def crear(self, tipo, trimestre, **campos):
+        return Documento.objects.create(
+            tipo_documento=tipo, año=self.año, trimestre=trimestre,
+            archivo=SimpleUploadedFile('estado.pdf', self.PDF + trimestre.encode()), **campos
+        )
+
+    def ids(self, consulta, **kwargs):
+        return [documento.id for documento in buscar(consulta, **kwargs)['documentos']]
+
+    def test_metadatos_ordenados_por_relevancia(self):
+        # Sin acentos ni mayúsculas; el título pesa más que la descripción
+        self.assertEqual(self.ids('situacion FINANCIERA'), [self.balance.id, self.notas_t1.id])
+        self.assertCountEqual(self.ids('contabilidad primer trimestre'), [self.balance.id, self.notas_t1.id])
+        self.assertEqual(self.ids('situa'), [self.balance.id, self.notas_t1.id])
+        self.assertEqual(self.ids('presupuesto'), [])
+
+    def test_consultas_sin_terminos_o_con_sintaxis(self):
+        self.assertEqual(buscar('  ')['total'], 0)
+        self.assertEqual(buscar('"* OR (')['documentos'], [])
+        self.assertEqual(self.ids('notas" estado*'), [self.notas_t1.id])
+
+    def test_actualizacion_incremental(self):
+        self.estado.nombre = 'Balance General'
+        self.estado.save()
+        self.assertEqual(self.ids('balance'), [self.balance.id])
+
+        self.notas_t1.titulo_personalizado = 'Notas de desglose'
+        self.notas_t1.save()
+        self.assertEqual(self.ids('desglose'), [self.notas_t1.id])
+
+        self.ley.activa = False
+        self.ley.save()
+        self.assertEqual(self.ids('balance'), [])
+        self.ley.activa = True
+        self.ley.save()
+
+        self.notas_t1.delete()
+        self.assertEqual(self.ids('notas'), [])
+        self.assertFalse(IndiceBusqueda.objects.filter(documento_id=self.notas_t1.pk).exists())
+
+    @override_settings(PROCESAMIENTO_PDFTOTEXT='pdftotext')
+    def test_texto_del_pdf(self):
+        salida = subprocess.CompletedProcess([], 0, stdout='Activo\x0ccirculante:  bancos'.encode(), stderr=b'')
+        with mock.patch.object(procesamiento, '_ejecutar', return_value=salida):
+            procesamiento.procesar_pendientes()
+
+        self.assertEqual(IndiceBusqueda.objects.get(pk=self.balance.pk).contenido, 'Activo circulante: bancos')
+        self.assertCountEqual(self.ids('circulante bancos'), [self.balance.id, self.notas_t1.id])
+
+        # Editar metadatos conserva el texto; un archivo nuevo lo descarta hasta procesarlo
+        self.balance.descripcion = 'Cifras al cierre'
+        self.balance.save()
+        self.assertIn(self.balance.id, self.ids('circulante'))
+        self.balance.archivo = SimpleUploadedFile('nuevo.pdf', self.PDF + b'nuevo')
+        self.balance.save()
+        self.assertEqual(self.ids('circulante'), [self.notas_t1.id])
+
+    @override_settings(PROCESAMIENTO_PDFTOTEXT='pdftotext')
+    def test_resultados_en_cache_cambian_al_procesar(self):
+        url = reverse('publico:api_buscar')
+        response = self.client.get(url, {'q': 'circulante'})
+        self.assertEqual(response.json()['total'], 0)
+
+        salida = subprocess.CompletedProcess([], 0, stdout=b'Activo circulante', stderr=b'')
+        with mock.patch.object(procesamiento, '_ejecutar', return_value=salida), \
+                mock.patch.object(fragmentos, 'incrementar_version', wraps=fragmentos.incrementar_version) as incrementar:
+            with self.captureOnCommitCallbacks() as callbacks:
+                procesamiento.procesar(procesamiento.reclamar_siguiente())
+            # La versión vuelve a subir al confirmar, ya con el texto en el índice
+            incrementar.reset_mock()
+            for callback in callbacks:
+                callback()
+            incrementar.assert_called_once_with()
+
+        response = self.client.get(url, {'q': 'circulante'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], 1)
+
+    @override_settings(BUSQUEDA_POR_PAGINA=1)
+    def test_api_paginada(self):
+        url = reverse('publico:api_buscar')
+        with self.assertNumQueries(2):
+            datos = self.client.get(url, {'q': 'situación financiera', 'pagina': 2}).json()
+        self.assertEqual((datos['total'], datos['pagina'], datos['paginas']), (2, 2, 2))
+        resultado = datos['resultados'][0]
+        self.assertEqual(resultado['id'], self.notas_t1.id)
+        self.assertEqual(resultado['ley'], self.ley.nombre)
+        self.assertEqual(resultado['url_descarga'], f'/documento/{self.notas_t1.id}/descargar/')
+
+        # Página fuera de rango: la primera
+        datos = self.client.get(url, {'q': 'situación financiera', 'pagina': 9}).json()
+        self.assertEqual((datos['pagina'], datos['resultados'][0]['id']), (1, self.balance.id))
+
+        response = self.client.get(reverse('publico:buscar'), {'q': 'notas'})
+        self.assertContains(response, 'Notas a los Estados')
+        self.assertContains(response, '1 resultado ')
+
+    def test_reconstruir_tras_carga_masiva(self):
+        Documento.objects.bulk_create([Documento(
+            tipo_documento=self.estado, año=self.año, trimestre='T2', archivo='documentos/t2.pdf'
+        )])
+        self.assertEqual(len(self.ids('estado situacion')), 2)
+        call_command('reconstruir_busqueda', stdout=StringIO())
+        self.assertEqual(len(self.ids('estado situacion')), 3)
+
+
+@override_settings(ACCESS_LOG_ASYNC=True, ACCESS_LOG_BATCH_SIZE=10, ACCESS_LOG_FLUSH_INTERVAL_MS=50)
+class EscritorLogAccesoTest(TransactionTestCase):
+    """Registro de accesos en lotes desde un hilo en segundo plano"""
+
+    def setUp(self):
+        _, tipos, años = crear_subarticulo_con_documentos('ANUAL', num_tipos=1, num_años=1)
+        self.documento = Documento.objects.get(tipo_documento=tipos[0])
+        self.escritor = EscritorLogAcceso()
+
+    def tearDown(self):
+        self.escritor.detener()
+
+    def registrar(self, cantidad):
+        for _ in range(cantidad):
+            self.escritor.registrar(
+                documento=self.documento,
+                ip_address='127.0.0.1',
+                user_agent='pruebas',
+                tipo_acceso='VISUALIZACION'
+            )
+
+    def test_escribe_en_lotes_y_al_detener(self):
+        self.registrar(25)
+        self.escritor.detener()
+
+        self.assertEqual(LogAcceso.objects.count(), 25)
+        estadisticas = self.escritor.estadisticas()
+        self.assertEqual(estadisticas['encolados'], 25)
+        self.assertEqual(estadisticas['escritos'], 25)
+        self.assertEqual(estadisticas['pendientes'], 0)
+
+    def test_escribe_al_vencer_el_intervalo(self):
+        self.registrar(3)
+        for _ in range(100):
+            if self.escritor.estadisticas()['escritos'] == 3:
+                break
+            time.sleep(0.02)
+        self.assertEqual(self.escritor.estadisticas()['escritos'], 3)
+        self.assertEqual(LogAcceso.objects.count(), 3)
+
+    def test_la_fecha_es_la_de_la_peticion(self):
+        with mock.patch.object(EscritorLogAcceso, '_tomar_lote', lambda escritor: time.sleep(0.01) or []):
+            self.registrar(1)
+            self.escritor.registrar_varios([{
+                'documento': self.documento, 'ip_address': '127.0.0.1', 'tipo_acceso': 'DESCARGA'
+            }])
+            encolado = timezone.now()
+            time.sleep(0.05)
+        self.escritor.detener()
+
+        self.assertEqual(LogAcceso.objects.count(), 2)
+        self.assertFalse(LogAcceso.objects.filter(fecha_acceso__gt=encolado).exists())
+
+    @override_settings(ACCESS_LOG_QUEUE_SIZE=5, ACCESS_LOG_OVERFLOW='drop')
+    def test_descarta_si_la_cola_esta_llena(self):
+        # El hilo no consume la cola mientras dura el parche
+        with mock.patch.object(EscritorLogAcceso, '_tomar_lote', lambda escritor: time.sleep(0.01) or []):
+            self.registrar(8)
+            estadisticas = self.escritor.estadisticas()
+
+        self.assertEqual(estadisticas['encolados'], 5)
+        self.assertEqual(estadisticas['descartados'], 3)
+        self.assertEqual(estadisticas['pendientes'], 5)
@@ -1,5 +1,14 @@
+from django.conf import settings
 from django.urls import path
 from . import views
+from .cache_http import cache_publico
+
+# Con un servidor ASGI las APIs de contenido y la entrega de PDF usan las
+# versiones asíncronas (un cliente lento no ocupa un hilo del servidor)
+if getattr(settings, 'PUBLICO_ASYNC_VIEWS', False):
+    from . import views_async as vistas_contenido
+else:
+    vistas_contenido = views
 
 app_name = 'publico'
 
@@ -8,14 +17,27 @@ urlpatterns = [
     path('', views.HomeView.as_view(), name='home'),
     
     # Navegación por leyes (mantener para URLs directas)
-    path('ley/<int:ley_id>/', views.LeyDetailView.as_view(), name='ley_detail'),
-    path('subarticulo/<int:subarticulo_id>/', views.SubArticuloDetailView.as_view(), name='subarticulo_detail'),
+    # cache_publico: ETag por versión de contenido y Cache-Control para nginx
+    path('ley/<int:ley_id>/', cache_publico(views.LeyDetailView.as_view()), name='ley_detail'),
+    path('subarticulo/<int:subarticulo_id>/', cache_publico(views.SubArticuloDetailView.as_view()), name='subarticulo_detail'),
     
     # Nuevas APIs para navegación dinámica
-    path('api/ley/<int:ley_id>/content/', views.LeyContentAPIView.as_view(), name='api_ley_content'),
-    path('api/subarticulo/<int:subarticulo_id>/content/', views.SubArticuloContentAPIView.as_view(), name='api_subarticulo_content'),
+    path('api/leyes-subarticulos/', views.ArbolNavegacionAPIView.as_view(), name='api_leyes_subarticulos'),
+    path('api/ley/<int:ley_id>/content/', cache_publico(vistas_contenido.LeyContentAPIView.as_view()), name='api_ley_content'),
+    path('api/subarticulo/<int:subarticulo_id>/content/', cache_publico(vistas_contenido.SubArticuloContentAPIView.as_view()), name='api_subarticulo_content'),
+    
+    # Feed de documentos para espejos y agregadores (paginado por cursor)
+    path('api/documentos/', cache_publico(views.DocumentosAPIView.as_view()), name='api_documentos'),
+    path('api/documentos/manifiesto/', cache_publico(views.ManifiestoDocumentosView.as_view()),
+         name='api_manifiesto_documentos'),
+    
+    # Búsqueda de texto completo
+    path('buscar/', cache_publico(views.BusquedaView.as_view()), name='buscar'),
+    path('api/buscar/', cache_publico(views.BusquedaAPIView.as_view()), name='api_buscar'),
     
     # Descarga y visualización de documentos
-    path('documento/<int:documento_id>/descargar/', views.DescargarDocumentoView.as_view(), name='descargar_documento'),
-    path('documento/<int:documento_id>/ver/', views.VisualizarDocumentoView.as_view(), name='visualizar_documento'),
+    path('documento/<int:documento_id>/descargar/', vistas_contenido.DescargarDocumentoView.as_view(), name='descargar_documento'),
+    path('documento/<int:documento_id>/ver/', vistas_contenido.VisualizarDocumentoView.as_view(), name='visualizar_documento'),
+    path('subarticulo/<int:subarticulo_id>/<int:año>/documentos.zip', views.PaqueteSubArticuloView.as_view(),
+         name='paquete_subarticulo'),
 ]
\ No newline at end of file
@@ -1,9 +1,21 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import TemplateView, DetailView, View
-from django.http import JsonResponse, HttpResponse, Http404
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date
 from django.contrib import messages
+from django.db.models import Count
 from django.template.loader import render_to_string
-from apps.administracion.models import Ley, SubArticulo, TipoDocumento, Documento, LogAcceso
+from apps.administracion.models import Ley, SubArticulo, TipoDocumento, Documento, DisponibilidadAnual
+from .services import agrupar_documentos, TRIMESTRES
+from . import cache as fragmentos
+from .descargas import servir_documento, es_rango_continuacion, parsear_rango
+from .accesos import registrar_acceso, registrar_accesos
+from .paquetes import PaqueteDemasiadoGrande, paquete_de
+from .navegacion import obtener_arbol
+from .busqueda import buscar
+from . import feed, manifiesto_documentos
 from datetime import datetime
 import os
 
@@ -12,21 +24,8 @@ class HomeView(View):
     """Vista principal que redirige a subarticulo/1/ con el año más reciente con documentos"""
     
     def get(self, request):
-        año_actual = datetime.now().year
-        
-        # Buscar el año más reciente con documentos disponibles
-        años_con_documentos = Documento.objects.filter(
-            activo=True
-        ).values_list('año', flat=True).distinct().order_by('-año')
-        
-        # Si hay documentos para el año actual, usarlo; si no, usar el más reciente
-        if año_actual in años_con_documentos:
-            año_seleccionado = año_actual
-        elif años_con_documentos.exists():
-            año_seleccionado = años_con_documentos.first()
-        else:
-            # Si no hay documentos, usar el año actual por defecto
-            año_seleccionado = año_actual
+        # El año actual si tiene documentos; si no, el más reciente que tenga
+        año_seleccionado = DisponibilidadAnual.año_preferido(None, datetime.now().year)
         
         return redirect(f'/subarticulo/1/?año={año_seleccionado}')
 
@@ -60,99 +59,37 @@ class SubArticuloDetailView(DetailView):
     def get(self, request, *args, **kwargs):
         # Si no hay parámetro de año, redirigir al año más reciente con documentos
         if 'año' not in request.GET:
-            año_actual = datetime.now().year
-            
-            # Obtener el subarticulo para filtrar documentos específicos
-            subarticulo_id = kwargs.get('subarticulo_id')
-            
-            # Buscar años con documentos para este subarticulo
-            años_con_documentos = Documento.objects.filter(
-                tipo_documento__subarticulo_id=subarticulo_id,
-                activo=True
-            ).values_list('año', flat=True).distinct().order_by('-año')
-            
-            # Si hay documentos para el año actual, usarlo; si no, usar el más reciente
-            if año_actual in años_con_documentos:
-                año_seleccionado = año_actual
-            elif años_con_documentos.exists():
-                año_seleccionado = años_con_documentos.first()
-            else:
-                # Si no hay documentos, usar el año actual por defecto
-                año_seleccionado = año_actual
-            
+            # El año actual si tiene documentos; si no, el más reciente que tenga
+            año_seleccionado = DisponibilidadAnual.año_preferido(
+                kwargs.get('subarticulo_id'), datetime.now().year
+            )
             return redirect(f'{request.path}?año={año_seleccionado}')
         return super().get(request, *args, **kwargs)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['leyes'] = Ley.objects.filter(activa=True).order_by('orden')
         
         # Obtener tipos de documento del sub-artículo
         tipos_documento = self.object.tipos_documento.filter(activo=True).order_by('orden')
         
         # Obtener años disponibles (solo los últimos 6 años desde el año actual)
         año_actual = datetime.now().year
-        año_minimo = año_actual - 6  # 6 años atrás desde el año actual
+        años_disponibles = DisponibilidadAnual.años(self.object.id, desde=año_actual - 6, hasta=año_actual)
         
-        años_disponibles = Documento.objects.filter(
-            tipo_documento__subarticulo=self.object,
-            activo=True,
-            año__gte=año_minimo,  # Mayor o igual al año mínimo
-            año__lte=año_actual   # Menor o igual al año actual
-        ).values_list('año', flat=True).distinct().order_by('año')
-        
-        # Agrupar documentos por año y tipo
-        documentos_agrupados = {}
-        for año in años_disponibles:
-            documentos_agrupados[año] = {}
-            
-            for tipo_doc in tipos_documento:
-                if self.object.periodicidad == 'ANUAL':
-                    # Para documentos anuales
-                    documento = Documento.objects.filter(
-                        tipo_documento=tipo_doc,
-                        año=año,
-                        activo=True
-                    ).first()
-                    documentos_agrupados[año][tipo_doc] = {
-                        'ANUAL': documento
-                    }
-                else:
-                    # Para documentos trimestrales
-                    trimestres = ['T1', 'T2', 'T3', 'T4']
-                    documentos_agrupados[año][tipo_doc] = {}
-                    
-                    for trimestre in trimestres:
-                        documento = Documento.objects.filter(
-                            tipo_documento=tipo_doc,
-                            año=año,
-                            trimestre=trimestre,
-                            activo=True
-                        ).first()
-                        documentos_agrupados[año][tipo_doc][trimestre] = documento
+        # Agrupar documentos por año y tipo (una sola consulta)
+        documentos_agrupados = agrupar_documentos(self.object, tipos_documento, años_disponibles)
         
         context['tipos_documento'] = tipos_documento
         context['años_disponibles'] = años_disponibles
         context['documentos_agrupados'] = documentos_agrupados
-        context['trimestres'] = ['T1', 'T2', 'T3', 'T4']
+        context['trimestres'] = TRIMESTRES
         context['current_year'] = datetime.now().year
         
-        # Obtener fecha de última actualización para el año seleccionado
+        # Fecha de última actualización por año y para el año seleccionado
         año_seleccionado = int(self.request.GET.get('año', datetime.now().year))
-        documentos_año = Documento.objects.filter(
-            tipo_documento__subarticulo=self.object,
-            año=año_seleccionado,
-            activo=True
-        )
-        
-        # Obtener la fecha más reciente entre subida y modificación
-        ultima_fecha = None
-        for doc in documentos_año:
-            fecha_mas_reciente = max(doc.fecha_subida, doc.fecha_modificacion)
-            if not ultima_fecha or fecha_mas_reciente > ultima_fecha:
-                ultima_fecha = fecha_mas_reciente
-        
-        context['ultima_actualizacion'] = ultima_fecha
+        ultimas = DisponibilidadAnual.ultimas_actualizaciones(self.object.id, [*años_disponibles, año_seleccionado])
+        context['ultimas_actualizaciones'] = ultimas
+        context['ultima_actualizacion'] = ultimas.get(año_seleccionado)
         
         return context
 
@@ -168,16 +105,14 @@ class DescargarDocumentoView(View):
             messages.error(request, 'El archivo solicitado no está disponible.')
             raise Http404("Archivo no encontrado")
         
-        # Registrar el acceso
-        self._registrar_acceso(request, documento, 'DESCARGA')
+        # Registrar el acceso (las peticiones de rangos intermedios son del mismo acceso)
+        if not es_rango_continuacion(request):
+            self._registrar_acceso(request, documento, 'DESCARGA')
         
-        # Servir el archivo
+        # Servir el archivo en streaming, con soporte de Range y 304
         try:
-            with open(documento.archivo.path, 'rb') as pdf_file:
-                response = HttpResponse(pdf_file.read(), content_type='application/pdf')
-                response['Content-Disposition'] = f'attachment; filename="{documento.get_nombre_archivo()}"'
-                return response
-        except Exception as e:
+            return servir_documento(request, documento, as_attachment=True)
+        except OSError:
             messages.error(request, 'Error al descargar el archivo.')
             raise Http404("Error al acceder al archivo")
     
@@ -186,12 +121,8 @@ class DescargarDocumentoView(View):
         ip_address = self._get_client_ip(request)
         user_agent = request.META.get('HTTP_USER_AGENT', '')
         
-        LogAcceso.objects.create(
-            documento=documento,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            tipo_acceso=tipo_acceso
-        )
+        # Se encola y se escribe en lote fuera de la petición
+        registrar_acceso(documento, ip_address, user_agent, tipo_acceso)
     
     def _get_client_ip(self, request):
         """Obtiene la IP del cliente"""
@@ -214,16 +145,14 @@ class VisualizarDocumentoView(View):
             messages.error(request, 'El archivo solicitado no está disponible.')
             raise Http404("Archivo no encontrado")
         
-        # Registrar el acceso
-        self._registrar_acceso(request, documento, 'VISUALIZACION')
+        # Registrar el acceso (las peticiones de rangos intermedios son del mismo acceso)
+        if not es_rango_continuacion(request):
+            self._registrar_acceso(request, documento, 'VISUALIZACION')
         
-        # Servir el archivo para visualización
+        # Servir el archivo para visualización en streaming, con soporte de Range y 304
         try:
-            with open(documento.archivo.path, 'rb') as pdf_file:
-                response = HttpResponse(pdf_file.read(), content_type='application/pdf')
-                response['Content-Disposition'] = f'inline; filename="{documento.get_nombre_archivo()}"'
-                return response
-        except Exception as e:
+            return servir_documento(request, documento, as_attachment=False)
+        except OSError:
             messages.error(request, 'Error al visualizar el archivo.')
             raise Http404("Error al acceder al archivo")
     
@@ -232,12 +161,8 @@ class VisualizarDocumentoView(View):
         ip_address = self._get_client_ip(request)
         user_agent = request.META.get('HTTP_USER_AGENT', '')
         
-        LogAcceso.objects.create(
-            documento=documento,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            tipo_acceso=tipo_acceso
-        )
+        # Se encola y se escribe en lote fuera de la petición
+        registrar_acceso(documento, ip_address, user_agent, tipo_acceso)
     
     def _get_client_ip(self, request):
         """Obtiene la IP del cliente"""
@@ -249,40 +174,110 @@ class VisualizarDocumentoView(View):
         return ip
 
 
-class DocumentosAPIView(View):
-    """API para obtener documentos de forma dinámica (para filtros AJAX)"""
+class PaqueteSubArticuloView(View):
+    """ZIP con todos los documentos de un sub-artículo en un año (ver paquetes.py)"""
     
-    def get(self, request):
-        ley_id = request.GET.get('ley_id')
-        subarticulo_id = request.GET.get('subarticulo_id')
-        año = request.GET.get('año')
+    def get(self, request, subarticulo_id, año):
+        subarticulo = get_object_or_404(SubArticulo, id=subarticulo_id, activo=True)
+        try:
+            paquete = paquete_de(subarticulo, año)
+        except PaqueteDemasiadoGrande as e:
+            return HttpResponse(f'{e} Descargue los documentos por separado.', status=413)
+        if paquete is None:
+            raise Http404("No hay documentos para este año")
         
-        documentos = Documento.objects.filter(activo=True)
+        last_modified = int(paquete.ultima_modificacion.timestamp())
+        response = get_conditional_response(request, etag=paquete.etag, last_modified=last_modified)
+        if response is not None:
+            return response
         
-        if ley_id:
-            documentos = documentos.filter(tipo_documento__subarticulo__ley_id=ley_id)
+        rango = parsear_rango(request, paquete.tamaño, paquete.etag)
+        if rango is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{paquete.tamaño}'
+            return response
         
-        if subarticulo_id:
-            documentos = documentos.filter(tipo_documento__subarticulo_id=subarticulo_id)
+        # Un acceso por documento del paquete; reanudar la descarga o consultar
+        # solo las cabeceras (HEAD) no cuenta de nuevo
+        if request.method != 'HEAD' and not es_rango_continuacion(request):
+            registrar_accesos(
+                [entrada.documento for entrada in paquete.entradas],
+                self._get_client_ip(request),
+                request.META.get('HTTP_USER_AGENT', ''),
+                'DESCARGA'
+            )
         
-        if año:
-            documentos = documentos.filter(año=año)
+        inicio, fin = rango if rango else (0, paquete.tamaño - 1)
+        response = StreamingHttpResponse(
+            paquete.leer(inicio, fin), content_type='application/zip', status=206 if rango else 200
+        )
+        response['Content-Length'] = str(fin - inicio + 1)
+        if rango:
+            response['Content-Range'] = f'bytes {inicio}-{fin}/{paquete.tamaño}'
+        response['Content-Disposition'] = content_disposition_header(True, paquete.nombre)
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = paquete.etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+    
+    def _get_client_ip(self, request):
+        """Obtiene la IP del cliente"""
+        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if x_forwarded_for:
+            return x_forwarded_for.split(',')[0]
+        return request.META.get('REMOTE_ADDR')
+
+
+class DocumentosAPIView(View):
+    """
+    Feed de documentos publicados paginado por cursor (ver feed.py). Filtros:
+    ley_id, subarticulo_id, año y updated_since; `cursor` es el valor de
+    `siguiente` de la página anterior.
+    """
+    
+    def get(self, request):
+        try:
+            filas, limite = feed.consultar(request.GET)
+        except feed.ErrorFeed as error:
+            return JsonResponse({'error': str(error)}, status=400)
         
-        # Formatear respuesta
-        data = []
-        for doc in documentos:
-            data.append({
-                'id': doc.id,
-                'tipo_documento': doc.tipo_documento.nombre,
-                'año': doc.año,
-                'trimestre': doc.trimestre,
-                'titulo': doc.titulo_personalizado or doc.tipo_documento.nombre,
-                'url_descarga': f'/documento/{doc.id}/descargar/',
-                'tamaño': doc.get_tamaño_legible(),
-                'fecha_subida': doc.fecha_subida.strftime('%d/%m/%Y')
-            })
+        # Una página grande se envía fila a fila, sin construir la lista en memoria
+        return StreamingHttpResponse(feed.generar(filas, limite), content_type='application/json')
+
+
+class ManifiestoDocumentosView(View):
+    """Manifiesto JSONL de los documentos publicados; ?updated_since= para el modo delta"""
+    
+    def get(self, request):
+        desde = None
+        if request.GET.get('updated_since'):
+            try:
+                desde = feed.parsear_fecha(request.GET['updated_since'])
+            except feed.ErrorFeed as error:
+                return JsonResponse({'error': str(error)}, status=400)
         
-        return JsonResponse({'documentos': data})
+        # La hora de inicio es el updated_since de la siguiente sincronización
+        generado = timezone.now()
+        response = StreamingHttpResponse(
+            manifiesto_documentos.generar(desde), content_type='application/x-ndjson; charset=utf-8'
+        )
+        response['X-Manifiesto-Generado'] = generado.isoformat()
+        return response
+
+
+class ArbolNavegacionAPIView(View):
+    """API con el árbol Ley → SubArticulo del menú lateral (JSON en memoria con ETag)"""
+    
+    def get(self, request):
+        arbol = obtener_arbol()
+        
+        response = get_conditional_response(request, etag=arbol.etag)
+        if response is None:
+            response = HttpResponse(arbol.json, content_type='application/json')
+        response['ETag'] = arbol.etag
+        # El navegador revalida en cada carga y recibe 304 mientras no cambie
+        patch_cache_control(response, no_cache=True)
+        return response
 
 
 # ⚠️ CORRECCIÓN: Estas clases deben estar al mismo nivel, no dentro de DocumentosAPIView
@@ -290,9 +285,16 @@ class LeyContentAPIView(View):
     """API para cargar contenido de una ley específica"""
     
     def get(self, request, ley_id):
+        # Respuesta en caché: no toca la base de datos
+        datos = fragmentos.obtener_fragmento('ley', ley_id)
+        if datos is not None:
+            return JsonResponse(datos)
+        
         try:
             ley = get_object_or_404(Ley, id=ley_id, activa=True)
-            subarticulos = ley.subarticulos.filter(activo=True).order_by('orden')
+            subarticulos = ley.subarticulos.filter(activo=True).annotate(
+                num_tipos_documento=Count('tipos_documento')
+            ).order_by('orden')
             
             # Renderizar template parcial
             html_content = render_to_string('publico/partials/ley_content.html', {
@@ -300,7 +302,7 @@ class LeyContentAPIView(View):
                 'subarticulos': subarticulos
             }, request=request)
             
-            return JsonResponse({
+            datos = {
                 'success': True,
                 'title': ley.nombre,
                 'content': html_content,
@@ -308,7 +310,10 @@ class LeyContentAPIView(View):
                     'ley': ley.nombre,
                     'subarticulo': None
                 }
-            })
+            }
+            fragmentos.guardar_fragmento('ley', ley_id, datos)
+            
+            return JsonResponse(datos)
             
         except Exception as e:
             return JsonResponse({
@@ -321,6 +326,12 @@ class SubArticuloContentAPIView(View):
     """API para cargar contenido de un sub-artículo específico"""
     
     def get(self, request, subarticulo_id):
+        # Respuesta en caché: no toca la base de datos
+        año_filtro = request.GET.get('año')
+        datos = fragmentos.obtener_fragmento('subarticulo', subarticulo_id, año_filtro)
+        if datos is not None:
+            return JsonResponse(datos)
+        
         try:
             subarticulo = get_object_or_404(SubArticulo, id=subarticulo_id, activo=True)
             
@@ -329,60 +340,14 @@ class SubArticuloContentAPIView(View):
             
             # Obtener años disponibles (solo los últimos 6 años desde el año actual)
             año_actual = datetime.now().year
-            año_minimo = año_actual - 6  # 6 años atrás desde el año actual
-            
-            años_disponibles = Documento.objects.filter(
-                tipo_documento__subarticulo=subarticulo,
-                activo=True,
-                año__gte=año_minimo,  # Mayor o igual al año mínimo
-                año__lte=año_actual   # Menor o igual al año actual
-            ).values_list('año', flat=True).distinct().order_by('año')
+            años_disponibles = DisponibilidadAnual.años(subarticulo.id, desde=año_actual - 6, hasta=año_actual)
             
-            # Filtro por año si se especifica
-            año_filtro = request.GET.get('año')
-            
-            # Agrupar documentos por año y tipo
-            documentos_agrupados = {}
+            # Agrupar documentos por año y tipo (una sola consulta)
             años_a_mostrar = [int(año_filtro)] if año_filtro else años_disponibles
-            
-            for año in años_a_mostrar:
-                documentos_agrupados[año] = {}
-                
-                for tipo_doc in tipos_documento:
-                    if subarticulo.periodicidad == 'ANUAL':
-                        documento = Documento.objects.filter(
-                            tipo_documento=tipo_doc,
-                            año=año,
-                            activo=True
-                        ).first()
-                        documentos_agrupados[año][tipo_doc] = {
-                            'ANUAL': documento
-                        }
-                    else:
-                        trimestres = ['T1', 'T2', 'T3', 'T4']
-                        documentos_agrupados[año][tipo_doc] = {}
-                        
-                        for trimestre in trimestres:
-                            documento = Documento.objects.filter(
-                                tipo_documento=tipo_doc,
-                                año=año,
-                                trimestre=trimestre,
-                                activo=True
-                            ).first()
-                            documentos_agrupados[año][tipo_doc][trimestre] = documento
+            documentos_agrupados = agrupar_documentos(subarticulo, tipos_documento, años_a_mostrar)
             
             # Obtener fecha de última actualización
-            ultima_fecha = None
-            for año in años_a_mostrar:
-                documentos_año = Documento.objects.filter(
-                    tipo_documento__subarticulo=subarticulo,
-                    año=año,
-                    activo=True
-                )
-                for doc in documentos_año:
-                    fecha_mas_reciente = max(doc.fecha_subida, doc.fecha_modificacion)
-                    if not ultima_fecha or fecha_mas_reciente > ultima_fecha:
-                        ultima_fecha = fecha_mas_reciente
+            ultima_fecha = DisponibilidadAnual.ultima_actualizacion_de(subarticulo.id, años_a_mostrar)
             
             # Renderizar template parcial
             html_content = render_to_string('publico/partials/subarticulo_content.html', {
@@ -390,12 +355,12 @@ class SubArticuloContentAPIView(View):
                 'tipos_documento': tipos_documento,
                 'años_disponibles': años_disponibles,
                 'documentos_agrupados': documentos_agrupados,
-                'trimestres': ['T1', 'T2', 'T3', 'T4'],
+                'trimestres': TRIMESTRES,
                 'año_actual': año_filtro,
                 'ultima_actualizacion': ultima_fecha
             }, request=request)
             
-            return JsonResponse({
+            datos = {
                 'success': True,
                 'title': subarticulo.nombre,
                 'content': html_content,
@@ -403,10 +368,65 @@ class SubArticuloContentAPIView(View):
                     'ley': subarticulo.ley.nombre,
                     'subarticulo': subarticulo.nombre
                 }
-            })
+            }
+            fragmentos.guardar_fragmento('subarticulo', subarticulo_id, datos, año_filtro)
+            
+            return JsonResponse(datos)
             
         except Exception as e:
             return JsonResponse({
                 'success': False,
                 'error': str(e)
-            }, status=500)
\ No newline at end of file
+            }, status=500)
+
+
+def _parametros_busqueda(request):
+    try:
+        pagina = int(request.GET.get('pagina', 1))
+    except ValueError:
+        pagina = 1
+    return request.GET.get('q', ''), pagina
+
+
+class BusquedaView(TemplateView):
+    """Página de resultados de la búsqueda de texto completo"""
+    template_name = 'publico/buscar.html'
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        consulta, pagina = _parametros_busqueda(self.request)
+        context['busqueda'] = buscar(consulta, pagina)
+        return context
+
+
+class BusquedaAPIView(View):
+    """API de búsqueda: documentos publicados ordenados por relevancia"""
+    
+    def get(self, request):
+        consulta, pagina = _parametros_busqueda(request)
+        busqueda = buscar(consulta, pagina)
+        
+        resultados = []
+        for doc in busqueda['documentos']:
+            resultados.append({
+                'id': doc.id,
+                'titulo': doc.titulo_personalizado or doc.tipo_documento.nombre,
+                'tipo_documento': doc.tipo_documento.nombre,
+                'subarticulo': doc.tipo_documento.subarticulo.nombre,
+                'ley': doc.tipo_documento.subarticulo.ley.nombre,
+                'año': doc.año,
+                'trimestre': doc.trimestre,
+                'num_paginas': doc.num_paginas,
+                'tamaño': doc.get_tamaño_legible(),
+                'url_ver': f'/documento/{doc.id}/ver/',
+                'url_descarga': f'/documento/{doc.id}/descargar/',
+                'rango': round(doc.rango, 4),
+            })
+        
+        return JsonResponse({
+            'consulta': busqueda['consulta'],
+            'total': busqueda['total'],
+            'pagina': busqueda['pagina'],
+            'paginas': busqueda['paginas'],
+            'resultados': resultados,
+        })
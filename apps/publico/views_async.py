@@ -0,0 +1,186 @@
+"""
+Versiones asíncronas de las APIs de contenido y de la entrega de documentos.
+Se usan cuando PUBLICO_ASYNC_VIEWS está activo (servidor ASGI, ver urls.py):
+las consultas usan el ORM asíncrono y los PDF se envían con un generador
+asíncrono, de modo que una descarga lenta ocupa una corrutina y no un hilo.
+"""
+import os
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.db.models import Count
+from django.http import JsonResponse, Http404
+from django.template.loader import render_to_string
+from django.views.generic import View
+
+from apps.administracion.models import Ley, SubArticulo, Documento, DisponibilidadAnual
+from .services import aagrupar_documentos, TRIMESTRES
+from . import cache as fragmentos
+from .descargas import aservir_documento, es_rango_continuacion
+from .accesos import aregistrar_acceso
+
+
+async def aobtener_o_404(queryset, **filtros):
+    """Equivalente asíncrono de get_object_or_404"""
+    try:
+        return await queryset.aget(**filtros)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No existe {queryset.model._meta.verbose_name}')
+
+
+class LeyContentAPIView(View):
+    """API para cargar contenido de una ley específica"""
+
+    async def get(self, request, ley_id):
+        # Respuesta en caché: no toca la base de datos
+        datos = await fragmentos.aobtener_fragmento('ley', ley_id)
+        if datos is not None:
+            return JsonResponse(datos)
+
+        try:
+            ley = await aobtener_o_404(Ley.objects.all(), id=ley_id, activa=True)
+            subarticulos = [
+                subarticulo async for subarticulo in ley.subarticulos.filter(activo=True).annotate(
+                    num_tipos_documento=Count('tipos_documento')
+                ).order_by('orden')
+            ]
+
+            # Plantilla y procesadores de contexto son síncronos: fuera del bucle de eventos
+            html_content = await sync_to_async(render_to_string)('publico/partials/ley_content.html', {
+                'ley': ley,
+                'subarticulos': subarticulos
+            }, request=request)
+
+            datos = {
+                'success': True,
+                'title': ley.nombre,
+                'content': html_content,
+                'breadcrumb': {
+                    'ley': ley.nombre,
+                    'subarticulo': None
+                }
+            }
+            await fragmentos.aguardar_fragmento('ley', ley_id, datos)
+
+            return JsonResponse(datos)
+
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=500)
+
+
+class SubArticuloContentAPIView(View):
+    """API para cargar contenido de un sub-artículo específico"""
+
+    async def get(self, request, subarticulo_id):
+        # Respuesta en caché: no toca la base de datos
+        año_filtro = request.GET.get('año')
+        datos = await fragmentos.aobtener_fragmento('subarticulo', subarticulo_id, año_filtro)
+        if datos is not None:
+            return JsonResponse(datos)
+
+        try:
+            subarticulo = await aobtener_o_404(
+                SubArticulo.objects.select_related('ley'), id=subarticulo_id, activo=True
+            )
+
+            tipos_documento = [
+                tipo async for tipo in subarticulo.tipos_documento.filter(activo=True).order_by('orden')
+            ]
+
+            # Obtener años disponibles (solo los últimos 6 años desde el año actual)
+            año_actual = datetime.now().year
+            años_disponibles = await sync_to_async(DisponibilidadAnual.años)(
+                subarticulo.id, desde=año_actual - 6, hasta=año_actual
+            )
+
+            años_a_mostrar = [int(año_filtro)] if año_filtro else años_disponibles
+            documentos_agrupados = await aagrupar_documentos(subarticulo, tipos_documento, años_a_mostrar)
+
+            # Fecha más reciente entre subida y modificación de los años mostrados
+            ultima_fecha = await sync_to_async(DisponibilidadAnual.ultima_actualizacion_de)(
+                subarticulo.id, años_a_mostrar
+            )
+
+            html_content = await sync_to_async(render_to_string)('publico/partials/subarticulo_content.html', {
+                'subarticulo': subarticulo,
+                'tipos_documento': tipos_documento,
+                'años_disponibles': años_disponibles,
+                'documentos_agrupados': documentos_agrupados,
+                'trimestres': TRIMESTRES,
+                'año_actual': año_filtro,
+                'ultima_actualizacion': ultima_fecha
+            }, request=request)
+
+            datos = {
+                'success': True,
+                'title': subarticulo.nombre,
+                'content': html_content,
+                'breadcrumb': {
+                    'ley': subarticulo.ley.nombre,
+                    'subarticulo': subarticulo.nombre
+                }
+            }
+            await fragmentos.aguardar_fragmento('subarticulo', subarticulo_id, datos, año_filtro)
+
+            return JsonResponse(datos)
+
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=500)
+
+
+class EntregaDocumentoView(View):
+    """Base asíncrona de la descarga y la visualización de documentos PDF"""
+    tipo_acceso = None
+    as_attachment = None
+    mensaje_error = None
+
+    async def get(self, request, documento_id):
+        documento = await aobtener_o_404(Documento.objects.all(), id=documento_id, activo=True)
+
+        # Verificar que el archivo existe
+        if not documento.archivo or not await sync_to_async(os.path.exists)(documento.archivo.path):
+            messages.error(request, 'El archivo solicitado no está disponible.')
+            raise Http404("Archivo no encontrado")
+
+        # Registrar el acceso (las peticiones de rangos intermedios son del mismo acceso)
+        if not es_rango_continuacion(request):
+            await aregistrar_acceso(
+                documento, self._get_client_ip(request),
+                request.META.get('HTTP_USER_AGENT', ''), self.tipo_acceso
+            )
+
+        try:
+            return await aservir_documento(request, documento, as_attachment=self.as_attachment)
+        except OSError:
+            messages.error(request, self.mensaje_error)
+            raise Http404("Error al acceder al archivo")
+
+    def _get_client_ip(self, request):
+        """Obtiene la IP del cliente"""
+        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if x_forwarded_for:
+            ip = x_forwarded_for.split(',')[0]
+        else:
+            ip = request.META.get('REMOTE_ADDR')
+        return ip
+
+
+class DescargarDocumentoView(EntregaDocumentoView):
+    """Vista asíncrona para descargar documentos PDF"""
+    tipo_acceso = 'DESCARGA'
+    as_attachment = True
+    mensaje_error = 'Error al descargar el archivo.'
+
+
+class VisualizarDocumentoView(EntregaDocumentoView):
+    """Vista asíncrona para visualizar documentos PDF en el navegador"""
+    tipo_acceso = 'VISUALIZACION'
+    as_attachment = False
+    mensaje_error = 'Error al visualizar el archivo.'
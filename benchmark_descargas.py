@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Prueba de carga de descargas concurrentes con clientes lentos.
+
+Abre N conexiones que descargan el mismo PDF leyendo a velocidad limitada y,
+mientras están en curso, mide la latencia de peticiones cortas de prueba
+(por defecto la API de contenido de una ley). Con gunicorn en modo wsgi cada
+descarga ocupa un hilo: cuando se agotan workers × threads las peticiones de
+prueba esperan. En modo asgi (PUBLICO_ASYNC_VIEWS) las descargas son
+corrutinas y la latencia de prueba debe mantenerse.
+
+Uso (contra cada modo, con la misma configuración de workers):
+    SERVER_MODE=wsgi docker compose up -d   →  python benchmark_descargas.py --documento 1
+    SERVER_MODE=asgi docker compose up -d   →  python benchmark_descargas.py --documento 1
+
+Solo usa la biblioteca estándar; no requiere Django.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def peticion(url, velocidad=None, bloque=16 * 1024):
+    """
+    GET HTTP/1.1 sobre una conexión nueva. Devuelve (estado, bytes, ttfb, total).
+    Si se indica velocidad (bytes/s) el cuerpo se lee como un cliente lento.
+    """
+    partes = urlsplit(url)
+    puerto = partes.port or (443 if partes.scheme == 'https' else 80)
+    ruta = partes.path + (f'?{partes.query}' if partes.query else '')
+    inicio = time.perf_counter()
+
+    reader, writer = await asyncio.open_connection(
+        partes.hostname, puerto, ssl=partes.scheme == 'https' or None
+    )
+    try:
+        writer.write(
+            f'GET {ruta} HTTP/1.1\r\nHost: {partes.netloc}\r\n'
+            f'User-Agent: benchmark-descargas\r\nConnection: close\r\n\r\n'.encode()
+        )
+        await writer.drain()
+
+        linea_estado = await reader.readline()
+        ttfb = time.perf_counter() - inicio
+        estado = int(linea_estado.split()[1]) if linea_estado else 0
+        while (await reader.readline()) not in (b'\r\n', b''):
+            pass
+
+        recibidos = 0
+        while True:
+            datos = await reader.read(bloque)
+            if not datos:
+                break
+            recibidos += len(datos)
+            if velocidad:
+                await asyncio.sleep(len(datos) / velocidad)
+        return estado, recibidos, ttfb, time.perf_counter() - inicio
+    finally:
+        writer.close()
+
+
+def percentil(valores, p):
+    if not valores:
+        return float('nan')
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def resumen(nombre, resultados, duracion):
+    correctos = [r for r in resultados if not isinstance(r, Exception) and 200 <= r[0] < 300]
+    errores = len(resultados) - len(correctos)
+    ttfb = [r[2] * 1000 for r in correctos]
+    total = [r[3] for r in correctos]
+    print(f'\n{nombre}')
+    print(f'  completadas: {len(correctos)}/{len(resultados)}  errores: {errores}')
+    if correctos:
+        print(f'  TTFB ms     p50={percentil(ttfb, 50):.0f}  p95={percentil(ttfb, 95):.0f}  '
+              f'p99={percentil(ttfb, 99):.0f}  max={max(ttfb):.0f}')
+        print(f'  duración s  p50={statistics.median(total):.2f}  max={max(total):.2f}')
+        print(f'  completadas por segundo: {len(correctos) / duracion:.1f}')
+
+
+async def ejecutar(args):
+    base = args.url.rstrip('/')
+    url_descarga = f'{base}/documento/{args.documento}/descargar/'
+    url_prueba = f'{base}{args.prueba}'
+
+    print(f'Descargas: {args.clientes} clientes a {args.velocidad // 1024} KB/s → {url_descarga}')
+    print(f'Pruebas:   {args.sondas} peticiones cada {args.intervalo}s → {url_prueba}')
+
+    inicio = time.perf_counter()
+    descargas = [
+        asyncio.create_task(asyncio.wait_for(peticion(url_descarga, args.velocidad), args.timeout))
+        for _ in range(args.clientes)
+    ]
+
+    # Dar tiempo a que las descargas ocupen el servidor antes de medir
+    await asyncio.sleep(args.espera)
+    sondas = []
+    for _ in range(args.sondas):
+        sondas.append(asyncio.create_task(asyncio.wait_for(peticion(url_prueba), args.timeout)))
+        await asyncio.sleep(args.intervalo)
+
+    resultados_sondas = await asyncio.gather(*sondas, return_exceptions=True)
+    duracion_sondas = time.perf_counter() - inicio
+    resultados_descargas = await asyncio.gather(*descargas, return_exceptions=True)
+    duracion = time.perf_counter() - inicio
+
+    resumen('Descargas lentas', resultados_descargas, duracion)
+    resumen('Peticiones de prueba durante las descargas', resultados_sondas, duracion_sondas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Capacidad de descargas concurrentes (wsgi vs asgi)')
+    parser.add_argument('--url', default='http://localhost:8000', help='URL base del sitio')
+    parser.add_argument('--documento', type=int, required=True, help='ID de un documento activo (PDF grande)')
+    parser.add_argument('--clientes', type=int, default=200, help='Descargas concurrentes')
+    parser.add_argument('--velocidad', type=int, default=64 * 1024, help='Bytes por segundo de cada cliente')
+    parser.add_argument('--prueba', default='/api/ley/1/content/', help='Ruta de las peticiones de prueba')
+    parser.add_argument('--sondas', type=int, default=50, help='Número de peticiones de prueba')
+    parser.add_argument('--intervalo', type=float, default=0.1, help='Segundos entre peticiones de prueba')
+    parser.add_argument('--espera', type=float, default=2.0, help='Segundos antes de empezar las pruebas')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Tiempo máximo por petición')
+    asyncio.run(ejecutar(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,22 @@
 #!/bin/bash
 
+export DJANGO_SETTINGS_MODULE=${DJANGO_SETTINGS_MODULE:-sistema_transparencia.settings_docker}
+
 # Ejecutar migraciones
-python manage.py migrate --settings=sistema_transparencia.settings_docker
+python manage.py migrate --settings=$DJANGO_SETTINGS_MODULE
 
 # Cargar datos iniciales si existen
-python manage.py cargar_datos_iniciales --settings=sistema_transparencia.settings_docker || true
+python manage.py cargar_datos_iniciales --settings=$DJANGO_SETTINGS_MODULE || true
+
+# Publicar la versión estática que sirve nginx (incremental; ver publicar_sitio)
+if [ "${PUBLICAR_AL_INICIAR:-false}" = "true" ]; then
+    python manage.py publicar_sitio --settings=$DJANGO_SETTINGS_MODULE || true
+fi
 
 # Iniciar servidor Django
-python manage.py runserver 0.0.0.0:8000 --settings=sistema_transparencia.settings_docker
\ No newline at end of file
+# SERVER_MODE=runserver usa el servidor de desarrollo; wsgi/asgi usan gunicorn (ver gunicorn.conf.py)
+if [ "${SERVER_MODE:-wsgi}" = "runserver" ]; then
+    exec python manage.py runserver 0.0.0.0:8000 --settings=$DJANGO_SETTINGS_MODULE
+fi
+
+exec gunicorn --config gunicorn.conf.py
@@ -0,0 +1,50 @@
+"""
+Configuración de gunicorn para producción (ver docker-entrypoint.sh).
+
+Todo se configura con variables de entorno:
+  SERVER_MODE                 wsgi (gthread) o asgi (UvicornWorker)
+  GUNICORN_WORKERS            procesos (por defecto 2 * CPUs + 1)
+  GUNICORN_THREADS            hilos por proceso en modo wsgi
+  GUNICORN_MAX_REQUESTS       reciclar el proceso tras N peticiones (0 = nunca)
+  GUNICORN_MAX_REQUESTS_JITTER
+  GUNICORN_TIMEOUT / GUNICORN_GRACEFUL_TIMEOUT / GUNICORN_KEEPALIVE
+  GUNICORN_BIND
+
+Recarga sin cortar peticiones: `kill -HUP <pid del master>`.
+"""
+import multiprocessing
+import os
+
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+if os.environ.get('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'sistema_transparencia.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'sistema_transparencia.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# Reciclado de procesos para acotar fugas de memoria
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def worker_exit(server, worker):
+    """Escribir los registros de acceso pendientes antes de que termine el proceso"""
+    try:
+        from apps.publico.accesos import escritor
+    except Exception:
+        return
+    escritor.detener()
@@ -53,6 +53,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'apps.publico.context_processors.navegacion',
             ],
         },
     },
@@ -72,6 +73,15 @@ DATABASES = {
     }
 }
 
+# Caché (fragmentos HTML de las APIs públicas)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sistema-transparencia',
+    }
+}
+PUBLICO_FRAGMENT_CACHE_TIMEOUT = 3600  # segundos
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -106,9 +116,61 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 # File upload settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
+# Los archivos mayores se escriben a disco en lugar de quedarse en memoria
+FILE_UPLOAD_MAX_MEMORY_SIZE = 4194304  # 4MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
 FILE_UPLOAD_PERMISSIONS = 0o644
+# El SHA-256 de los PDF se calcula mientras se escriben a disco (almacenamiento por contenido)
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'apps.administracion.almacenamiento.SubidaConHashHandler',
+]
+
+# Subida fragmentada de PDF (apps/administracion/subidas.py)
+SUBIDAS_FRAGMENTO_BYTES = 4194304  # 4MB por fragmento
+SUBIDAS_MAXIMO_BYTES = 52428800  # 50MB por archivo
+SUBIDAS_VIGENCIA_HORAS = 24  # las subidas abandonadas se eliminan después
+SUBIDAS_HILOS = 4  # archivos que la subida masiva escribe en paralelo
+
+# Procesamiento en segundo plano de los PDF (manage.py procesar_documentos):
+# validación, linealización y páginas con qpdf, miniatura con pdftoppm y texto para
+# la búsqueda con pdftotext. Se buscan en el PATH; PROCESAMIENTO_QPDF /
+# PROCESAMIENTO_PDFTOPPM / PROCESAMIENTO_PDFTOTEXT fijan otra ruta ('' = no usar)
+PROCESAMIENTO_TIMEOUT = 120  # segundos por ejecución de qpdf / pdftoppm / pdftotext
+PROCESAMIENTO_TIMEOUT_RECLAMO = 900  # un documento en PROCESANDO más tiempo se vuelve a reclamar
+PROCESAMIENTO_MINIATURA_ANCHO = 320  # píxeles
+
+# Búsqueda de texto completo (apps/publico/busqueda.py)
+BUSQUEDA_MAX_CARACTERES = 200000  # texto extraído que se indexa por documento
+BUSQUEDA_POR_PAGINA = 20
+
+# Feed de documentos /api/documentos/ (apps/publico/feed.py)
+DOCUMENTOS_FEED_LIMITE = 100  # documentos por página si no se indica ?limite=
+DOCUMENTOS_FEED_LIMITE_MAXIMO = 1000
+
+# Entrega de documentos PDF: 'django' (streaming desde el worker),
+# 'nginx' (X-Accel-Redirect) o 'sendfile' (X-Sendfile de Apache/lighttpd)
+DOCUMENT_DELIVERY_BACKEND = 'django'
+DOCUMENT_DELIVERY_INTERNAL_URL = '/protected-media/'  # location interna de nginx
+
+# Registro de accesos (LogAcceso) en lotes desde un hilo en segundo plano
+ACCESS_LOG_ASYNC = True
+ACCESS_LOG_BATCH_SIZE = 100
+ACCESS_LOG_FLUSH_INTERVAL_MS = 500
+ACCESS_LOG_QUEUE_SIZE = 10000
+ACCESS_LOG_OVERFLOW = 'drop'  # 'drop' descarta si la cola está llena, 'block' espera
+ACCESS_LOG_BLOCK_TIMEOUT = 1.0  # segundos de espera máxima en modo 'block'
+
+# Caché HTTP de las páginas públicas (segundos): el navegador revalida con
+# ETag y nginx puede servir la copia durante s-maxage
+PUBLICO_HTTP_MAX_AGE = 0
+PUBLICO_HTTP_S_MAXAGE = 60
+
+# Publicación estática del sitio (comando publicar_sitio); nginx sirve <raíz>/actual
+PUBLICO_SNAPSHOT_ROOT = BASE_DIR / 'snapshot'
+
+# Vistas asíncronas para las APIs de contenido y la entrega de PDF (solo con ASGI)
+PUBLICO_ASYNC_VIEWS = False
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
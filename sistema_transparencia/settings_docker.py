@@ -30,6 +30,28 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', 'maquio92'),
         'HOST': os.environ.get('DB_HOST', '172.16.35.75'),
         'PORT': os.environ.get('DB_PORT', '32768'),
+        # Conexiones persistentes por hilo de worker, verificadas antes de reutilizarse
+        # (con ASGI cada petición usa otro hilo, así que por defecto no se conservan)
+        'CONN_MAX_AGE': int(os.environ.get(
+            'DB_CONN_MAX_AGE', '0' if os.environ.get('SERVER_MODE') == 'asgi' else '600'
+        )),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true',
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', '5')),
+        },
+    }
+}
+
+# Caché en disco compartida entre procesos. Las versiones que invalidan la caché
+# (contenido público, disponibilidad por año, árbol de navegación, alcances de
+# usuario) solo se propagan si web, worker y estadisticas ven el mismo directorio:
+# docker-compose.yml monta para eso el volumen `cache` en /app/cache de los tres.
+# Todos los contenedores deben correr en el mismo host; para repartirlos en varios
+# hay que pasar a un backend de red (Redis o la caché en base de datos).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', '/app/cache'),
     }
 }
 
@@ -42,6 +64,29 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/app/media'
 
+# Entrega de PDFs: usar 'nginx' cuando nginx.conf esté delante de la app
+DOCUMENT_DELIVERY_BACKEND = os.environ.get('DOCUMENT_DELIVERY_BACKEND', 'django')
+DOCUMENT_DELIVERY_INTERNAL_URL = os.environ.get('DOCUMENT_DELIVERY_INTERNAL_URL', '/protected-media/')
+
+# Registro de accesos en lotes
+ACCESS_LOG_ASYNC = os.environ.get('ACCESS_LOG_ASYNC', 'true').lower() == 'true'
+ACCESS_LOG_BATCH_SIZE = int(os.environ.get('ACCESS_LOG_BATCH_SIZE', '100'))
+ACCESS_LOG_FLUSH_INTERVAL_MS = int(os.environ.get('ACCESS_LOG_FLUSH_INTERVAL_MS', '500'))
+ACCESS_LOG_QUEUE_SIZE = int(os.environ.get('ACCESS_LOG_QUEUE_SIZE', '10000'))
+ACCESS_LOG_OVERFLOW = os.environ.get('ACCESS_LOG_OVERFLOW', 'drop')
+
+# Caché HTTP de las páginas públicas
+PUBLICO_HTTP_MAX_AGE = int(os.environ.get('PUBLICO_HTTP_MAX_AGE', '0'))
+PUBLICO_HTTP_S_MAXAGE = int(os.environ.get('PUBLICO_HTTP_S_MAXAGE', '60'))
+
+# Publicación estática servida por nginx
+PUBLICO_SNAPSHOT_ROOT = os.environ.get('PUBLICO_SNAPSHOT_ROOT', '/app/snapshot')
+
+# Vistas asíncronas cuando gunicorn arranca con UvicornWorker (SERVER_MODE=asgi)
+PUBLICO_ASYNC_VIEWS = os.environ.get(
+    'PUBLICO_ASYNC_VIEWS', 'true' if os.environ.get('SERVER_MODE') == 'asgi' else 'false'
+).lower() == 'true'
+
 # Configuración de whitenoise
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
 WHITENOISE_USE_FINDERS = True
@@ -0,0 +1,111 @@
+/*
+ * Subida fragmentada y reanudable de PDF (API /admin-panel/api/subidas/).
+ *
+ * subirDocumento(archivo, datos, alProgresar) abre la subida, envía el archivo
+ * en fragmentos con su SHA-256 y la finaliza. El id de la subida se guarda en
+ * localStorage: si la página se recarga y se vuelve a elegir el mismo archivo
+ * para el mismo destino, la subida continúa desde lo ya recibido. Con
+ * {finalizar: false} la subida queda completa sin crear el documento: la
+ * subida masiva envía después los ids y crea todo el lote a la vez.
+ */
+(function() {
+    const API = '/admin-panel/api/subidas/';
+    const REINTENTOS = 3;
+
+    function csrfToken() {
+        const campo = document.querySelector('[name=csrfmiddlewaretoken]');
+        return campo ? campo.value : '';
+    }
+
+    function claveLocal(archivo, datos) {
+        return ['subida', datos.tipo_documento, datos.año, datos.trimestre || '',
+                archivo.name, archivo.size, archivo.lastModified].join(':');
+    }
+
+    async function hex(buffer) {
+        const digest = await crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function pedir(url, opciones) {
+        const response = await fetch(url, Object.assign({credentials: 'same-origin'}, opciones));
+        const datos = await response.json().catch(() => ({error: `Error ${response.status}`}));
+        return {status: response.status, ok: response.ok, datos: datos};
+    }
+
+    function formulario(campos) {
+        const body = new FormData();
+        Object.entries(campos).forEach(([k, v]) => body.append(k, v));
+        return {method: 'POST', headers: {'X-CSRFToken': csrfToken()}, body: body};
+    }
+
+    async function abrir(archivo, datos) {
+        const clave = claveLocal(archivo, datos);
+        const previa = localStorage.getItem(clave);
+        if (previa) {
+            const estado = await pedir(`${API}${previa}/`);
+            if (estado.ok) return estado.datos;
+            localStorage.removeItem(clave);
+        }
+        const nueva = await pedir(API, formulario(Object.assign({}, datos, {
+            nombre: archivo.name, tamaño: archivo.size
+        })));
+        if (!nueva.ok) throw new Error(nueva.datos.error);
+        localStorage.setItem(clave, nueva.datos.id);
+        return nueva.datos;
+    }
+
+    async function enviarFragmento(subida, archivo, inicio) {
+        const fin = Math.min(inicio + subida.tamaño_fragmento, archivo.size);
+        const buffer = await archivo.slice(inicio, fin).arrayBuffer();
+        const respuesta = await pedir(`${API}${subida.id}/`, {
+            method: 'PUT',
+            headers: {
+                'X-CSRFToken': csrfToken(),
+                'Content-Type': 'application/octet-stream',
+                'Content-Range': `bytes ${inicio}-${fin - 1}/${archivo.size}`,
+                'X-Checksum-SHA256': await hex(buffer)
+            },
+            body: buffer
+        });
+        // 409/422 indican desde dónde continuar
+        if (respuesta.ok || respuesta.datos.recibido !== undefined) return respuesta;
+        throw new Error(respuesta.datos.error);
+    }
+
+    window.subidaFragmentadaDisponible = function() {
+        return !!(window.fetch && window.crypto && crypto.subtle && window.localStorage);
+    };
+
+    window.subirDocumento = async function(archivo, datos, alProgresar, opciones) {
+        const subida = await abrir(archivo, datos);
+        let recibido = subida.recibido;
+        let fallos = 0;
+        while (recibido < archivo.size) {
+            if (alProgresar) alProgresar(recibido / archivo.size);
+            try {
+                const respuesta = await enviarFragmento(subida, archivo, recibido);
+                recibido = respuesta.datos.recibido;
+                fallos = respuesta.ok ? 0 : fallos + 1;
+            } catch (error) {
+                fallos += 1;
+                if (fallos > REINTENTOS) throw error;
+                await new Promise(r => setTimeout(r, 1000 * fallos));
+                // Tras un corte de red, preguntar cuánto llegó
+                const estado = await pedir(`${API}${subida.id}/`).catch(() => null);
+                if (estado && estado.ok) recibido = estado.datos.recibido;
+                continue;
+            }
+            if (fallos > REINTENTOS) throw new Error('No se pudo enviar el archivo.');
+        }
+        if (alProgresar) alProgresar(1);
+        if (opciones && opciones.finalizar === false) {
+            return Object.assign({}, subida, {recibido: recibido});
+        }
+
+        const final = await pedir(`${API}${subida.id}/finalizar/`, formulario({}));
+        if (!final.ok) throw new Error(final.datos.error);
+        localStorage.removeItem(claveLocal(archivo, datos));
+        return final.datos;
+    };
+})();